@@ -1,7 +1,19 @@
+# Профиль старта (STARTUP_PROFILE=1) подключается до остальных импортов
+from .utils.startup import startup_profiler
+startup_profiler.install_if_enabled()
+
 from aiogram import Bot, Dispatcher
 import asyncio
+import signal
 from .config import settings
 from .database.models import create_all_tables
+from .services.archiver import start_background_archiver
+from .services.leaderboard import leaderboard, start_background_leaderboard
+from .services.stats_snapshot import start_background_stats
+from .middlewares import AdminFilterMiddleware, HandlerMetricsMiddleware, ThrottlingMiddleware, TracingMiddleware, BotApiTracingMiddleware, UserQueueMiddleware
+from .utils.logger import logger, setup_logging
+from .utils.metrics import start_metrics_server
+from .utils.tracing import tracer
 from .handlers import ( 
     LearningHandlers,
     BaseHandlers,
@@ -9,17 +21,77 @@ from .handlers import (
     AI_Handlers
 )
 
-async def main():
-    bot = Bot(token=settings.BOT_TOKEN)
+def create_dispatcher(with_ai: bool = True, serialize_users: bool = True, throttle: bool = True) -> Dispatcher:
+    """Собирает диспетчер со всеми middleware и хендлерами (используется и в бенчмарках)"""
     dp = Dispatcher()
     
-    await create_all_tables()
+    # Антифлуд до очереди пользователя: лишние апдейты не ждут в ней и не доходят до БД
+    if throttle:
+        dp.update.outer_middleware(ThrottlingMiddleware())
+    # Апдейты одного пользователя - по очереди (двойное нажатие не считается дважды)
+    if serialize_users:
+        dp.update.outer_middleware(UserQueueMiddleware())
+    # Трассировка регистрируется первой, чтобы трейс охватывал остальные middleware
+    tracing_middleware = TracingMiddleware()
+    dp.message.outer_middleware(tracing_middleware)
+    dp.callback_query.outer_middleware(tracing_middleware)
+    metrics_middleware = HandlerMetricsMiddleware()
+    dp.message.outer_middleware(metrics_middleware)
+    dp.callback_query.outer_middleware(metrics_middleware)
+    # Доступ к админ-панели проверяется здесь, а не в каждом хендлере
+    admin_middleware = AdminFilterMiddleware()
+    dp.message.outer_middleware(admin_middleware)
+    dp.callback_query.outer_middleware(admin_middleware)
     BaseHandlers(dp)
     AdminHandlers(dp)
     LearningHandlers(dp)
-    AI_Handlers(dp)
+    if with_ai:
+        AI_Handlers(dp)
+    return dp
+
+def reload_settings():
+    """Перечитывает .env (SIGHUP); при ошибке в новых значениях остаются прежние"""
+    try:
+        changed = settings.reload()
+    except ValueError as e:
+        logger.error("settings reload failed: %s", e)
+        return
+    logger.info("settings reloaded, changed: %s", ", ".join(changed) or "nothing")
+
+
+def install_settings_reload():
+    """kill -HUP <pid> перечитывает настройки без перезапуска (где есть SIGHUP)"""
+    if hasattr(signal, "SIGHUP"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_settings)
+
+async def main():
+    setup_logging(
+        settings.LOG_LEVEL,
+        settings.LOG_FORMAT,
+        rate_window=settings.LOG_RATE_WINDOW,
+        rate_burst=settings.LOG_RATE_BURST,
+        rate_sample=settings.LOG_RATE_SAMPLE,
+    )
+    tracer.configure(settings.TRACE_ENABLED, settings.TRACE_BUFFER, settings.TRACE_FILE)
+    bot = Bot(token=settings.BOT_TOKEN)
+    bot.session.middleware(BotApiTracingMiddleware())
+    
+    with startup_profiler.phase("create_all_tables"):
+        await create_all_tables()
+    with startup_profiler.phase("metrics_server"):
+        await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+    with startup_profiler.phase("create_dispatcher"):
+        dp = create_dispatcher()
+    startup_profiler.finish()
+    install_settings_reload()
     
+    # Ссылка на задачу держится до конца polling, иначе ее может собрать GC
+    archiver_task = start_background_archiver()
+    stats_task = start_background_stats()
+    leaderboard_task = start_background_leaderboard()
     await dp.start_polling(bot)
+    # Недельные очки рейтинга, накопленные после последнего сохранения
+    await leaderboard.flush()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,312 @@
+"""Детерминированный генератор синтетических данных для бенчмарков БД.
+
+По умолчанию: 20 категорий, 100k вопросов по 4 ответа, 1M пользователей и
+50M строк user_answers. Все вставки идут пачками внутри транзакций.
+
+    python -m <package>.benchmarks.dataset --db big.db
+    python -m <package>.benchmarks.dataset --db small.db --scale 0.01
+
+Датасет всегда генерируется в SQLite-файл; при DB_BACKEND=postgres он затем
+переносится в базу DB_DSN (COPY), чтобы бенчмарки сравнивали бэкенды на одних данных.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import Iterator, Tuple
+from .. import config  # noqa: F401 - config раньше database, иначе циклический импорт через keyboards
+from ..database import models
+from ..database.backends import SQLiteBackend
+from ..database.backends.base import ANSWER_ROLLUPS_BACKFILL, REVIEW_SCHEDULE_BACKFILL
+
+# Порядок переноса в PostgreSQL
+TABLES = ("categories", "questions", "answers", "users", "user_answers", "messages", "user_progress", "review_schedule",
+          "answer_rollups")
+
+# Смещение, чтобы id пользователей были похожи на настоящие Telegram id
+USER_ID_OFFSET = 10_000_000
+ANSWERS_PER_QUESTION = 4
+DIFFICULTIES = ("beginner", "intermediate", "advanced")
+
+
+@dataclass
+class DatasetSpec:
+    categories: int = 20
+    questions: int = 100_000
+    users: int = 1_000_000
+    user_answers: int = 50_000_000
+    messages_users: int = 100_000  # у скольких пользователей есть история чата (по 5 сообщений)
+    history_days: int = 90
+    explanation_ratio: float = 0.5  # доля вопросов с объяснением
+    seed: int = 42
+    batch_size: int = 100_000
+
+    def scaled(self, scale: float) -> "DatasetSpec":
+        return DatasetSpec(
+            categories=self.categories,
+            questions=max(1, int(self.questions * scale)),
+            users=max(1, int(self.users * scale)),
+            user_answers=int(self.user_answers * scale),
+            messages_users=int(self.messages_users * scale),
+            history_days=self.history_days,
+            explanation_ratio=self.explanation_ratio,
+            seed=self.seed,
+            batch_size=self.batch_size,
+        )
+
+
+def user_id_for(index: int) -> int:
+    """Telegram id синтетического пользователя по порядковому номеру (0..users-1)"""
+    return USER_ID_OFFSET + index
+
+
+def answer_id_for(question_id: int, position: int) -> int:
+    """id ответа: ответы вставляются подряд по 4 на вопрос"""
+    return (question_id - 1) * ANSWERS_PER_QUESTION + position + 1
+
+
+def correct_positions(questions: int, seed: int) -> bytearray:
+    """Позиции правильных ответов: индекс - id вопроса (элемент 0 не используется)"""
+    r = random.Random(seed * 1_000_003)
+    return bytearray([0] + [r.randrange(ANSWERS_PER_QUESTION) for _ in range(questions)])
+
+
+def _batched(rows: Iterator[Tuple], size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bulk_insert(conn: sqlite3.Connection, sql: str, rows: Iterator[Tuple], size: int, label: str, total: int):
+    done = 0
+    started = time.monotonic()
+    for batch in _batched(rows, size):
+        with conn:
+            conn.executemany(sql, batch)
+        done += len(batch)
+        if total >= 10 * size:
+            print(f"  {label}: {done}/{total} ({done / max(time.monotonic() - started, 1e-9):.0f} rows/s)", flush=True)
+
+
+def generate_dataset(path: str, spec: DatasetSpec, with_aggregates: bool = True):
+    """Заполняет пустую БД (схема уже создана) по спецификации"""
+    rng = random.Random(spec.seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    correct = correct_positions(spec.questions, spec.seed)
+    base_time = datetime(2025, 1, 1) + timedelta(days=spec.history_days)
+
+    def timestamp(r: random.Random) -> str:
+        return (base_time - timedelta(seconds=r.randrange(spec.history_days * 86400))).strftime("%Y-%m-%d %H:%M:%S")
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO categories (id, name) VALUES (?, ?)",
+            [(c, f"Категория {c}") for c in range(1, spec.categories + 1)]
+        )
+
+    def questions():
+        for question_id in range(1, spec.questions + 1):
+            category_id = (question_id - 1) % spec.categories + 1
+            explanation = f"Объяснение к вопросу {question_id}" if rng.random() < spec.explanation_ratio else None
+            yield (
+                question_id,
+                f"Вопрос {question_id}: выберите правильный вариант написания слова",
+                category_id,
+                DIFFICULTIES[question_id % len(DIFFICULTIES)],
+                explanation,
+            )
+
+    def answers():
+        for question_id in range(1, spec.questions + 1):
+            for position in range(ANSWERS_PER_QUESTION):
+                yield (answer_id_for(question_id, position), question_id, f"Вариант {position + 1}", position == correct[question_id])
+
+    def users():
+        for index in range(spec.users):
+            yield (user_id_for(index), f"user{index}", f"Имя{index}", None)
+
+    def user_answers():
+        r = random.Random(spec.seed + 1)
+        for _ in range(spec.user_answers):
+            # Перекос активности: небольшая часть пользователей отвечает намного чаще
+            user_index = int(spec.users * r.random() ** 2)
+            question_id = r.randrange(1, spec.questions + 1)
+            # Примерно 70% правильных ответов
+            if r.random() < 0.7:
+                position = correct[question_id]
+            else:
+                position = r.randrange(ANSWERS_PER_QUESTION)
+            is_correct = position == correct[question_id]
+            yield (user_id_for(user_index), question_id, answer_id_for(question_id, position), is_correct, timestamp(r))
+
+    def messages():
+        r = random.Random(spec.seed + 2)
+        for index in range(spec.messages_users):
+            user_id = user_id_for(r.randrange(spec.users))
+            for i in range(5):
+                role = "user" if i % 2 == 0 else "assistant"
+                yield (user_id, role, f"Сообщение {i} по правилам русского языка")
+
+    size = spec.batch_size
+    _bulk_insert(conn, "INSERT INTO questions (id, question_text, category_id, difficulty_level, explanation) VALUES (?, ?, ?, ?, ?)",
+                 questions(), size, "questions", spec.questions)
+    _bulk_insert(conn, "INSERT INTO answers (id, question_id, answer_text, is_correct) VALUES (?, ?, ?, ?)",
+                 answers(), size, "answers", spec.questions * ANSWERS_PER_QUESTION)
+    _bulk_insert(conn, "INSERT INTO users (user_id, username, first_name, last_name) VALUES (?, ?, ?, ?)",
+                 users(), size, "users", spec.users)
+    _bulk_insert(conn, "INSERT INTO user_answers (user_id, question_id, answer_id, is_correct, answered_at) VALUES (?, ?, ?, ?, ?)",
+                 user_answers(), size, "user_answers", spec.user_answers)
+    _bulk_insert(conn, "INSERT INTO messages (user_id, role, content) VALUES (?, ?, ?)",
+                 messages(), size, "messages", spec.messages_users * 5)
+
+    if spec.user_answers:
+        # Проверки "отвечал/отвечал верно" читают итоги, без них история ответов не видна
+        with conn:
+            conn.execute(ANSWER_ROLLUPS_BACKFILL)
+    if with_aggregates and spec.user_answers:
+        # Счетчики в users и user_progress должны сходиться с историей ответов
+        with conn:
+            conn.execute('''
+                UPDATE users SET total_questions = agg.total, correct_answers = agg.correct
+                FROM (
+                    SELECT user_id, COUNT(*) AS total, SUM(is_correct) AS correct
+                    FROM user_answers GROUP BY user_id
+                ) AS agg
+                WHERE users.user_id = agg.user_id
+            ''')
+            conn.execute('''
+                INSERT INTO user_progress (user_id, category_id, questions_answered, correct_answers)
+                SELECT ua.user_id, q.category_id, COUNT(*), SUM(ua.is_correct)
+                FROM user_answers ua
+                JOIN questions q ON q.id = ua.question_id
+                GROUP BY ua.user_id, q.category_id
+            ''')
+            conn.execute(REVIEW_SCHEDULE_BACKFILL)
+    # Возвращаем режим журнала по умолчанию, чтобы бенчмарки мерили как в проде
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+
+
+def create_sqlite_schema(path: str):
+    """Схема SQLite-бэкенда в файле path (независимо от DB_BACKEND)"""
+    conn = sqlite3.connect(path)
+    with conn:
+        for statement in SQLiteBackend.SCHEMA:
+            conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {models.SCHEMA_VERSION}")
+    conn.close()
+
+
+async def load_into_postgres(path: str, backend, batch_size: int = 50_000):
+    """Переносит таблицы SQLite-файла в PostgreSQL (таблицы очищаются) и сдвигает счетчики id"""
+    import asyncpg
+
+    await models.create_all_tables()
+    source = sqlite3.connect(path)
+    conn = await asyncpg.connect(backend.dsn)
+    try:
+        # Версии банка вопросов от прошлого набора данных тоже сбрасываются
+        await conn.execute(f"TRUNCATE {', '.join(TABLES)}, bank_versions, stats_snapshots, leaderboard_weeks, question_search, question_signatures RESTART IDENTITY")
+        # id начинаются заново - архив прошлого набора данных с ними бы пересекался
+        await conn.execute("DROP SCHEMA IF EXISTS archive CASCADE")
+        for table in TABLES:
+            types = dict(await conn.fetch(
+                "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = $1", table
+            ))
+            columns = [row[1] for row in source.execute(f"PRAGMA table_info({table})")]
+            # В SQLite булевы - 0/1, а время - строки
+            converters = []
+            for column in columns:
+                if types[column] == "boolean":
+                    converters.append(lambda value: None if value is None else bool(value))
+                elif types[column].startswith("timestamp"):
+                    converters.append(lambda value: datetime.fromisoformat(value) if isinstance(value, str) else value)
+                else:
+                    converters.append(None)
+            cursor = source.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                records = [
+                    tuple(value if convert is None else convert(value) for value, convert in zip(row, converters))
+                    for row in rows
+                ]
+                await conn.copy_records_to_table(table, records=records, columns=columns)
+            if "id" in types:
+                await conn.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {table}"
+                )
+        await conn.execute(f"ANALYZE {', '.join(TABLES)}")
+    finally:
+        await conn.close()
+        source.close()
+
+
+def use_database(path: str):
+    """Направляет менеджеры на SQLite-файл; для PostgreSQL данные уже лежат в DB_DSN"""
+    if models.backend.name == "sqlite":
+        models.backend.path = path
+
+
+async def create_dataset(path: str, spec: DatasetSpec, with_aggregates: bool = True):
+    """Создает SQLite-файл с датасетом и подключает его к менеджерам текущего бэкенда"""
+    create_sqlite_schema(path)
+    generate_dataset(path, spec, with_aggregates)
+    if models.backend.name == "postgres":
+        await load_into_postgres(path, models.backend)
+        # Пул привязан к текущему циклу событий
+        await models.backend.close()
+    use_database(path)
+    if models.backend.name == "sqlite" and not models.backend.archive_path:
+        # Архив рядом с файлом (services/archiver.py) остался бы от прошлого набора данных
+        archive = models.backend.archive_location
+        if os.path.exists(archive):
+            os.remove(archive)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетической БД для бенчмарков")
+    parser.add_argument("--db", required=True, help="путь к создаваемой БД")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель размеров (0.01 - быстрый вариант)")
+    parser.add_argument("--categories", type=int, default=None)
+    parser.add_argument("--questions", type=int, default=None)
+    parser.add_argument("--users", type=int, default=None)
+    parser.add_argument("--user-answers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-aggregates", action="store_true", help="не пересчитывать users/user_progress")
+    parser.add_argument("--force", action="store_true", help="перезаписать существующий файл")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            parser.error(f"{args.db} уже существует (используйте --force)")
+        os.remove(args.db)
+
+    spec = DatasetSpec(seed=args.seed).scaled(args.scale)
+    for field in ("categories", "questions", "users", "user_answers"):
+        value = getattr(args, field)
+        if value is not None:
+            setattr(spec, field, value)
+
+    print("Генерация:", asdict(spec))
+    started = time.monotonic()
+    await create_dataset(args.db, spec, with_aggregates=not args.no_aggregates)
+    target = f"{args.db} -> PostgreSQL" if models.backend.name == "postgres" else args.db
+    print(f"Готово за {time.monotonic() - started:.1f} c: {target}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
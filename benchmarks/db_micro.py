@@ -0,0 +1,213 @@
+"""Микро-бенчмарки методов менеджеров БД на синтетическом датасете.
+
+Каждый метод вызывается с детерминированно выбранными аргументами, пока не
+наберется --iterations вызовов или не истечет --max-seconds. Результат
+сохраняется в JSON вместе с коммитом, чтобы сравнивать прогоны между коммитами.
+
+    python -m <package>.benchmarks.dataset --db big.db
+    python -m <package>.benchmarks.db_micro --db big.db --out before.json
+    python -m <package>.benchmarks.db_micro --db big.db --out after.json --compare before.json
+
+Сравнение бэкендов на одном датасете:
+
+    DB_BACKEND=postgres DB_DSN=postgresql://... python -m <package>.benchmarks.dataset --db big.db --force
+    DB_BACKEND=postgres DB_DSN=postgresql://... python -m <package>.benchmarks.db_micro --out pg.json --compare before.json
+
+Методы, которые пишут в БД, работают с отдельным диапазоном пользователей и
+немного меняют датасет; для строгого сравнения пересоздавайте его.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from ..config.settings import settings
+from ..database import models
+from ..database.models import (
+    UserManager, MessageManager, CategoryManager, QuestionManager, ProgressManager, ReviewManager
+)
+from ..services.review import review_scheduler
+from .dataset import use_database
+from .quiz_loop import percentile
+
+# Пользователи для пишущих методов - вне диапазона датасета
+WRITE_USER_OFFSET = 900_000_000
+
+
+class DatasetInfo:
+    """Границы датасета для выбора аргументов; читается через текущий бэкенд"""
+
+    def __init__(self):
+        self.categories: List[int] = []
+        self.max_question_id = 0
+        self.min_user_id = self.max_user_id = 0
+        self.counts: Dict[str, int] = {}
+
+    @classmethod
+    async def load(cls) -> "DatasetInfo":
+        info = cls()
+        async with models.connect() as conn:
+            async with conn.execute("SELECT id FROM categories ORDER BY id") as cursor:
+                info.categories = [row[0] for row in await cursor.fetchall()]
+            async with conn.execute("SELECT COALESCE(MAX(id), 0) FROM questions") as cursor:
+                (info.max_question_id,) = await cursor.fetchone()
+            async with conn.execute("SELECT MIN(user_id), MAX(user_id) FROM users") as cursor:
+                info.min_user_id, info.max_user_id = await cursor.fetchone()
+            for table in ("categories", "questions", "answers", "users", "user_answers", "messages", "user_progress",
+                          "review_schedule"):
+                async with conn.execute(f"SELECT COUNT(*) FROM {table}") as cursor:
+                    (info.counts[table],) = await cursor.fetchone()
+        return info
+
+
+def build_cases(info: DatasetInfo, rng: random.Random) -> List[Tuple[str, Callable[[], Awaitable]]]:
+    """(имя, фабрика корутины) для каждого метода менеджеров"""
+    def user():
+        return rng.randint(info.min_user_id, info.max_user_id)
+
+    def question():
+        return rng.randint(1, info.max_question_id)
+
+    def category():
+        return rng.choice(info.categories)
+
+    def write_user():
+        return WRITE_USER_OFFSET + rng.randrange(1000)
+
+    return [
+        # UserManager
+        ("UserManager.add_user", lambda: UserManager.add_user(write_user(), "bench", "Bench", None)),
+        ("UserManager.get_user_stats", lambda: UserManager.get_user_stats(user())),
+        ("UserManager.update_user_stats", lambda: UserManager.update_user_stats(write_user(), True)),
+        ("UserManager.get_all_user_ids", lambda: UserManager.get_all_user_ids()),
+        # MessageManager
+        ("MessageManager.get_message_count", lambda: MessageManager.get_message_count(user())),
+        ("MessageManager.add_message", lambda: MessageManager.add_message(write_user(), "user", "benchmark")),
+        ("MessageManager.get_history", lambda: MessageManager.get_history(user(), 5)),
+        # CategoryManager
+        ("CategoryManager.get_all_categories", lambda: CategoryManager.get_all_categories()),
+        ("CategoryManager.get_available_categories", lambda: CategoryManager.get_available_categories()),
+        ("CategoryManager.get_available_categories_page", lambda: CategoryManager.get_available_categories_page()),
+        ("CategoryManager.get_category_by_id", lambda: CategoryManager.get_category_by_id(category())),
+        # QuestionManager
+        ("QuestionManager.get_questions_by_category", lambda: QuestionManager.get_questions_by_category(category())),
+        ("QuestionManager.get_question_with_answers", lambda: QuestionManager.get_question_with_answers(question())),
+        ("QuestionManager.get_question_category", lambda: QuestionManager.get_question_category(question())),
+        ("QuestionManager.get_random_question_by_category", lambda: QuestionManager.get_random_question_by_category(category())),
+        ("QuestionManager.get_random_question_global_all", lambda: QuestionManager.get_random_question_global_all()),
+        ("QuestionManager.get_random_question_global_answered", lambda: QuestionManager.get_random_question_global_answered(user())),
+        ("QuestionManager.get_unseen_random_question_by_category",
+         lambda: QuestionManager.get_unseen_random_question_by_category(user(), category())),
+        ("QuestionManager.get_unseen_random_question_global", lambda: QuestionManager.get_unseen_random_question_global(user())),
+        ("QuestionManager.get_question_status", lambda: QuestionManager.get_question_status(question())),
+        ("QuestionManager.get_all_questions_by_category", lambda: QuestionManager.get_all_questions_by_category(category())),
+        ("QuestionManager.get_questions_page", lambda: QuestionManager.get_questions_page(category())),
+        ("QuestionManager.count_questions_without_explanation", lambda: QuestionManager.count_questions_without_explanation()),
+        ("QuestionManager.get_questions_without_explanation", lambda: QuestionManager.get_questions_without_explanation(0, 50)),
+        # ProgressManager
+        ("ProgressManager.record_answer",
+         lambda: ProgressManager.record_answer(write_user(), question(), 1, rng.random() < 0.7)),
+        ("ProgressManager.user_has_answered_question", lambda: ProgressManager.user_has_answered_question(user(), question())),
+        ("ProgressManager.user_has_answered_correctly", lambda: ProgressManager.user_has_answered_correctly(user(), question())),
+        ("ProgressManager.get_user_progress_by_category",
+         lambda: ProgressManager.get_user_progress_by_category(user(), category())),
+        ("ProgressManager.get_user_overall_progress", lambda: ProgressManager.get_user_overall_progress(user())),
+        ("ProgressManager.get_category_stats", lambda: ProgressManager.get_category_stats()),
+        ("ProgressManager.get_user_stats_by_categories", lambda: ProgressManager.get_user_stats_by_categories(user())),
+        # ReviewManager
+        ("ReviewManager.get_review_queue", lambda: ReviewManager.get_review_queue(user(), category(), 20)),
+        # Выбор вопроса режима повторения: очередь без показанных в сессии
+        ("ReviewScheduler.queue",
+         lambda: review_scheduler.queue(user(), category(), [question() for _ in range(20)])),
+        ("ReviewManager.reschedule",
+         lambda: ReviewManager.reschedule(user(), [(question(), rng.random() < 0.7) for _ in range(20)])),
+    ]
+
+
+async def run_case(factory: Callable[[], Awaitable], iterations: int, max_seconds: float) -> Dict:
+    await factory()  # прогрев
+    durations = []
+    deadline = time.perf_counter() + max_seconds
+    while len(durations) < iterations and (not durations or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        await factory()
+        durations.append(time.perf_counter() - started)
+    return {
+        'iterations': len(durations),
+        'mean_ms': round(sum(durations) / len(durations) * 1000, 3),
+        'p50_ms': round(percentile(durations, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(durations, 0.95) * 1000, 3),
+        'max_ms': round(max(durations) * 1000, 3),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__), text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def print_comparison(current: Dict, previous: Dict):
+    print(
+        f"\nСравнение с {previous.get('commit')} ({previous.get('timestamp')}, {previous.get('backend', 'sqlite')}) "
+        f"-> {current.get('backend')}:"
+    )
+    for name, row in current['cases'].items():
+        old = previous.get('cases', {}).get(name)
+        if not old:
+            print(f"  {name:<70} новый")
+            continue
+        ratio = row['p50_ms'] / old['p50_ms'] if old['p50_ms'] else float('inf')
+        print(f"  {name:<70} p50 {old['p50_ms']:>10.3f} -> {row['p50_ms']:>10.3f} ms  x{ratio:.2f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Микро-бенчмарки методов менеджеров БД")
+    parser.add_argument("--db", default=None, help="SQLite-БД, созданная benchmarks.dataset (для DB_BACKEND=postgres не нужна)")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="бюджет времени на один метод")
+    parser.add_argument("--only", default=None, help="подстрока в имени метода")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default=None, help="куда сохранить JSON с результатами")
+    parser.add_argument("--compare", default=None, help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    if models.backend.name == "sqlite":
+        if not args.db:
+            parser.error("для SQLite нужен --db")
+        use_database(args.db)
+    info = await DatasetInfo.load()
+    rng = random.Random(args.seed)
+    results = {}
+    for name, factory in build_cases(info, rng):
+        if args.only and args.only not in name:
+            continue
+        results[name] = await run_case(factory, args.iterations, args.max_seconds)
+        row = results[name]
+        print(f"{name:<70} n={row['iterations']:<4} p50 {row['p50_ms']:>10.3f} ms  p95 {row['p95_ms']:>10.3f} ms", flush=True)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec="seconds"),
+        'backend': models.backend.name,
+        'db_profile': settings.DB_PROFILE,
+        'dataset': info.counts,
+        'cases': results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
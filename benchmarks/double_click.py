@@ -0,0 +1,141 @@
+"""Стресс-тест двойных нажатий: счетчики статистики должны совпадать с числом ответов.
+
+Каждый пользователь проходит викторину, но каждую кнопку ответа "нажимает"
+--clicks раз одновременно (как при двойном тапе). После прогона сверяются
+users.total_questions/correct_answers, сумма user_progress и число строк
+user_answers с числом ответов, которые видел пользователь. При расхождении
+скрипт завершается с кодом 1.
+
+    python -m <package>.benchmarks.double_click --users 200 --rounds 5 --clicks 3
+    python -m <package>.benchmarks.double_click --no-serialize   # без UserQueueMiddleware: счетчики расходятся
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+from collections import Counter
+from typing import Dict
+from aiogram import Bot
+from .dataset import DatasetSpec, create_dataset
+from .fake_session import FakeSession
+from .quiz_loop import QuizLoopBenchmark
+from ..app import create_dispatcher
+from ..cluster import prepare_database
+from ..database import models
+
+
+class DoubleClickBenchmark(QuizLoopBenchmark):
+    def __init__(self, dp, bot: Bot, session: FakeSession, clicks: int, seed: int = 1):
+        super().__init__(dp, bot, session, seed)
+        self.clicks = clicks
+        # Ожидаемые значения: один засчитанный ответ на раунд
+        self.answered: Counter = Counter()
+        self.correct: Counter = Counter()
+
+    async def run_user(self, user_id: int, rounds: int):
+        await self.feed("start", self._message_update(user_id, "/start"))
+        await self.feed("select_category", self._callback_update(user_id, "select_category"))
+        category = self.pick_button(user_id, lambda data: data.startswith("category_"))
+        if category is None:
+            self.errors["category_"] += 1
+            return
+        await self.feed("category_", self._callback_update(user_id, category))
+        for _ in range(rounds):
+            answer = self.pick_button(user_id, lambda data: data.startswith("answer_"))
+            if answer is None:
+                break
+            # Одинаковые нажатия на одно сообщение приходят почти одновременно
+            await asyncio.gather(*(
+                self.feed("answer_", self._callback_update(user_id, answer)) for _ in range(self.clicks)
+            ))
+            # Выбор вопроса исключает отвеченные правильно, поэтому каждый раунд засчитывается один раз
+            self.answered[user_id] += 1
+            if self.session.texts.get(user_id, "").startswith("✅"):
+                self.correct[user_id] += 1
+            next_question = self.pick_button(user_id, lambda data: data.startswith("next_question_"))
+            if next_question is None:
+                break
+            await self.feed("next_question_", self._callback_update(user_id, next_question))
+
+    async def verify(self) -> Dict:
+        async with models.connect() as conn:
+            async with conn.execute("SELECT user_id, total_questions, correct_answers FROM users") as cursor:
+                users = {row[0]: (row[1], row[2]) for row in await cursor.fetchall()}
+            async with conn.execute(
+                "SELECT user_id, SUM(questions_answered), SUM(correct_answers) FROM user_progress GROUP BY user_id"
+            ) as cursor:
+                progress = {row[0]: (row[1], row[2]) for row in await cursor.fetchall()}
+            async with conn.execute("SELECT user_id, COUNT(*) FROM user_answers GROUP BY user_id") as cursor:
+                rows = dict(await cursor.fetchall())
+
+        mismatched = []
+        for user_id, answered in self.answered.items():
+            expected = (answered, self.correct[user_id])
+            actual = {
+                'users': users.get(user_id),
+                'user_progress': progress.get(user_id),
+                'user_answers': rows.get(user_id, 0),
+            }
+            if actual['users'] != expected or actual['user_progress'] != expected or actual['user_answers'] != answered:
+                mismatched.append({'user_id': user_id, 'expected': expected, **actual})
+        return {
+            'users_checked': len(self.answered),
+            'answers_expected': sum(self.answered.values()),
+            'answers_counted': sum(total for total, _ in users.values()),
+            'mismatched_users': len(mismatched),
+            'samples': mismatched[:5],
+        }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Стресс-тест двойных нажатий кнопок ответа")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--clicks", type=int, default=3, help="одновременных нажатий на каждую кнопку ответа")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--no-serialize", action="store_true", help="собрать диспетчер без UserQueueMiddleware")
+    args = parser.parse_args()
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="doubleclick-"), "bench.db")
+    await create_dataset(db_path, DatasetSpec(
+        categories=2,
+        questions=2 * max(args.rounds * 2, 20),
+        users=0,
+        user_answers=0,
+        messages_users=0,
+        explanation_ratio=1.0,
+    ))
+    # Как в многопроцессном режиме: WAL, чтобы проверка не упиралась в блокировки файла
+    await prepare_database()
+
+    session = FakeSession()
+    bot = Bot(token="42:BENCHMARK", session=session)
+    dp = create_dispatcher(with_ai=False, serialize_users=not args.no_serialize, throttle=False)
+    benchmark = DoubleClickBenchmark(dp, bot, session, args.clicks)
+    report = await benchmark.run(args.users, args.rounds, args.concurrency)
+    check = await benchmark.verify()
+
+    answer_step = report['steps'].get('answer_', {})
+    print(
+        f"users={args.users} rounds={args.rounds} clicks={args.clicks} "
+        f"serialize={not args.no_serialize} -> {report['updates_per_sec']} updates/s, "
+        f"answer_ p95 {answer_step.get('p95_ms', 0):.1f} ms, SQL/answer click {answer_step.get('sql_per_update', 0):.2f}"
+    )
+    print(
+        f"answers expected={check['answers_expected']} counted={check['answers_counted']} "
+        f"mismatched users={check['mismatched_users']}/{check['users_checked']}"
+    )
+    for sample in check['samples']:
+        print("  ", sample)
+    for step, error in report['error_samples'].items():
+        print(f"first error in {step}: {error}")
+    await models.backend.close()
+    if check['mismatched_users'] or report['error_samples']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+import asyncio
+import itertools
+from collections import Counter
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, Optional
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat, InlineKeyboardMarkup, Message
+
+# Методы, которые в ответ возвращают сообщение
+_MESSAGE_METHODS = {"SendMessage", "SendPhoto", "SendDocument", "EditMessageText", "EditMessageReplyMarkup"}
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot API без сети: запоминает вызовы и возвращает правдоподобные ответы.
+
+    Для каждого чата хранится последняя клавиатура, чтобы сценарий мог
+    "нажать" кнопку так же, как это сделал бы пользователь.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.keyboards: Dict[int, InlineKeyboardMarkup] = {}
+        self.texts: Dict[int, str] = {}
+        self._message_ids = itertools.count(1)
+
+    async def close(self) -> None:
+        pass
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        chat_id = getattr(method, "chat_id", None)
+        if isinstance(chat_id, int):
+            markup = getattr(method, "reply_markup", None)
+            if isinstance(markup, InlineKeyboardMarkup):
+                self.keyboards[chat_id] = markup
+            text = getattr(method, "text", None)
+            if text is not None:
+                self.texts[chat_id] = text
+
+        if name in _MESSAGE_METHODS:
+            return Message(
+                message_id=getattr(method, "message_id", None) or next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+                text=getattr(method, "text", None),
+            ).as_(bot)
+        return True
+
+    async def stream_content(
+        self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30, chunk_size: int = 65536, raise_for_status: bool = True
+    ) -> AsyncGenerator[bytes, None]:
+        yield b""
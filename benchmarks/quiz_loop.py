@@ -0,0 +1,252 @@
+"""Сквозной бенчмарк цикла викторины внутри процесса.
+
+Собирает настоящий Dispatcher (BaseHandlers, LearningHandlers, AdminHandlers),
+подменяет сессию Bot API на FakeSession и прогоняет синтетических пользователей
+по сценарию /start -> select_category -> category_ -> (answer_ -> next_question_) x N
+через dp.feed_update. С --review-rounds пользователь затем проходит режим
+повторения (шаги review_*). Печатает апдейты/сек, перцентили задержек по шагам
+и число SQL-запросов на шаг.
+
+    python -m <package>.benchmarks.quiz_loop --users 2000 --rounds 3 --concurrency 100
+    python -m <package>.benchmarks.quiz_loop --users 500 --rounds 10 --review-rounds 10
+"""
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from aiogram import Bot
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+from .dataset import DatasetSpec, create_dataset, use_database
+from .fake_session import FakeSession
+from ..app import create_dispatcher
+from ..database import models
+from ..middlewares import BotApiTracingMiddleware
+
+_current_step: contextvars.ContextVar = contextvars.ContextVar("benchmark_step", default=None)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class QuizLoopBenchmark:
+    def __init__(self, dp, bot: Bot, session: FakeSession, seed: int = 1, review_rounds: int = 0):
+        self.dp = dp
+        self.review_rounds = review_rounds
+        self.bot = bot
+        self.session = session
+        self.rng = random.Random(seed)
+        self.update_ids = itertools.count(1)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statements: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.error_samples: Dict[str, str] = {}
+
+    def on_statement(self, sql: str, duration: float, rows: int):
+        step = _current_step.get()
+        if step is not None:
+            self.statements[step] += 1
+
+    @staticmethod
+    def _user(user_id: int) -> User:
+        return User(id=user_id, is_bot=False, first_name=f"User{user_id}", username=f"user{user_id}")
+
+    def _message_update(self, user_id: int, text: str) -> Update:
+        message = Message(
+            message_id=next(self.update_ids),
+            date=datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            from_user=self._user(user_id),
+            text=text,
+        )
+        return Update(update_id=next(self.update_ids), message=message)
+
+    def _callback_update(self, user_id: int, data: str) -> Update:
+        message = Message(
+            message_id=1,
+            date=datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            from_user=User(id=1, is_bot=True, first_name="Bot"),
+            text=self.session.texts.get(user_id, ""),
+        )
+        callback = CallbackQuery(
+            id=str(next(self.update_ids)),
+            from_user=self._user(user_id),
+            chat_instance=str(user_id),
+            message=message,
+            data=data,
+        )
+        return Update(update_id=next(self.update_ids), callback_query=callback)
+
+    def pick_button(self, user_id: int, predicate: Callable[[str], bool]) -> Optional[str]:
+        """callback_data случайной кнопки из последней клавиатуры пользователя"""
+        markup = self.session.keyboards.get(user_id)
+        if not markup:
+            return None
+        options = [
+            button.callback_data
+            for row in markup.inline_keyboard
+            for button in row
+            if button.callback_data and predicate(button.callback_data)
+        ]
+        return self.rng.choice(options) if options else None
+
+    async def feed(self, step: str, update: Update):
+        token = _current_step.set(step)
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.errors[step] += 1
+            self.error_samples.setdefault(step, repr(e))
+        finally:
+            self.latencies[step].append(time.perf_counter() - started)
+            _current_step.reset(token)
+
+    async def run_user(self, user_id: int, rounds: int):
+        await self.feed("start", self._message_update(user_id, "/start"))
+        await self.feed("select_category", self._callback_update(user_id, "select_category"))
+        category = self.pick_button(user_id, lambda data: data.startswith("category_"))
+        if category is None:
+            self.errors["category_"] += 1
+            return
+        await self.feed("category_", self._callback_update(user_id, category))
+        await self.answer_rounds(user_id, rounds)
+        if self.review_rounds:
+            await self.feed("review_mode", self._callback_update(user_id, "review_mode"))
+            # Повторяем ту же категорию, где уже есть ответы
+            await self.feed("review_category_", self._callback_update(user_id, category))
+            await self.answer_rounds(user_id, self.review_rounds, prefix="review_")
+
+    async def answer_rounds(self, user_id: int, rounds: int, prefix: str = ""):
+        for _ in range(rounds):
+            answer = self.pick_button(user_id, lambda data: data.startswith("answer_"))
+            if answer is None:
+                # Вопросы в категории закончились
+                break
+            await self.feed(prefix + "answer_", self._callback_update(user_id, answer))
+            next_question = self.pick_button(user_id, lambda data: data.startswith("next_question_"))
+            if next_question is None:
+                break
+            await self.feed(prefix + "next_question_", self._callback_update(user_id, next_question))
+
+    async def run(self, users: int, rounds: int, concurrency: int, first_user_id: int = 100000,
+                  user_ids: Optional[List[int]] = None) -> Dict:
+        """user_ids задает конкретных пользователей, иначе first_user_id .. first_user_id + users - 1"""
+        if user_ids is None:
+            user_ids = list(range(first_user_id, first_user_id + users))
+        users = len(user_ids)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(user_id: int):
+            async with semaphore:
+                await self.run_user(user_id, rounds)
+
+        models.profiler.add_listener(self.on_statement)
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(limited(user_id) for user_id in user_ids))
+        finally:
+            models.profiler.remove_listener(self.on_statement)
+        elapsed = time.perf_counter() - started
+
+        total_updates = sum(len(v) for v in self.latencies.values())
+        steps = {}
+        for step, values in self.latencies.items():
+            steps[step] = {
+                'count': len(values),
+                'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+                'max_ms': round(max(values) * 1000, 3),
+                'sql_per_update': round(self.statements[step] / len(values), 2),
+                'errors': self.errors[step],
+            }
+        return {
+            'users': users,
+            'rounds': rounds,
+            'concurrency': concurrency,
+            'updates': total_updates,
+            'elapsed_s': round(elapsed, 3),
+            'updates_per_sec': round(total_updates / elapsed, 1) if elapsed else 0.0,
+            'sql_statements': sum(self.statements.values()),
+            'bot_api_calls': dict(self.session.calls),
+            'steps': steps,
+            'error_samples': self.error_samples,
+        }
+
+
+def print_report(report: Dict):
+    print(
+        f"users={report['users']} rounds={report['rounds']} concurrency={report['concurrency']} "
+        f"updates={report['updates']} elapsed={report['elapsed_s']}s "
+        f"-> {report['updates_per_sec']} updates/s, {report['sql_statements']} SQL statements"
+    )
+    print(f"{'step':<18}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'SQL/upd':>9}{'err':>6}")
+    for step, row in report['steps'].items():
+        print(
+            f"{step:<18}{row['count']:>8}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+            f"{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}{row['sql_per_update']:>9.2f}{row['errors']:>6}"
+        )
+    print("Bot API:", ", ".join(f"{name}={count}" for name, count in sorted(report['bot_api_calls'].items())))
+    for step, error in report['error_samples'].items():
+        print(f"first error in {step}: {error}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк цикла викторины через dp.feed_update")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3, help="пар answer/next_question на пользователя")
+    parser.add_argument("--concurrency", type=int, default=100, help="одновременно активных пользователей")
+    parser.add_argument("--review-rounds", type=int, default=0, help="пар answer/next_question в режиме повторения")
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=200, help="вопросов в категории")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="искусственная задержка Bot API")
+    parser.add_argument("--db", default=None, help="путь к БД (по умолчанию временный файл)")
+    parser.add_argument("--json", default=None, help="сохранить отчет в JSON")
+    args = parser.parse_args()
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="quizbench-"), "bench.db")
+    if args.db is None:
+        await create_dataset(db_path, DatasetSpec(
+            categories=args.categories,
+            questions=args.categories * args.questions,
+            users=0,
+            user_answers=0,
+            messages_users=0,
+            explanation_ratio=1.0,
+        ))
+    else:
+        use_database(db_path)
+        await models.create_all_tables()
+
+    session = FakeSession(latency=args.api_latency_ms / 1000)
+    session.middleware(BotApiTracingMiddleware())
+    bot = Bot(token="42:BENCHMARK", session=session)
+    # Синтетические пользователи нажимают кнопки быстрее людей - антифлуд выключен
+    dp = create_dispatcher(with_ai=False, throttle=False)
+    benchmark = QuizLoopBenchmark(dp, bot, session, review_rounds=args.review_rounds)
+    report = await benchmark.run(args.users, args.rounds, args.concurrency)
+    report['db_path'] = db_path
+    report['backend'] = models.backend.name
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""Масштабирование режима cluster.py: пропускная способность цикла викторины на 1..N воркерах.
+
+Для каждого N запускаются N процессов с тем же распределением пользователей,
+что и во входном процессе (shard_for), каждый гоняет свою долю пользователей
+через собственный Dispatcher и FakeSession. Все воркеры работают с одной БД
+(SQLite в режиме WAL или PostgreSQL при DB_BACKEND=postgres), общее число
+одновременно активных пользователей не зависит от N.
+Сценарий интерактивный (следующая кнопка берется из ответа бота), поэтому
+пользователей имитирует сам воркер, а не входной процесс.
+
+    python -m <package>.benchmarks.sharding --workers 1,2,4 --users 2000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict, List
+from aiogram import Bot
+from .dataset import DatasetSpec, create_dataset, use_database
+from .fake_session import FakeSession
+from .quiz_loop import QuizLoopBenchmark
+from ..cluster import prepare_database, shard_for
+from ..database import models
+
+
+def _run_shard(index: int, workers: int, args: Dict, barrier, results):
+    """Тело процесса-воркера: ждет остальных и прогоняет своих пользователей"""
+    from ..app import create_dispatcher
+
+    async def run() -> Dict:
+        logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+        use_database(args['db'])
+        session = FakeSession(latency=args['api_latency_ms'] / 1000)
+        bot = Bot(token="42:BENCHMARK", session=session)
+        dp = create_dispatcher(with_ai=False, throttle=False)
+        benchmark = QuizLoopBenchmark(dp, bot, session, seed=index + 1)
+        user_ids = [
+            user_id for user_id in range(args['first_user_id'], args['first_user_id'] + args['users'])
+            if shard_for(user_id, workers) == index
+        ]
+        concurrency = max(1, args['concurrency'] // workers)
+        await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+        return await benchmark.run(0, args['rounds'], concurrency, user_ids=user_ids)
+
+    results.put((index, asyncio.run(run())))
+
+
+def run_workers(workers: int, args: Dict) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_run_shard, args=(i, workers, args, barrier, results))
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    updates = sum(report['updates'] for _, report in reports)
+    elapsed = max(report['elapsed_s'] for _, report in reports)
+    errors = sum(step['errors'] for _, report in reports for step in report['steps'].values())
+    p95 = {}
+    for step in ("answer_", "next_question_"):
+        values = [report['steps'][step]['p95_ms'] for _, report in reports if step in report['steps']]
+        p95[step] = max(values) if values else 0.0
+    return {
+        'workers': workers,
+        'updates': updates,
+        'elapsed_s': elapsed,
+        'updates_per_sec': round(updates / elapsed, 1) if elapsed else 0.0,
+        'errors': errors,
+        'p95_ms': p95,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Масштабирование цикла викторины по числу воркеров")
+    parser.add_argument("--workers", default=None, help="список через запятую (по умолчанию 1,2,4..ядра)")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=100, help="всего одновременно активных пользователей")
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=200, help="вопросов в категории")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0)
+    parser.add_argument("--json", default=None, help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    if args.workers:
+        counts = [int(x) for x in args.workers.split(",")]
+    else:
+        cores = os.cpu_count() or 1
+        counts = sorted({1, *[2 ** i for i in range(1, cores.bit_length()) if 2 ** i <= cores], cores})
+
+    rows = []
+    for workers in counts:
+        # Свежая БД на каждый прогон, чтобы ответы прошлых прогонов не влияли на выборки
+        db_path = os.path.join(tempfile.mkdtemp(prefix="shardbench-"), "bench.db")
+        asyncio.run(create_dataset(db_path, DatasetSpec(
+            categories=args.categories,
+            questions=args.categories * args.questions,
+            users=0,
+            user_answers=0,
+            messages_users=0,
+            explanation_ratio=1.0,
+        )))
+        # generate_dataset возвращает режим журнала по умолчанию - воркерам нужен WAL
+        asyncio.run(prepare_database())
+        shard_args = {
+            'db': db_path,
+            'users': args.users,
+            'rounds': args.rounds,
+            'concurrency': args.concurrency,
+            'api_latency_ms': args.api_latency_ms,
+            'first_user_id': 100000,
+        }
+        started = time.perf_counter()
+        row = run_workers(workers, shard_args)
+        row['wall_s'] = round(time.perf_counter() - started, 2)
+        rows.append(row)
+        print(
+            f"workers={workers:<3} {row['updates_per_sec']:>9.1f} updates/s  "
+            f"x{row['updates_per_sec'] / rows[0]['updates_per_sec']:.2f}  "
+            f"p95 answer {row['p95_ms']['answer_']:.1f} ms  errors={row['errors']}",
+            flush=True,
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
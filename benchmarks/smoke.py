@@ -0,0 +1,95 @@
+"""Быстрая проверка сборки бота: один апдейт каждого вида через все middleware и хендлеры.
+
+Собирает тот же Dispatcher, что и app.main(), и отправляет через dp.feed_update
+сообщение /start и нажатие select_category. Проверяет, что апдейты дошли до
+хендлеров без исключений, HandlerMetricsMiddleware их посчитал, а бот ответил.
+Затем админ в состоянии ввода названия категории отправляет два сообщения
+подряд: второе должно увидеть состояние, сброшенное первым (UserQueueMiddleware
+перечитывает его под замком), и не создать вторую категорию.
+При ошибке скрипт завершается с кодом 1.
+
+    python -m <package>.benchmarks.smoke
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+from typing import List
+from aiogram import Bot
+from .dataset import DatasetSpec, create_dataset
+from .fake_session import FakeSession
+from .quiz_loop import QuizLoopBenchmark
+from ..app import create_dispatcher
+from ..config.settings import settings
+from ..database import models
+from ..handlers.admin import AdminStates
+from ..utils.metrics import metrics
+
+USER_ID = 100000
+
+
+async def run_checks() -> List[str]:
+    """Список проблем (пустой - проверка пройдена)"""
+    await create_dataset(os.path.join(tempfile.mkdtemp(prefix="smoke-"), "smoke.db"), DatasetSpec(
+        categories=2, questions=10, users=0, user_answers=0, messages_users=0, explanation_ratio=1.0,
+    ))
+    session = FakeSession()
+    bot = Bot(token="42:BENCHMARK", session=session)
+    dp = create_dispatcher(with_ai=False)
+    benchmark = QuizLoopBenchmark(dp, bot, session)
+    problems = []
+    for step, update, handler, kind in (
+        ("start", benchmark._message_update(USER_ID, "/start"), "/start", "message"),
+        ("select_category", benchmark._callback_update(USER_ID, "select_category"), "select_category", "callback"),
+    ):
+        before = metrics.counter("bot_handler_requests_total", handler=handler, kind=kind)
+        await benchmark.feed(step, update)
+        if benchmark.errors[step]:
+            problems.append(f"{step}: {benchmark.error_samples[step]}")
+        elif metrics.counter("bot_handler_requests_total", handler=handler, kind=kind) != before + 1:
+            problems.append(f"{step}: HandlerMetricsMiddleware не посчитал апдейт")
+        elif metrics.counter("bot_handler_errors_total", handler=handler, kind=kind):
+            problems.append(f"{step}: исключение в хендлере")
+    if not session.calls:
+        problems.append("бот не вызвал ни одного метода Bot API")
+    problems += await check_state_under_lock(dp, benchmark)
+    await bot.session.close()
+    await models.backend.close()
+    return problems
+
+
+async def check_state_under_lock(dp, benchmark: QuizLoopBenchmark) -> List[str]:
+    """Второе сообщение, пришедшее во время обработки первого, маршрутизируется по новому состоянию"""
+    admin_ids = settings.ADMIN_IDS
+    settings.ADMIN_IDS = frozenset({USER_ID})
+    try:
+        await dp.fsm.get_context(benchmark.bot, USER_ID, USER_ID).set_state(AdminStates.waiting_new_category_name)
+        names = ("Проверка очереди 1", "Проверка очереди 2")
+        await asyncio.gather(*(
+            benchmark.feed("admin_category", benchmark._message_update(USER_ID, name)) for name in names
+        ))
+    finally:
+        settings.ADMIN_IDS = admin_ids
+    async with models.connect() as conn:
+        cursor = await conn.execute("SELECT COUNT(*) FROM categories WHERE name IN (?, ?)", names)
+        created = (await cursor.fetchone())[0]
+    if benchmark.errors["admin_category"]:
+        return [f"admin_category: {benchmark.error_samples['admin_category']}"]
+    if created != 1:
+        return [f"admin_category: создано категорий {created} вместо 1 - состояние прочитано до очереди"]
+    return []
+
+
+async def main():
+    logging.getLogger("aiogram.event").setLevel(logging.WARNING)
+    problems = await run_checks()
+    for problem in problems:
+        print("FAIL", problem)
+    if problems:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+"""Многопроцессный режим: входной процесс получает апдейты и раздает их воркерам.
+
+Апдейт уходит воркеру с номером user_id % N, поэтому все апдейты пользователя
+обрабатывает один процесс: FSM (MemoryStorage) пользователя живет в нем,
+а UserQueueMiddleware выполняет апдейты пользователя в порядке получения.
+
+    python -m cluster --workers 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+from typing import Any, Dict, List, Optional, Set
+from aiogram import Bot
+from .app import create_dispatcher, install_settings_reload
+from .services.archiver import start_background_archiver
+from .services.leaderboard import leaderboard, start_background_leaderboard
+from .services.stats_snapshot import start_background_stats
+from .config import settings
+from .database import models
+from .middlewares import BotApiTracingMiddleware
+from .utils.logger import logger, setup_logging
+from .utils.metrics import start_metrics_server
+from .utils.tracing import tracer
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """id пользователя (или чата) из сырого апдейта"""
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return user["id"]
+        chat = value.get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return None
+
+
+def shard_for(user_id: Optional[int], workers: int) -> int:
+    """Номер воркера для пользователя; апдейты без пользователя - воркеру 0"""
+    if user_id is None:
+        return 0
+    return user_id % workers
+
+
+def _setup_process_logging():
+    setup_logging(
+        settings.LOG_LEVEL,
+        settings.LOG_FORMAT,
+        rate_window=settings.LOG_RATE_WINDOW,
+        rate_burst=settings.LOG_RATE_BURST,
+        rate_sample=settings.LOG_RATE_SAMPLE,
+    )
+
+
+class Worker:
+    """Воркер: свой Bot, Dispatcher и MemoryStorage; порядок апдейтов пользователя держит UserQueueMiddleware"""
+
+    def __init__(self, index: int, queue: multiprocessing.Queue):
+        self.index = index
+        self.queue = queue
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def _process(self, dp, bot: Bot, update: Dict[str, Any]):
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            logger.exception("worker %s failed to process update %s", self.index, update.get("update_id"))
+
+    async def run(self):
+        _setup_process_logging()
+        tracer.configure(settings.TRACE_ENABLED, settings.TRACE_BUFFER, settings.TRACE_FILE)
+        bot = Bot(token=settings.BOT_TOKEN)
+        bot.session.middleware(BotApiTracingMiddleware())
+        if settings.METRICS_PORT:
+            await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT + 1 + self.index)
+        dp = create_dispatcher()
+        # Каждый процесс перечитывает настройки сам: сигнал отправляется группе (kill -HUP -<pgid>)
+        install_settings_reload()
+        # Архивация истории и снимок статистики - одни на все процессы
+        background_tasks = [start_background_archiver(), start_background_stats()] if self.index == 0 else []
+        # Рейтинг в памяти у каждого воркера (обновления своих пользователей + периодическая перезагрузка)
+        background_tasks.append(start_background_leaderboard())
+        loop = asyncio.get_running_loop()
+        logger.info("worker %s started (pid %s)", self.index, os.getpid())
+        try:
+            while True:
+                update = await loop.run_in_executor(None, self.queue.get)
+                if update is None:
+                    break
+                task = asyncio.create_task(self._process(dp, bot, update))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        finally:
+            for task in background_tasks:
+                if task is not None:
+                    task.cancel()
+            try:
+                # Недельные очки рейтинга, накопленные после последнего сохранения
+                await leaderboard.flush()
+            except Exception:
+                logger.exception("leaderboard flush failed")
+            await bot.session.close()
+            logger.info("worker %s stopped", self.index)
+
+
+def worker_main(index: int, queue: multiprocessing.Queue):
+    # Ctrl+C получает вся группа процессов; воркер дорабатывает очередь до сигнала от входа
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(Worker(index, queue).run())
+
+
+class Ingress:
+    """Входной процесс: long polling getUpdates и раздача апдейтов по воркерам"""
+
+    def __init__(self, queues: List[multiprocessing.Queue]):
+        self.queues = queues
+
+    async def run(self):
+        bot = Bot(token=settings.BOT_TOKEN)
+        allowed_updates = create_dispatcher().resolve_used_update_types()
+        install_settings_reload()
+        offset = None
+        backoff = 1.0
+        try:
+            while True:
+                try:
+                    updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates)
+                except Exception as e:
+                    logger.warning("getUpdates failed: %s, retry in %.0f s", e, backoff)
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+                backoff = 1.0
+                for update in updates:
+                    offset = update.update_id + 1
+                    raw = update.model_dump(mode="json", by_alias=True, exclude_none=True)
+                    self.queues[shard_for(update_user_id(raw), len(self.queues))].put(raw)
+        finally:
+            await bot.session.close()
+
+
+async def prepare_database():
+    await models.create_all_tables()
+    if models.backend.name == "sqlite":
+        # Несколько процессов пишут в один файл: WAL позволяет читать во время записи
+        async with models.connect() as conn:
+            await conn.execute("PRAGMA journal_mode = WAL")
+    # Пул PostgreSQL привязан к циклу событий этого asyncio.run
+    await models.backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бот в режиме вход + N воркеров")
+    parser.add_argument("--workers", type=int, default=settings.CLUSTER_WORKERS or os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    _setup_process_logging()
+    asyncio.run(prepare_database())
+
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue() for _ in range(args.workers)]
+    processes = [context.Process(target=worker_main, args=(i, queue), name=f"worker-{i}") for i, queue in enumerate(queues)]
+    for process in processes:
+        process.start()
+    logger.info("ingress started with %s workers", args.workers)
+    try:
+        asyncio.run(Ingress(queues).run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            process.join(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ from .keyboards import (
     get_admin_keyboard,
     get_learning_keyboard,
     get_learning_keyboard_main,
+    get_leaderboard_keyboard,
     get_categories_keyboard,
     get_my_keyboard,
     admin_get_categories_keyboard,
@@ -20,6 +21,7 @@ __all__ = [
     'get_admin_keyboard',
     'get_learning_keyboard',
     'get_learning_keyboard_main',
+    'get_leaderboard_keyboard',
     'get_categories_keyboard',
     'get_my_keyboard',
     'admin_get_categories_keyboard',
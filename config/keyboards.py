@@ -1,6 +1,8 @@
 from aiogram import types
-from typing import Dict
+from typing import Dict, Optional
+from .settings import settings
 from ..database.models import CategoryManager, QuestionManager
+from ..utils.callback_tokens import answer_tokens
 
 def get_my_keyboard(role: str, data: Dict[str, str]) -> types.InlineKeyboardMarkup:
     buttons = []
@@ -22,6 +24,7 @@ def get_base_keyboard():
         inline_keyboard=[
             [types.InlineKeyboardButton(text="📚 Начать обучение", callback_data="start_learning")],
             [types.InlineKeyboardButton(text="📊 Моя статистика", callback_data="my_stats")],
+            [types.InlineKeyboardButton(text="🏆 Рейтинг", callback_data="leaderboard")],
             [types.InlineKeyboardButton(text="ℹ️ О боте", callback_data="about")]
         ]
     )
@@ -31,10 +34,27 @@ def get_admin_keyboard():
         inline_keyboard=[
             [types.InlineKeyboardButton(text="📢 Рассылка", callback_data="admin_mailing")],
             [types.InlineKeyboardButton(text="❓ Управление вопросами", callback_data="admin_questions")],
-            [types.InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")]
+            [types.InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")],
+            [types.InlineKeyboardButton(text="📤 Выгрузки", callback_data="admin_export")]
         ]
     )
 
+# Выгрузки для преподавателей (services/exporter.py): вид -> название кнопки
+EXPORT_KINDS = {
+    "progress": "👥 Прогресс пользователей",
+    "questions": "❓ Итоги по вопросам",
+    "answers": "✍️ Все ответы",
+}
+
+def get_export_keyboard():
+    return types.InlineKeyboardMarkup(
+        inline_keyboard=[
+            [types.InlineKeyboardButton(text=f"{title} · {fmt.upper()}", callback_data=f"admin_export_{kind}_{fmt}")
+             for fmt in ("csv", "ndjson")]
+            for kind, title in EXPORT_KINDS.items()
+        ] + [[types.InlineKeyboardButton(text="Назад", callback_data="admin")]]
+    )
+
 def get_learning_keyboard():
     """Клавиатура обучения без кнопки случайного вопроса (для всех внутренних экранов)."""
     return types.InlineKeyboardMarkup(
@@ -42,6 +62,7 @@ def get_learning_keyboard():
             [types.InlineKeyboardButton(text="🔁 Повторение", callback_data="review_mode")],
             [types.InlineKeyboardButton(text="📚 Выбрать категорию", callback_data="select_category")],
             [types.InlineKeyboardButton(text="📊 Моя статистика", callback_data="my_stats")],
+            [types.InlineKeyboardButton(text="🏆 Рейтинг", callback_data="leaderboard")],
             [types.InlineKeyboardButton(text="🔙 Назад", callback_data="start_learning")]
         ]
     )
@@ -58,6 +79,18 @@ def get_learning_keyboard_main():
         ]
     )
 
+def get_leaderboard_keyboard(weekly: bool):
+    """Переключение между рейтингом за неделю и за все время"""
+    switch = (types.InlineKeyboardButton(text="🏆 За все время", callback_data="leaderboard") if weekly
+              else types.InlineKeyboardButton(text="📅 За неделю", callback_data="leaderboard_week"))
+    return types.InlineKeyboardMarkup(
+        inline_keyboard=[
+            [switch],
+            [types.InlineKeyboardButton(text="📊 Моя статистика", callback_data="my_stats")],
+            [types.InlineKeyboardButton(text="🏠 Главное меню", callback_data="main_menu")]
+        ]
+    )
+
 def get_repeat_session_completed_keyboard():
     """Клавиатура когда все вопросы в сессии повторения закончились"""
     return types.InlineKeyboardMarkup(
@@ -101,8 +134,25 @@ async def admin_get_categories_for_questions_keyboard():
     buttons.append([types.InlineKeyboardButton(text="Назад", callback_data="admin")])
     return types.InlineKeyboardMarkup(inline_keyboard=buttons)
 
-async def get_categories_keyboard():
-    categories = await CategoryManager.get_available_categories()
+def _page_navigation(callback_prefix: str, prev_cursor, next_cursor):
+    """Ряд кнопок соседних страниц: callback_data = <prefix>prev_<id> / <prefix>next_<id>"""
+    row = []
+    if prev_cursor is not None:
+        row.append(types.InlineKeyboardButton(text="◀️", callback_data=f"{callback_prefix}prev_{prev_cursor}"))
+    if next_cursor is not None:
+        row.append(types.InlineKeyboardButton(text="▶️", callback_data=f"{callback_prefix}next_{next_cursor}"))
+    return [row] if row else []
+
+async def get_categories_keyboard(cursor: Optional[int] = None, backward: bool = False):
+    """Категории для обучения постранично (KEYBOARD_PAGE_SIZE); cursor - id категории с соседней страницы"""
+    categories, prev_cursor, next_cursor = await CategoryManager.get_available_categories_page(
+        cursor, backward, settings.KEYBOARD_PAGE_SIZE
+    )
+    if not categories and cursor is not None:
+        # Курсорная категория удалена или страница опустела - начинаем сначала
+        categories, prev_cursor, next_cursor = await CategoryManager.get_available_categories_page(
+            None, False, settings.KEYBOARD_PAGE_SIZE
+        )
     buttons = []
     row = []
     if not categories:
@@ -117,17 +167,18 @@ async def get_categories_keyboard():
                 row = []
         if row:
             buttons.append(row)
+    buttons += _page_navigation("catpage_", prev_cursor, next_cursor)
     buttons.append([types.InlineKeyboardButton(text="🔙 Назад", callback_data="start_learning")])
     return types.InlineKeyboardMarkup(inline_keyboard=buttons)
 
-def get_question_keyboard(answers):
-    """Создает клавиатуру с вариантами ответов"""
+def get_question_keyboard(answers, user_id, question_id, category_id, is_repeat_mode=False):
+    """Создает клавиатуру с вариантами ответов (callback_data подписан, см. utils/callback_tokens.py)"""
     buttons = []
     for answer in answers:
         answer_id, answer_text, is_correct = answer
         buttons.append([types.InlineKeyboardButton(
             text=answer_text, 
-            callback_data=f"answer_{answer_id}"
+            callback_data=answer_tokens.sign(user_id, question_id, answer_id, category_id, bool(is_correct), is_repeat_mode)
         )])
     return types.InlineKeyboardMarkup(inline_keyboard=buttons)
 
@@ -141,9 +192,15 @@ def get_question_navigation_keyboard(question_id, category_id):
         ]
     )
 
-async def admin_get_questions_keyboard(category_id):
-    """Клавиатура для управления вопросами в админ-панели"""
-    questions = await QuestionManager.get_all_questions_by_category(category_id)
+async def admin_get_questions_keyboard(category_id, cursor: Optional[int] = None, backward: bool = False):
+    """Клавиатура для управления вопросами в админ-панели (страница KEYBOARD_PAGE_SIZE вопросов, новые первыми)"""
+    questions, prev_cursor, next_cursor = await QuestionManager.get_questions_page(
+        category_id, cursor, backward, settings.KEYBOARD_PAGE_SIZE
+    )
+    if not questions and cursor is not None:
+        questions, prev_cursor, next_cursor = await QuestionManager.get_questions_page(
+            category_id, None, False, settings.KEYBOARD_PAGE_SIZE
+        )
     buttons = []
     
     if not questions:
@@ -159,6 +216,7 @@ async def admin_get_questions_keyboard(category_id):
                 callback_data=f"admin_question_{question_id}"
             )])
     
+    buttons += _page_navigation(f"admin_qpage_{category_id}_", prev_cursor, next_cursor)
     buttons.append([types.InlineKeyboardButton(text="➕ Добавить вопрос", callback_data=f"admin_add_question_{category_id}")])
     buttons.append([types.InlineKeyboardButton(text="🗑️ Удалить категорию", callback_data=f"delete_category_{category_id}")])
     buttons.append([types.InlineKeyboardButton(text="Назад", callback_data="admin_questions")])
@@ -1,37 +1,224 @@
+import logging
 import os
-from dotenv import load_dotenv
+from dataclasses import dataclass, field, fields
+from typing import FrozenSet, List, Mapping, Optional
+from dotenv import dotenv_values, load_dotenv
+
+# Окружение процесса до чтения .env: при перезагрузке оно, как и при старте, важнее .env
+_PROCESS_ENV = dict(os.environ)
 
 # Загружаем переменные окружения из .env файла
 load_dotenv()
 
+_TRUE = {"1", "true", "yes", "on"}
+_FALSE = {"0", "false", "no", "off", ""}
+
+
+def _parse(name: str, kind, raw: str):
+    if kind is bool:
+        value = raw.strip().lower()
+        if value not in _TRUE | _FALSE:
+            raise ValueError(f"{name}: ожидается 1/0, получено {raw!r}")
+        return value in _TRUE
+    if kind == FrozenSet[int]:
+        try:
+            return frozenset(int(item) for item in raw.split(",") if item.strip())
+        except ValueError:
+            raise ValueError(f"{name}: ожидаются целые числа через запятую, получено {raw!r}") from None
+    if kind in (int, float):
+        try:
+            return kind(raw)
+        except ValueError:
+            raise ValueError(f"{name}: ожидается {'целое ' if kind is int else ''}число, получено {raw!r}") from None
+    return raw
+
+
+@dataclass
 class Settings:
-    # Основные настройки бота
-    BOT_TOKEN = os.getenv("BOT_TOKEN")
-    
+    """Настройки из переменных окружения и .env, разобранные по типам полей и проверенные при загрузке.
+
+    settings.reload() (SIGHUP, см. app.install_settings_reload) перечитывает .env и
+    обновляет поля того же объекта. Значения, которые читаются при каждом обращении
+    (ADMIN_IDS, KEYBOARD_PAGE_SIZE, пороги логов), меняются сразу; размеры пулов,
+    кэшей и интервалы фоновых задач задаются при старте и требуют перезапуска.
+    """
+
+    # Основные настройки бота (секреты не попадают в repr)
+    BOT_TOKEN: Optional[str] = field(default=None, repr=False)
+
     # AI настройки
-    DEEP_KEY = os.getenv("DEEP_KEY")
-    
-    # Настройки админов
-    ADMIN_IDS = os.getenv("ADMIN_IDS", "")
-    
+    DEEP_KEY: Optional[str] = field(default=None, repr=False)
+    AI_BASE_URL: str = "https://bothub.chat/api/v2/openai/v1"
+    AI_MODEL: str = "gpt-4.1-nano"
+    AI_TIMEOUT: float = 30.0
+
+    # Резервная модель/эндпоинт (включается, если задан AI_FALLBACK_MODEL или AI_FALLBACK_BASE_URL)
+    AI_FALLBACK_BASE_URL: str = ""
+    AI_FALLBACK_MODEL: str = ""
+    AI_FALLBACK_KEY: str = field(default="", repr=False)
+
+    # Предохранитель (circuit breaker) для AI
+    AI_CB_FAILURE_RATE: float = 0.5
+    AI_CB_SLOW_CALL_SECONDS: float = 15.0
+    AI_CB_SLOW_CALL_RATE: float = 0.5
+    AI_CB_WINDOW: int = 20
+    AI_CB_MIN_CALLS: int = 5
+    AI_CB_OPEN_SECONDS: float = 30.0
+
+    # Ключ подписи кнопок ответа (по умолчанию выводится из BOT_TOKEN)
+    CALLBACK_SECRET: str = field(default="", repr=False)
+
+    # Настройки админов: ID через запятую
+    ADMIN_IDS: FrozenSet[int] = frozenset()
+
     # Дополнительные настройки
-    CHANNEL_URL = os.getenv("CHANNEL_URL", "")
-    
-    # Настройки базы данных
-    DB_PATH = os.getenv("DB_PATH", "russian_teacher.db")
-    
-    @classmethod
-    def get_admin_ids(cls):
-        """Возвращает список ID администраторов"""
-        if not cls.ADMIN_IDS:
-            return []
-        return [int(x.strip()) for x in cls.ADMIN_IDS.split(",") if x.strip()]
-    
+    CHANNEL_URL: str = ""
+
+    # Настройки базы данных: бэкенд sqlite (файл DB_PATH) или postgres (DB_DSN, пул asyncpg)
+    DB_BACKEND: str = "sqlite"
+    DB_PATH: str = "russian_teacher.db"
+    DB_DSN: str = field(default="", repr=False)
+    DB_POOL_MIN: int = 1
+    DB_POOL_MAX: int = 10
+    # Кэш вопросов с ответами в памяти процесса (размер, TTL в секундах)
+    QUESTION_CACHE_SIZE: int = 10000
+    QUESTION_CACHE_TTL: float = 600.0
+    # Списки категорий и вопросов на клавиатурах: кнопок на странице, TTL (сек) и размер кэша страниц
+    KEYBOARD_PAGE_SIZE: int = 20
+    KEYBOARD_PAGE_CACHE_TTL: float = 300.0
+    KEYBOARD_PAGE_CACHE_SIZE: int = 4096
+    # Почти-дубликаты вопросов: порог сходства (0..1) и перезагрузка индекса из БД в секундах
+    DEDUP_THRESHOLD: float = 0.8
+    DEDUP_RELOAD_INTERVAL: float = 300.0
+    # Предзагрузка следующего вопроса, пока пользователь читает объяснение (TTL в секундах)
+    PREFETCH_ENABLED: bool = True
+    PREFETCH_TTL: float = 90.0
+    PREFETCH_MAX_USERS: int = 10000
+    # Колоды вопросов сессии: выбор вопросов одним запросом при входе в категорию.
+    # Версия банка вопросов кэшируется на BANK_VERSION_TTL секунд (правки в других процессах)
+    DECK_MODE: bool = True
+    BANK_VERSION_TTL: float = 5.0
+    BANK_VERSION_CACHE_SIZE: int = 4096
+    # Интервальное повторение (SM-2): размер пачки режима повторения и возврат вопроса после ошибки (сек)
+    REVIEW_BATCH_SIZE: int = 20
+    REVIEW_RELEARN_SECONDS: int = 600
+    # Архив user_answers: ответы старше ARCHIVE_HORIZON_DAYS переносятся порциями в архивную БД
+    # (SQLite - файл ARCHIVE_DB_PATH через ATTACH, по умолчанию рядом с DB_PATH; PostgreSQL - схема archive).
+    # ARCHIVE_INTERVAL - период фонового прохода в секундах, 0 - только вручную (services/archiver.py)
+    ARCHIVE_DB_PATH: str = ""
+    ARCHIVE_HORIZON_DAYS: int = 90
+    ARCHIVE_CHUNK_SIZE: int = 5000
+    ARCHIVE_INTERVAL: float = 0.0
+    # Период пересчета снимка статистики админ-панели в секундах (0 - только по кнопке "Обновить")
+    STATS_SNAPSHOT_INTERVAL: float = 300.0
+    # Рейтинг: размер топа, период сохранения недельных очков и полной перезагрузки из БД (сек, 0 - только при старте)
+    LEADERBOARD_TOP: int = 10
+    LEADERBOARD_FLUSH_INTERVAL: float = 60.0
+    LEADERBOARD_REBUILD_INTERVAL: float = 900.0
+    # Выгрузки для преподавателей: строк в порции курсора и размер части gzip-файла (МБ, лимит Bot API - 50)
+    EXPORT_BATCH_SIZE: int = 5000
+    EXPORT_PART_MB: int = 45
+    # Антифлуд: корзина токенов на пользователя для кнопок, сообщений AI-чату и админ-панели.
+    # RATE - апдейтов в секунду в среднем (0 - без ограничения), BURST - сколько можно подряд;
+    # THROTTLE_MAX_USERS - сколько корзин держать в памяти (простаивающие удаляются раньше)
+    THROTTLE_CALLBACK_RATE: float = 3.0
+    THROTTLE_CALLBACK_BURST: int = 10
+    THROTTLE_CHAT_RATE: float = 0.5
+    THROTTLE_CHAT_BURST: int = 5
+    THROTTLE_ADMIN_RATE: float = 5.0
+    THROTTLE_ADMIN_BURST: int = 30
+    THROTTLE_MAX_USERS: int = 100000
+    # Профилирование SQL и порог медленного запроса (мс)
+    DB_PROFILE: bool = True
+    DB_SLOW_QUERY_MS: float = 100.0
+
+    # Локальный эндпоинт метрик Prometheus (0 - выключен)
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9108
+
+    # Число воркеров в режиме cluster.py (0 - по числу ядер)
+    CLUSTER_WORKERS: int = 0
+
+    # Трассировка апдейтов: кольцевой буфер в памяти (/traces) и опционально JSONL-файл
+    TRACE_ENABLED: bool = True
+    TRACE_BUFFER: int = 200
+    TRACE_FILE: str = ""
+
+    # Логирование: уровень, формат (json/text), ограничение повторяющихся ошибок
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_RATE_WINDOW: float = 60.0
+    LOG_RATE_BURST: int = 5
+    LOG_RATE_SAMPLE: int = 100
+    # Хендлеры дольше порога (мс) пишутся в лог с задержкой
+    LOG_SLOW_HANDLER_MS: float = 1000.0
+
     @classmethod
-    def is_admin(cls, user_id: int) -> bool:
+    def from_env(cls, environ: Mapping[str, str]) -> "Settings":
+        """Настройки из словаря переменных; ValueError со всеми ошибками сразу"""
+        values, errors = {}, []
+        for setting in fields(cls):
+            raw = environ.get(setting.name)
+            if raw is None:
+                continue
+            try:
+                values[setting.name] = _parse(setting.name, setting.type, raw)
+            except ValueError as e:
+                errors.append(str(e))
+        loaded = cls(**values)
+        errors += loaded.validate() if not errors else []
+        if errors:
+            raise ValueError("Неверные настройки: " + "; ".join(errors))
+        return loaded
+
+    def validate(self) -> List[str]:
+        """Ошибки в значениях (пустой список - настройки корректны)"""
+        errors = []
+        for setting in fields(self):
+            value = getattr(self, setting.name)
+            if setting.type in (int, float) and value < 0:
+                errors.append(f"{setting.name} не может быть отрицательным")
+        if self.DB_BACKEND not in ("sqlite", "postgres"):
+            errors.append(f"DB_BACKEND: sqlite или postgres, получено {self.DB_BACKEND!r}")
+        if self.DB_BACKEND == "postgres" and not self.DB_DSN:
+            errors.append("DB_BACKEND=postgres требует DB_DSN")
+        if self.DB_POOL_MAX < max(1, self.DB_POOL_MIN):
+            errors.append("DB_POOL_MAX должен быть не меньше DB_POOL_MIN и 1")
+        # Telegram принимает до 100 кнопок в клавиатуре, часть занимают навигация и "Назад"
+        if not 1 <= self.KEYBOARD_PAGE_SIZE <= 90:
+            errors.append("KEYBOARD_PAGE_SIZE: от 1 до 90")
+        if not 0 < self.DEDUP_THRESHOLD <= 1:
+            errors.append("DEDUP_THRESHOLD: от 0 (не включая) до 1")
+        for name in ("AI_CB_FAILURE_RATE", "AI_CB_SLOW_CALL_RATE"):
+            if getattr(self, name) > 1:
+                errors.append(f"{name}: доля от 0 до 1")
+        if not 1 <= self.EXPORT_PART_MB < 50:
+            errors.append("EXPORT_PART_MB: от 1 до 49 (лимит Bot API - 50 МБ)")
+        for kind in ("CALLBACK", "CHAT", "ADMIN"):
+            if getattr(self, f"THROTTLE_{kind}_RATE") > 0 and getattr(self, f"THROTTLE_{kind}_BURST") < 1:
+                errors.append(f"THROTTLE_{kind}_BURST: не меньше 1, если задан THROTTLE_{kind}_RATE")
+        if self.LOG_FORMAT not in ("json", "text"):
+            errors.append(f"LOG_FORMAT: json или text, получено {self.LOG_FORMAT!r}")
+        if not isinstance(logging.getLevelName(self.LOG_LEVEL.upper()), int):
+            errors.append(f"LOG_LEVEL: неизвестный уровень {self.LOG_LEVEL!r}")
+        return errors
+
+    def reload(self) -> List[str]:
+        """Перечитывает .env и обновляет поля; возвращает имена изменившихся настроек.
+
+        При ошибке в новых значениях бросает ValueError и оставляет прежние.
+        """
+        environ = {key: value for key, value in dotenv_values().items() if value is not None}
+        environ.update(_PROCESS_ENV)
+        fresh = Settings.from_env(environ)
+        changed = [setting.name for setting in fields(self) if getattr(self, setting.name) != getattr(fresh, setting.name)]
+        for name in changed:
+            setattr(self, name, getattr(fresh, name))
+        return changed
+
+    def is_admin(self, user_id: int) -> bool:
         """Проверяет, является ли пользователь администратором"""
-        return user_id in cls.get_admin_ids()
+        return user_id in self.ADMIN_IDS
 
-# Создаем глобальный экземпляр настроек
-settings = Settings() 
-        
\ No newline at end of file
+# Создаем глобальный экземпляр настроек (проверяется один раз при импорте)
+settings = Settings.from_env(os.environ)
@@ -14,7 +14,13 @@ from .models import (
     MessageManager,
     CategoryManager,
     QuestionManager,
-    ProgressManager
+    ProgressManager,
+    ReviewManager,
+    ArchiveManager,
+    StatsManager,
+    LeaderboardManager,
+    ExportManager,
+    JobManager
 )
 
 __all__ = [
@@ -32,5 +38,11 @@ __all__ = [
     'MessageManager',
     'CategoryManager',
     'QuestionManager',
-    'ProgressManager'
+    'ProgressManager',
+    'ReviewManager',
+    'ArchiveManager',
+    'StatsManager',
+    'LeaderboardManager',
+    'ExportManager',
+    'JobManager'
 ]
\ No newline at end of file
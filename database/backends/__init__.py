@@ -0,0 +1,26 @@
+from typing import Optional
+from .base import StorageBackend
+from .sqlite import SQLiteBackend
+from .postgres import PostgresBackend
+from ..profiler import QueryProfiler
+
+
+def create_backend(settings, profiler: Optional[QueryProfiler] = None) -> StorageBackend:
+    """Бэкенд по настройке DB_BACKEND (sqlite | postgres)"""
+    if not settings.DB_PROFILE:
+        profiler = None
+    if settings.DB_BACKEND == "sqlite":
+        return SQLiteBackend(settings.DB_PATH, profiler, settings.ARCHIVE_DB_PATH)
+    if settings.DB_BACKEND == "postgres":
+        if not settings.DB_DSN:
+            raise ValueError("DB_BACKEND=postgres требует DB_DSN")
+        return PostgresBackend(settings.DB_DSN, settings.DB_POOL_MIN, settings.DB_POOL_MAX, profiler)
+    raise ValueError(f"Неизвестный DB_BACKEND: {settings.DB_BACKEND}")
+
+
+__all__ = [
+    'StorageBackend',
+    'SQLiteBackend',
+    'PostgresBackend',
+    'create_backend'
+]
@@ -0,0 +1,89 @@
+from typing import Any, AsyncIterator, Dict, List, Sequence
+
+# Метки найденных слов во фрагментах search_questions (управляющие символы не встречаются в тексте вопросов)
+SEARCH_MARK_START = "\x02"
+SEARCH_MARK_END = "\x03"
+
+# Итоги ответов по (пользователь, вопрос) для истории, накопленной до их появления
+ANSWER_ROLLUPS_BACKFILL = '''
+    INSERT INTO answer_rollups (user_id, question_id, answers, correct_answers, last_answered_at)
+    SELECT user_id, question_id, COUNT(*), SUM(CASE WHEN is_correct THEN 1 ELSE 0 END), MAX(answered_at)
+    FROM user_answers
+    WHERE TRUE
+    GROUP BY user_id, question_id
+    ON CONFLICT (user_id, question_id) DO NOTHING
+'''
+
+# Расписание повторения для истории ответов, накопленной до его появления:
+# все вопросы сразу к повторению, ни разу не решенные верно - первыми
+REVIEW_SCHEDULE_BACKFILL = '''
+    INSERT INTO review_schedule (user_id, question_id, category_id, ease, interval_seconds, repetitions, due_at)
+    SELECT ua.user_id, ua.question_id, q.category_id, 2.5, 0, 0,
+           MAX(CASE WHEN ua.is_correct THEN 1 ELSE 0 END)
+    FROM user_answers ua
+    JOIN questions q ON q.id = ua.question_id
+    WHERE TRUE
+    GROUP BY ua.user_id, ua.question_id, q.category_id
+    ON CONFLICT (user_id, question_id) DO NOTHING
+'''
+
+
+class StorageBackend:
+    """Хранилище для менеджеров из database/models.py.
+
+    Менеджеры пишут переносимый SQL с параметрами "?" и работают с соединением
+    в стиле aiosqlite: async with connect() as conn, conn.execute(...) (await или
+    async with), executemany, commit. Бэкенд отвечает за соединения, DDL и
+    хранение версии схемы.
+    """
+
+    name = "base"
+    # DDL схемы: идемпотентные операторы, выполняются по порядку при смене версии
+    SCHEMA: List[str] = []
+    # Разовые шаги с данными (заполнение новых таблиц по истории): {версия схемы, в которой
+    # шаг появился: операторы}. Выполняются после SCHEMA только при обновлении с более старой версии
+    MIGRATIONS: Dict[int, List[str]] = {}
+    # DDL архива (таблицы с префиксом archive.), см. attach_archive
+    ARCHIVE_SCHEMA: List[str] = []
+
+    def connect(self) -> Any:
+        """Асинхронный контекстный менеджер соединения"""
+        raise NotImplementedError
+
+    async def get_schema_version(self, conn) -> int:
+        raise NotImplementedError
+
+    async def set_schema_version(self, conn, version: int):
+        raise NotImplementedError
+
+    async def attach_archive(self, conn):
+        """Делает таблицы archive.* доступными в соединении conn и создает их при необходимости"""
+        raise NotImplementedError
+
+    def iterate(self, conn, sql: str, parameters: Sequence[Any] = (),
+                batch_size: int = 5000) -> AsyncIterator[List[tuple]]:
+        """Строки запроса порциями по batch_size без загрузки всего результата в память (async for)"""
+        raise NotImplementedError
+
+    async def search_questions(self, conn, terms: Sequence[str], limit: int, offset: int = 0) -> List[tuple]:
+        """Полнотекстовый поиск по вопросам, ответам и объяснениям: все terms как префиксы слов.
+
+        Строки (question_id, название категории, is_active, фрагмент) - лучшие совпадения
+        первыми; найденные слова во фрагменте обрамлены SEARCH_MARK_START / SEARCH_MARK_END.
+        """
+        raise NotImplementedError
+
+    def older_than_days(self, column: str) -> str:
+        """Условие "column (TIMESTAMP по умолчанию CURRENT_TIMESTAMP) старше ? дней" с одним параметром"""
+        raise NotImplementedError
+
+    def newer_than_hours(self, column: str) -> str:
+        """Условие "column не старше ? часов" с одним параметром (тот же формат времени, что и в older_than_days)"""
+        raise NotImplementedError
+
+    def hour_bucket(self, column: str) -> str:
+        """Выражение: column, усеченный до часа (строка вида YYYY-MM-DD HH:00)"""
+        raise NotImplementedError
+
+    async def close(self):
+        """Освобождает ресурсы бэкенда (пул соединений)"""
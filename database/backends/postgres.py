@@ -0,0 +1,509 @@
+import asyncio
+import re
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Iterable, List, Optional, Sequence
+from .base import ANSWER_ROLLUPS_BACKFILL, REVIEW_SCHEDULE_BACKFILL, SEARCH_MARK_END, SEARCH_MARK_START, StorageBackend
+from ..profiler import QueryProfiler, normalize_sql
+from ...utils.logger import logger
+
+_RETURNS_ROWS = re.compile(r"^\s*(SELECT|WITH|VALUES|SHOW|EXPLAIN)\b|\bRETURNING\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def translate_placeholders(sql: str) -> str:
+    """Параметры SQLite "?" -> "$1, $2, ..." asyncpg (строковые литералы не трогаются)"""
+    result = []
+    index = 0
+    in_string = False
+    for char in sql:
+        if char == "'":
+            in_string = not in_string
+        elif char == "?" and not in_string:
+            index += 1
+            result.append(f"${index}")
+            continue
+        result.append(char)
+    return "".join(result)
+
+
+class PostgresCursor:
+    """Результат запроса с интерфейсом курсора aiosqlite (строки уже получены)"""
+
+    def __init__(self, rows: List[tuple], rowcount: int):
+        self._rows = rows
+        self._position = 0
+        self.rowcount = rowcount
+        # Для новых id используйте INSERT ... RETURNING id
+        self.lastrowid = None
+
+    async def fetchone(self) -> Optional[tuple]:
+        if self._position >= len(self._rows):
+            return None
+        row = self._rows[self._position]
+        self._position += 1
+        return row
+
+    async def fetchmany(self, size: int = 1) -> List[tuple]:
+        rows = self._rows[self._position:self._position + size]
+        self._position += len(rows)
+        return rows
+
+    async def fetchall(self) -> List[tuple]:
+        rows = self._rows[self._position:]
+        self._position = len(self._rows)
+        return rows
+
+    async def close(self):
+        pass
+
+
+class _CursorContext:
+    """Как в aiosqlite: conn.execute(...) можно и await-ить, и использовать в async with"""
+
+    def __init__(self, coro):
+        self._coro = coro
+        self._cursor = None
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    async def __aenter__(self) -> PostgresCursor:
+        self._cursor = await self._coro
+        return self._cursor
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._cursor.close()
+
+
+class PostgresConnection:
+    """Соединение из пула asyncpg в стиле aiosqlite.
+
+    Как и в sqlite3, первый запрос открывает транзакцию, commit() ее фиксирует,
+    а незафиксированные изменения откатываются при выходе из async with.
+    """
+
+    def __init__(self, backend: "PostgresBackend"):
+        self.backend = backend
+        self._conn = None
+        self._transaction = None
+
+    async def __aenter__(self) -> "PostgresConnection":
+        pool = await self.backend.get_pool()
+        self._conn = await pool.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if self._transaction is not None:
+                await self._transaction.rollback()
+                self._transaction = None
+        finally:
+            await self.backend.pool.release(self._conn)
+            self._conn = None
+
+    async def _begin(self):
+        if self._transaction is None:
+            self._transaction = self._conn.transaction()
+            await self._transaction.start()
+
+    def _record(self, sql: str, duration: float, rows: int):
+        profiler = self.backend.profiler
+        if profiler is not None and profiler.record(sql, duration, rows):
+            logger.warning("slow query %.1f ms: %s", duration * 1000, normalize_sql(sql)[:300])
+
+    async def _execute(self, sql: str, parameters: Sequence[Any]) -> PostgresCursor:
+        query = translate_placeholders(sql)
+        await self._begin()
+        started = time.perf_counter()
+        if _RETURNS_ROWS.search(query):
+            records = await self._conn.fetch(query, *parameters)
+            rows = [tuple(record) for record in records]
+            rowcount = len(rows)
+        else:
+            status = await self._conn.execute(query, *parameters)
+            rows = []
+            # Статус вида "UPDATE 3" / "INSERT 0 1"
+            tail = status.rsplit(" ", 1)[-1]
+            rowcount = int(tail) if tail.isdigit() else -1
+        self._record(sql, time.perf_counter() - started, rowcount)
+        return PostgresCursor(rows, rowcount)
+
+    def execute(self, sql: str, parameters: Optional[Iterable[Any]] = None) -> _CursorContext:
+        return _CursorContext(self._execute(sql, tuple(parameters or ())))
+
+    async def _executemany(self, sql: str, parameters: Iterable[Iterable[Any]]) -> PostgresCursor:
+        query = translate_placeholders(sql)
+        parameters = [tuple(row) for row in parameters]
+        await self._begin()
+        started = time.perf_counter()
+        await self._conn.executemany(query, parameters)
+        self._record(sql, time.perf_counter() - started, len(parameters))
+        return PostgresCursor([], -1)
+
+    def executemany(self, sql: str, parameters: Iterable[Iterable[Any]]) -> _CursorContext:
+        return _CursorContext(self._executemany(sql, parameters))
+
+    async def iterate(self, sql: str, parameters: Sequence[Any], batch_size: int) -> AsyncIterator[List[tuple]]:
+        """Серверный курсор: строки приходят порциями по batch_size (нужна транзакция)"""
+        query = translate_placeholders(sql)
+        await self._begin()
+        started = time.perf_counter()
+        total = 0
+        cursor = await self._conn.cursor(query, *parameters)
+        while True:
+            records = await cursor.fetch(batch_size)
+            if not records:
+                break
+            total += len(records)
+            yield [tuple(record) for record in records]
+        # Время включает обработку порций вызывающим кодом
+        self._record(sql, time.perf_counter() - started, total)
+
+    async def commit(self):
+        if self._transaction is not None:
+            await self._transaction.commit()
+            self._transaction = None
+
+    async def rollback(self):
+        if self._transaction is not None:
+            await self._transaction.rollback()
+            self._transaction = None
+
+
+class PostgresBackend(StorageBackend):
+    """PostgreSQL через пул соединений asyncpg (DB_BACKEND=postgres, DB_DSN=...)"""
+
+    name = "postgres"
+    # Внешние ключи не объявлены: в SQLite они не включались (PRAGMA foreign_keys),
+    # и код на это рассчитывает - например, ответы пользователей без /start.
+    # Telegram id не помещаются в INTEGER, поэтому user_id - BIGINT
+    SCHEMA = [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL UNIQUE,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            total_questions INTEGER DEFAULT 0,
+            correct_answers INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS messages (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS categories (
+            id SERIAL PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            is_active BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS questions (
+            id SERIAL PRIMARY KEY,
+            question_text TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            difficulty_level TEXT DEFAULT 'beginner',
+            explanation TEXT,
+            is_active BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS answers (
+            id SERIAL PRIMARY KEY,
+            question_id INTEGER NOT NULL,
+            answer_text TEXT NOT NULL,
+            is_correct BOOLEAN NOT NULL DEFAULT FALSE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_progress (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            category_id INTEGER NOT NULL,
+            questions_answered INTEGER DEFAULT 0,
+            correct_answers INTEGER DEFAULT 0,
+            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, category_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_answers (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            question_id INTEGER NOT NULL,
+            answer_id INTEGER NOT NULL,
+            is_correct BOOLEAN NOT NULL,
+            answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS job_checkpoints (
+            job TEXT PRIMARY KEY,
+            last_id BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Неудачные попытки фоновой задачи по элементу: после лимита элемент пропускается
+        '''
+        CREATE TABLE IF NOT EXISTS job_failures (
+            job TEXT NOT NULL,
+            item_id BIGINT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (job, item_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS bank_versions (
+            category_id BIGINT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+        ''',
+        # Интервальное повторение: состояние SM-2 по (пользователь, вопрос), due_at - unix-время
+        '''
+        CREATE TABLE IF NOT EXISTS review_schedule (
+            user_id BIGINT NOT NULL,
+            question_id BIGINT NOT NULL,
+            category_id BIGINT NOT NULL,
+            ease DOUBLE PRECISION NOT NULL DEFAULT 2.5,
+            interval_seconds BIGINT NOT NULL DEFAULT 0,
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            due_at BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, question_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_review_schedule_due ON review_schedule (user_id, category_id, due_at)',
+        '''
+        CREATE TABLE IF NOT EXISTS answer_rollups (
+            user_id BIGINT NOT NULL,
+            question_id BIGINT NOT NULL,
+            answers BIGINT NOT NULL DEFAULT 0,
+            correct_answers BIGINT NOT NULL DEFAULT 0,
+            last_answered_at TIMESTAMP,
+            PRIMARY KEY (user_id, question_id)
+        )
+        ''',
+        # Окна по времени: архивирование и почасовая статистика
+        'CREATE INDEX IF NOT EXISTS idx_user_answers_answered_at ON user_answers (answered_at)',
+        # Снимки агрегированной статистики (services/stats_snapshot.py): JSON, computed_at - unix-время
+        '''
+        CREATE TABLE IF NOT EXISTS stats_snapshots (
+            name TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            computed_at BIGINT NOT NULL
+        )
+        ''',
+        # Недельные очки рейтинга (services/leaderboard.py), week - год * 100 + номер недели ISO
+        '''
+        CREATE TABLE IF NOT EXISTS leaderboard_weeks (
+            week INTEGER NOT NULL,
+            user_id BIGINT NOT NULL,
+            correct_answers INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (week, user_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_answers_question ON answers (question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_questions_category ON questions (category_id, id)',
+        # MinHash-сигнатуры текста вопросов для поиска почти-дубликатов (utils/minhash.py)
+        '''
+        CREATE TABLE IF NOT EXISTS question_signatures (
+            question_id BIGINT PRIMARY KEY,
+            signature TEXT NOT NULL
+        )
+        ''',
+        # Полнотекстовый поиск вопросов для админов (аналог FTS5 в SQLite): вес A - текст вопроса,
+        # B - ответы, C - объяснение; ё приводится к е
+        '''
+        CREATE TABLE IF NOT EXISTS question_search (
+            question_id BIGINT PRIMARY KEY,
+            document TSVECTOR NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_question_search_document ON question_search USING GIN (document)',
+        '''
+        CREATE OR REPLACE FUNCTION question_search_document(qid BIGINT) RETURNS TSVECTOR AS $$
+            SELECT setweight(to_tsvector('simple', translate(q.question_text, 'ёЁ', 'еЕ')), 'A')
+                || setweight(to_tsvector('simple', translate(COALESCE(
+                       (SELECT string_agg(a.answer_text, ' ') FROM answers a WHERE a.question_id = q.id), ''), 'ёЁ', 'еЕ')), 'B')
+                || setweight(to_tsvector('simple', translate(COALESCE(q.explanation, ''), 'ёЁ', 'еЕ')), 'C')
+            FROM questions q
+            WHERE q.id = qid
+        $$ LANGUAGE sql STABLE
+        ''',
+        '''
+        CREATE OR REPLACE FUNCTION refresh_question_search(qid BIGINT) RETURNS void AS $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM questions WHERE id = qid) THEN
+                INSERT INTO question_search (question_id, document) VALUES (qid, question_search_document(qid))
+                ON CONFLICT (question_id) DO UPDATE SET document = excluded.document;
+            ELSE
+                DELETE FROM question_search WHERE question_id = qid;
+            END IF;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        '''
+        CREATE OR REPLACE FUNCTION question_search_trigger() RETURNS trigger AS $$
+        BEGIN
+            IF TG_TABLE_NAME = 'questions' THEN
+                IF TG_OP = 'DELETE' THEN
+                    PERFORM refresh_question_search(OLD.id);
+                ELSE
+                    PERFORM refresh_question_search(NEW.id);
+                END IF;
+            ELSE
+                IF TG_OP <> 'INSERT' THEN
+                    PERFORM refresh_question_search(OLD.question_id);
+                END IF;
+                IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR NEW.question_id <> OLD.question_id) THEN
+                    PERFORM refresh_question_search(NEW.question_id);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        ''',
+        'DROP TRIGGER IF EXISTS question_search_questions ON questions',
+        '''
+        CREATE TRIGGER question_search_questions
+        AFTER INSERT OR DELETE OR UPDATE OF question_text, explanation ON questions
+        FOR EACH ROW EXECUTE FUNCTION question_search_trigger()
+        ''',
+        'DROP TRIGGER IF EXISTS question_search_answers ON answers',
+        '''
+        CREATE TRIGGER question_search_answers
+        AFTER INSERT OR DELETE OR UPDATE OF answer_text, question_id ON answers
+        FOR EACH ROW EXECUTE FUNCTION question_search_trigger()
+        ''',
+    ]
+    MIGRATIONS = {
+        # review_schedule (версия 4)
+        4: [REVIEW_SCHEDULE_BACKFILL],
+        # answer_rollups (версия 5): до первого запуска архиватора вся история еще в user_answers
+        5: [ANSWER_ROLLUPS_BACKFILL],
+        # question_search (версия 8): индекс для вопросов, добавленных до появления триггеров
+        8: [
+            '''
+            INSERT INTO question_search (question_id, document)
+            SELECT id, question_search_document(id) FROM questions
+            WHERE TRUE
+            ON CONFLICT (question_id) DO UPDATE SET document = excluded.document
+            ''',
+        ],
+    }
+    # Архив - отдельная схема той же базы (аналог ATTACH в SQLite)
+    ARCHIVE_SCHEMA = [
+        'CREATE SCHEMA IF NOT EXISTS archive',
+        '''
+        CREATE TABLE IF NOT EXISTS archive.user_answers (
+            id BIGINT PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            question_id BIGINT NOT NULL,
+            answer_id BIGINT NOT NULL,
+            is_correct BOOLEAN NOT NULL,
+            answered_at TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_archive_user_answers_user ON archive.user_answers (user_id)',
+        # Удаление вопроса или категории удаляет и архивные ответы на вопрос
+        'CREATE INDEX IF NOT EXISTS idx_archive_user_answers_question ON archive.user_answers (question_id)',
+    ]
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10, profiler: Optional[QueryProfiler] = None):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.profiler = profiler
+        self.pool = None
+        self._pool_loop = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def get_pool(self):
+        loop = asyncio.get_running_loop()
+        # Пул привязан к циклу событий; новый asyncio.run (CLI, бенчмарки) получает новый пул
+        if self.pool is not None and self._pool_loop is loop:
+            return self.pool
+        if self._lock is None or self._pool_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._pool_loop = loop
+            self.pool = None
+        async with self._lock:
+            if self.pool is None:
+                import asyncpg  # необязательная зависимость, нужна только этому бэкенду
+                self.pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size)
+        return self.pool
+
+    def connect(self) -> PostgresConnection:
+        return PostgresConnection(self)
+
+    async def get_schema_version(self, conn) -> int:
+        await conn.execute("CREATE TABLE IF NOT EXISTS schema_info (version INTEGER NOT NULL)")
+        async with conn.execute("SELECT version FROM schema_info") as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else 0
+
+    async def set_schema_version(self, conn, version: int):
+        await conn.execute("DELETE FROM schema_info")
+        await conn.execute("INSERT INTO schema_info (version) VALUES (?)", (version,))
+
+    async def attach_archive(self, conn):
+        for statement in self.ARCHIVE_SCHEMA:
+            await conn.execute(statement)
+
+    async def iterate(self, conn, sql: str, parameters: Sequence[Any] = (),
+                      batch_size: int = 5000) -> AsyncIterator[List[tuple]]:
+        async for rows in conn.iterate(sql, tuple(parameters), batch_size):
+            yield rows
+
+    async def search_questions(self, conn, terms: Sequence[str], limit: int, offset: int = 0) -> List[tuple]:
+        # Конфигурация simple без стемминга, как unicode61 в SQLite: стемы русского словаря
+        # не совпадают с префиксами ("шипящ:*" не находит стем "шипя"). ts_headline
+        # считается только для страницы результатов - он перечитывает текст документа
+        query = " & ".join(f"{term}:*" for term in terms)
+        async with conn.execute(
+            """
+            SELECT q.id, c.name, q.is_active,
+                   ts_headline('simple', translate(concat_ws(' · ', q.question_text,
+                       (SELECT string_agg(a.answer_text, ' ') FROM answers a WHERE a.question_id = q.id),
+                       q.explanation), 'ёЁ', 'еЕ'), found.query, ?)
+            FROM (
+                SELECT s.question_id, ts_rank(s.document, t.query) AS rank, t.query
+                FROM question_search s, to_tsquery('simple', ?) AS t(query)
+                WHERE s.document @@ t.query
+                ORDER BY rank DESC, s.question_id
+                LIMIT ? OFFSET ?
+            ) found
+            JOIN questions q ON q.id = found.question_id
+            JOIN categories c ON c.id = q.category_id
+            ORDER BY found.rank DESC, q.id
+            """,
+            (f"StartSel={SEARCH_MARK_START}, StopSel={SEARCH_MARK_END}, MaxWords=20, MinWords=8, MaxFragments=1",
+             query, limit, offset),
+        ) as cursor:
+            return await cursor.fetchall()
+
+    def older_than_days(self, column: str) -> str:
+        # Столбцы TIMESTAMP без зоны заполняются временем сессии - сравниваем с LOCALTIMESTAMP
+        return f"{column} < LOCALTIMESTAMP - make_interval(days => ?)"
+
+    def newer_than_hours(self, column: str) -> str:
+        return f"{column} >= LOCALTIMESTAMP - make_interval(hours => ?)"
+
+    def hour_bucket(self, column: str) -> str:
+        return f"to_char({column}, 'YYYY-MM-DD HH24:00')"
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
@@ -0,0 +1,317 @@
+import os
+from typing import Any, AsyncIterator, List, Optional, Sequence
+import aiosqlite
+from .base import ANSWER_ROLLUPS_BACKFILL, REVIEW_SCHEDULE_BACKFILL, StorageBackend
+from ..profiler import QueryProfiler, profiled_connect
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLite-файл через aiosqlite (бэкенд по умолчанию)"""
+
+    name = "sqlite"
+    SCHEMA = [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL UNIQUE,
+            username TEXT,
+            first_name TEXT,
+            last_name TEXT,
+            total_questions INTEGER DEFAULT 0,
+            correct_answers INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            is_active BOOLEAN NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question_text TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            difficulty_level TEXT DEFAULT 'beginner',
+            explanation TEXT,
+            is_active BOOLEAN NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS answers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question_id INTEGER NOT NULL,
+            answer_text TEXT NOT NULL,
+            is_correct BOOLEAN NOT NULL DEFAULT 0,
+            FOREIGN KEY (question_id) REFERENCES questions (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_progress (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            questions_answered INTEGER DEFAULT 0,
+            correct_answers INTEGER DEFAULT 0,
+            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_answers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            answer_id INTEGER NOT NULL,
+            is_correct BOOLEAN NOT NULL,
+            answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (question_id) REFERENCES questions (id),
+            FOREIGN KEY (answer_id) REFERENCES answers (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS job_checkpoints (
+            job TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Неудачные попытки фоновой задачи по элементу: после лимита элемент пропускается
+        '''
+        CREATE TABLE IF NOT EXISTS job_failures (
+            job TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (job, item_id)
+        )
+        ''',
+        # Раньше INSERT OR IGNORE в user_progress не имел уникального ключа и добавлял
+        # строку на каждый ответ; самая старая строка пары содержит полные счетчики
+        '''
+        DELETE FROM user_progress
+        WHERE id NOT IN (SELECT MIN(id) FROM user_progress GROUP BY user_id, category_id)
+        ''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_user_progress_user_category ON user_progress (user_id, category_id)',
+        # Версия набора вопросов категории: колоды сессий пересобираются при ее изменении
+        '''
+        CREATE TABLE IF NOT EXISTS bank_versions (
+            category_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        # Интервальное повторение: состояние SM-2 по (пользователь, вопрос), due_at - unix-время
+        '''
+        CREATE TABLE IF NOT EXISTS review_schedule (
+            user_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            ease REAL NOT NULL DEFAULT 2.5,
+            interval_seconds INTEGER NOT NULL DEFAULT 0,
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            due_at INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, question_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_review_schedule_due ON review_schedule (user_id, category_id, due_at)',
+        # Итоги ответов по (пользователь, вопрос): включают и ответы, перенесенные в архив
+        '''
+        CREATE TABLE IF NOT EXISTS answer_rollups (
+            user_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            answers INTEGER NOT NULL DEFAULT 0,
+            correct_answers INTEGER NOT NULL DEFAULT 0,
+            last_answered_at TIMESTAMP,
+            PRIMARY KEY (user_id, question_id)
+        )
+        ''',
+        # Окна по времени: архивирование и почасовая статистика
+        'CREATE INDEX IF NOT EXISTS idx_user_answers_answered_at ON user_answers (answered_at)',
+        # Снимки агрегированной статистики (services/stats_snapshot.py): JSON, computed_at - unix-время
+        '''
+        CREATE TABLE IF NOT EXISTS stats_snapshots (
+            name TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            computed_at INTEGER NOT NULL
+        )
+        ''',
+        # Недельные очки рейтинга (services/leaderboard.py), week - год * 100 + номер недели ISO
+        '''
+        CREATE TABLE IF NOT EXISTS leaderboard_weeks (
+            week INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            correct_answers INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (week, user_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_answers_question ON answers (question_id)',
+        'CREATE INDEX IF NOT EXISTS idx_questions_category ON questions (category_id, id)',
+        # MinHash-сигнатуры текста вопросов для поиска почти-дубликатов (utils/minhash.py)
+        '''
+        CREATE TABLE IF NOT EXISTS question_signatures (
+            question_id INTEGER PRIMARY KEY,
+            signature TEXT NOT NULL
+        )
+        ''',
+        # Полнотекстовый поиск вопросов для админов: rowid = questions.id, ё хранится как е
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS question_search USING fts5(
+            question_text, answers, explanation,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS question_search_insert AFTER INSERT ON questions BEGIN
+            INSERT INTO question_search (rowid, question_text, answers, explanation)
+            VALUES (new.id, replace(replace(new.question_text, 'ё', 'е'), 'Ё', 'Е'), '',
+                    replace(replace(COALESCE(new.explanation, ''), 'ё', 'е'), 'Ё', 'Е'));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS question_search_update AFTER UPDATE OF question_text, explanation ON questions BEGIN
+            UPDATE question_search
+            SET question_text = replace(replace(new.question_text, 'ё', 'е'), 'Ё', 'Е'),
+                explanation = replace(replace(COALESCE(new.explanation, ''), 'ё', 'е'), 'Ё', 'Е')
+            WHERE rowid = new.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS question_search_delete AFTER DELETE ON questions BEGIN
+            DELETE FROM question_search WHERE rowid = old.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS question_search_answer_insert AFTER INSERT ON answers BEGIN
+            UPDATE question_search SET answers = COALESCE((SELECT replace(replace(group_concat(answer_text, ' '), 'ё', 'е'), 'Ё', 'Е') FROM answers WHERE question_id = new.question_id), '')
+            WHERE rowid = new.question_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS question_search_answer_update AFTER UPDATE OF answer_text, question_id ON answers BEGIN
+            UPDATE question_search SET answers = COALESCE((SELECT replace(replace(group_concat(answer_text, ' '), 'ё', 'е'), 'Ё', 'Е') FROM answers WHERE question_id = old.question_id), '')
+            WHERE rowid = old.question_id;
+            UPDATE question_search SET answers = COALESCE((SELECT replace(replace(group_concat(answer_text, ' '), 'ё', 'е'), 'Ё', 'Е') FROM answers WHERE question_id = new.question_id), '')
+            WHERE rowid = new.question_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS question_search_answer_delete AFTER DELETE ON answers BEGIN
+            UPDATE question_search SET answers = COALESCE((SELECT replace(replace(group_concat(answer_text, ' '), 'ё', 'е'), 'Ё', 'Е') FROM answers WHERE question_id = old.question_id), '')
+            WHERE rowid = old.question_id;
+        END
+        ''',
+    ]
+    MIGRATIONS = {
+        # review_schedule (версия 4)
+        4: [REVIEW_SCHEDULE_BACKFILL],
+        # answer_rollups (версия 5): до первого запуска архиватора вся история еще в user_answers
+        5: [ANSWER_ROLLUPS_BACKFILL],
+        # question_search (версия 8): индекс для вопросов, добавленных до появления триггеров
+        8: [
+            '''
+            INSERT INTO question_search (rowid, question_text, answers, explanation)
+            SELECT q.id, replace(replace(q.question_text, 'ё', 'е'), 'Ё', 'Е'),
+                   COALESCE((SELECT replace(replace(group_concat(answer_text, ' '), 'ё', 'е'), 'Ё', 'Е') FROM answers WHERE question_id = q.id), ''),
+                   replace(replace(COALESCE(q.explanation, ''), 'ё', 'е'), 'Ё', 'Е')
+            FROM questions q
+            ''',
+        ],
+    }
+    ARCHIVE_SCHEMA = [
+        '''
+        CREATE TABLE IF NOT EXISTS archive.user_answers (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            answer_id INTEGER NOT NULL,
+            is_correct BOOLEAN NOT NULL,
+            answered_at TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS archive.idx_archive_user_answers_user ON user_answers (user_id)',
+        # Удаление вопроса или категории удаляет и архивные ответы на вопрос
+        'CREATE INDEX IF NOT EXISTS archive.idx_archive_user_answers_question ON user_answers (question_id)',
+    ]
+
+    def __init__(self, path: str, profiler: Optional[QueryProfiler] = None, archive_path: str = ""):
+        self.path = path
+        self.profiler = profiler
+        self.archive_path = archive_path
+
+    @property
+    def archive_location(self) -> str:
+        """Файл архива: ARCHIVE_DB_PATH или <DB_PATH без расширения>_archive.db"""
+        return self.archive_path or f"{os.path.splitext(self.path)[0]}_archive.db"
+
+    def connect(self):
+        """Соединение aiosqlite; с профилировщиком каждый запрос попадает в статистику"""
+        if self.profiler is not None:
+            return profiled_connect(self.path, self.profiler)
+        return aiosqlite.connect(self.path)
+
+    async def get_schema_version(self, conn) -> int:
+        async with conn.execute("PRAGMA user_version") as cursor:
+            (version,) = await cursor.fetchone()
+        return version
+
+    async def set_schema_version(self, conn, version: int):
+        await conn.execute(f"PRAGMA user_version = {int(version)}")
+
+    async def attach_archive(self, conn):
+        await conn.execute("ATTACH DATABASE ? AS archive", (self.archive_location,))
+        for statement in self.ARCHIVE_SCHEMA:
+            await conn.execute(statement)
+
+    async def iterate(self, conn, sql: str, parameters: Sequence[Any] = (),
+                      batch_size: int = 5000) -> AsyncIterator[List[tuple]]:
+        # Курсор sqlite3 сам читает результат по шагам: fetchmany не материализует весь запрос
+        async with conn.execute(sql, parameters) as cursor:
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+    async def search_questions(self, conn, terms: Sequence[str], limit: int, offset: int = 0) -> List[tuple]:
+        # Каждое слово - префиксный запрос в кавычках, пробел в FTS5 означает AND;
+        # bm25 с весами столбцов: совпадение в тексте вопроса важнее, чем в ответах и объяснении
+        match = " ".join(f'"{term}"*' for term in terms)
+        async with conn.execute(
+            """
+            SELECT q.id, c.name, q.is_active,
+                   snippet(question_search, -1, char(2), char(3), '…', 12)
+            FROM question_search
+            JOIN questions q ON q.id = question_search.rowid
+            JOIN categories c ON c.id = q.category_id
+            WHERE question_search MATCH ?
+            ORDER BY bm25(question_search, 10.0, 5.0, 2.0), q.id
+            LIMIT ? OFFSET ?
+            """,
+            (match, limit, offset),
+        ) as cursor:
+            return await cursor.fetchall()
+
+    def older_than_days(self, column: str) -> str:
+        # CURRENT_TIMESTAMP в SQLite - строка UTC "YYYY-MM-DD HH:MM:SS", такие строки сравниваются по порядку
+        return f"{column} < datetime('now', '-' || ? || ' days')"
+
+    def newer_than_hours(self, column: str) -> str:
+        return f"{column} >= datetime('now', '-' || ? || ' hours')"
+
+    def hour_bucket(self, column: str) -> str:
+        return f"strftime('%Y-%m-%d %H:00', {column})"
@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from ..config.settings import settings
+from ..utils.metrics import metrics
+
+metrics.describe("bot_cache_requests_total", "Обращения к кэшам в памяти по результату (hit/miss)")
+metrics.describe("bot_cache_entries", "Число записей в кэшах в памяти")
+
+
+class TTLCache:
+    """LRU-кэш в памяти процесса с временем жизни записей"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        metrics.register_collector(self._collect)
+
+    def _collect(self, registry):
+        registry.set_gauge("bot_cache_entries", len(self._items), cache=self.name)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is not None:
+            expires, value = item
+            if expires > time.monotonic():
+                self._items.move_to_end(key)
+                metrics.inc("bot_cache_requests_total", cache=self.name, result="hit")
+                return value
+            del self._items[key]
+        metrics.inc("bot_cache_requests_total", cache=self.name, result="miss")
+        return None
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+# Вопросы с ответами для экрана результата. Правки админа сбрасывают запись сразу,
+# в других процессах cluster.py устаревшая запись живет не дольше TTL
+question_cache = TTLCache("questions", settings.QUESTION_CACHE_SIZE, settings.QUESTION_CACHE_TTL)
+
+# Версии банка вопросов по категориям (см. CategoryManager.get_bank_version)
+bank_version_cache = TTLCache("bank_versions", settings.BANK_VERSION_CACHE_SIZE, settings.BANK_VERSION_TTL)
+
+# Страницы клавиатур по курсору: (курсор, назад) для категорий, (категория, курсор, назад)
+# для вопросов админки. Правки админа очищают кэш целиком - они редки
+category_page_cache = TTLCache("category_pages", settings.KEYBOARD_PAGE_CACHE_SIZE, settings.KEYBOARD_PAGE_CACHE_TTL)
+question_page_cache = TTLCache("question_pages", settings.KEYBOARD_PAGE_CACHE_SIZE, settings.KEYBOARD_PAGE_CACHE_TTL)
@@ -1,100 +1,119 @@
-import aiosqlite
+import json
+import re
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from ..config.settings import settings
+from .backends import create_backend
+from .cache import bank_version_cache, category_page_cache, question_cache, question_page_cache
+from .profiler import QueryProfiler
+from ..utils import minhash
+from ..utils.logger import logger
+from ..utils.spaced_repetition import DEFAULT_EASE, sm2_step
+from ..utils.tracing import tracer, traced_class
+
+# Версия схемы (хранит бэкенд). Любое изменение SCHEMA бэкендов
+# должно увеличивать ее, иначе существующие БД пропустят обновление
+SCHEMA_VERSION = 11
+
+# Статистика по всем запросам процесса (см. /dbstats в админке)
+profiler = QueryProfiler(slow_seconds=settings.DB_SLOW_QUERY_MS / 1000)
+# Число SQL-запросов попадает в атрибуты спанов трассировки
+profiler.add_listener(tracer.on_statement)
+
+# Увеличение версии банка вопросов категории (по категории или по вопросу)
+_BUMP_BANK_VERSION = '''
+    INSERT INTO bank_versions (category_id, version) VALUES (?, 1)
+    ON CONFLICT(category_id) DO UPDATE SET version = bank_versions.version + 1
+'''
+_BUMP_BANK_VERSION_BY_QUESTION = '''
+    INSERT INTO bank_versions (category_id, version)
+    SELECT category_id, 1 FROM questions WHERE id = ?
+    ON CONFLICT(category_id) DO UPDATE SET version = bank_versions.version + 1
+'''
+
+# Итоги ответов по (пользователь, вопрос) обновляются вместе с каждой строкой user_answers,
+# поэтому проверки "отвечал/отвечал верно" и статистика не зависят от архивации истории
+_UPSERT_ANSWER_ROLLUP = '''
+    INSERT INTO answer_rollups (user_id, question_id, answers, correct_answers, last_answered_at)
+    VALUES (?, ?, 1, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT (user_id, question_id) DO UPDATE SET
+        answers = answer_rollups.answers + 1,
+        correct_answers = answer_rollups.correct_answers + excluded.correct_answers,
+        last_answered_at = excluded.last_answered_at
+'''
+
+_UPSERT_QUESTION_SIGNATURE = '''
+    INSERT INTO question_signatures (question_id, signature) VALUES (?, ?)
+    ON CONFLICT (question_id) DO UPDATE SET signature = excluded.signature
+'''
+
+_UPSERT_REVIEW_SCHEDULE = '''
+    INSERT INTO review_schedule (user_id, question_id, category_id, ease, interval_seconds, repetitions, due_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, question_id) DO UPDATE SET
+        ease = excluded.ease, interval_seconds = excluded.interval_seconds,
+        repetitions = excluded.repetitions, due_at = excluded.due_at
+'''
+
+# Хранилище по DB_BACKEND; менеджеры ниже пишут переносимый SQL с параметрами "?"
+backend = create_backend(settings, profiler)
+
+
+def connect():
+    """Соединение с БД текущего бэкенда; при DB_PROFILE каждый запрос проходит через профилировщик"""
+    return backend.connect()
+
+
+def _keyset_page(rows: list, limit: int, cursor: Optional[int], backward: bool):
+    """Страница из limit + 1 строк keyset-запроса: (строки, курсор "назад", курсор "вперед").
+
+    Курсор - id первой или последней строки страницы; None - соседней страницы нет.
+    Запрос "назад" читает строки в обратном порядке, здесь они разворачиваются.
+    """
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+        prev_cursor = rows[0][0] if more else None
+        next_cursor = rows[-1][0] if rows else None
+    else:
+        prev_cursor = rows[0][0] if rows and cursor is not None else None
+        next_cursor = rows[-1][0] if more else None
+    return rows, prev_cursor, next_cursor
 
-DB_PATH = settings.DB_PATH
  
+@traced_class("db")
 class DatabaseManager:
     """Основной класс для управления базой данных"""
     
     @staticmethod
     async def create_all_tables():
-        async with aiosqlite.connect(DB_PATH) as conn:
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL UNIQUE,
-                    username TEXT,
-                    first_name TEXT,
-                    last_name TEXT,
-                    total_questions INTEGER DEFAULT 0,
-                    correct_answers INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    role TEXT NOT NULL,
-                    content TEXT NOT NULL
-                )
-            ''')
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS categories (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    is_active BOOLEAN NOT NULL DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS questions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    question_text TEXT NOT NULL,
-                    category_id INTEGER NOT NULL,
-                    difficulty_level TEXT DEFAULT 'beginner',
-                    explanation TEXT,
-                    is_active BOOLEAN NOT NULL DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (category_id) REFERENCES categories (id)
-                )
-            ''')
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS answers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    question_id INTEGER NOT NULL,
-                    answer_text TEXT NOT NULL,
-                    is_correct BOOLEAN NOT NULL DEFAULT 0,
-                    FOREIGN KEY (question_id) REFERENCES questions (id)
-                )
-            ''')
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS user_progress (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    category_id INTEGER NOT NULL,
-                    questions_answered INTEGER DEFAULT 0,
-                    correct_answers INTEGER DEFAULT 0,
-                    last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id),
-                    FOREIGN KEY (category_id) REFERENCES categories (id)
-                )
-            ''')
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS user_answers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    question_id INTEGER NOT NULL,
-                    answer_id INTEGER NOT NULL,
-                    is_correct BOOLEAN NOT NULL,
-                    answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id),
-                    FOREIGN KEY (question_id) REFERENCES questions (id),
-                    FOREIGN KEY (answer_id) REFERENCES answers (id)
-                )
-            ''')
+        async with connect() as conn:
+            # Быстрый путь перезапуска: схема уже актуальна
+            version = await backend.get_schema_version(conn)
+            if version == SCHEMA_VERSION:
+                return
+            for statement in backend.SCHEMA:
+                await conn.execute(statement)
+            # Заполнение по истории - один раз, при переходе через версию, где шаг появился
+            for target in sorted(backend.MIGRATIONS):
+                if version < target:
+                    for statement in backend.MIGRATIONS[target]:
+                        await conn.execute(statement)
+            await backend.set_schema_version(conn, SCHEMA_VERSION)
             await conn.commit()
 
 
+@traced_class("db")
 class UserManager:
     """Класс для управления пользователями"""
     
     @staticmethod
     async def add_user(user_id: int, username: str, first_name: str, last_name: str):
         """Добавление нового пользователя"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             await conn.execute(
-                'INSERT OR IGNORE INTO users (user_id, username, first_name, last_name) VALUES (?, ?, ?, ?)',
+                'INSERT INTO users (user_id, username, first_name, last_name) VALUES (?, ?, ?, ?) ON CONFLICT (user_id) DO NOTHING',
                 (user_id, username, first_name, last_name)
             )
             await conn.commit()
@@ -102,7 +121,7 @@ class UserManager:
     @staticmethod
     async def get_user_stats(user_id: int):
         """Получение статистики пользователя"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
                 'SELECT total_questions, correct_answers FROM users WHERE user_id = ?',
                 (user_id,)
@@ -122,7 +141,7 @@ class UserManager:
     @staticmethod
     async def update_user_stats(user_id: int, is_correct: bool):
         """Обновление статистики пользователя"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             await conn.execute(
                 '''UPDATE users 
                 SET total_questions = total_questions + 1,
@@ -132,18 +151,27 @@ class UserManager:
             )
             await conn.commit()
     
+    @staticmethod
+    async def get_all_user_ids():
+        """ID всех пользователей (для рассылки)"""
+        async with connect() as conn:
+            async with conn.execute('SELECT user_id FROM users') as cursor:
+                rows = await cursor.fetchall()
+        return [row[0] for row in rows]
+
     @staticmethod
     async def update_user_level(user_id: int, level: str):
         return  # убрали уровни пользователя
 
 
+@traced_class("db")
 class MessageManager:
     """Класс для управления сообщениями"""
     
     @staticmethod
     async def get_message_count(user_id: int):
         """Получение количества сообщений пользователя"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
                 'SELECT COUNT(*) FROM messages WHERE user_id = ?',
                 (user_id,)
@@ -154,7 +182,7 @@ class MessageManager:
     @staticmethod
     async def add_message(user_id: int, role: str, message: str):
         """Добавление нового сообщения с ограничением на 5 сообщений"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             # Проверяем количество сообщений пользователя
             message_count = await MessageManager.get_message_count(user_id)
             
@@ -175,7 +203,7 @@ class MessageManager:
     @staticmethod
     async def get_history(user_id, limit=10):
         """Получение истории сообщений пользователя"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
                 "SELECT role, content FROM messages WHERE user_id=? ORDER BY id DESC LIMIT ?",
                 (user_id, limit)
@@ -184,6 +212,7 @@ class MessageManager:
         return [{"role": role, "content": content} for role, content in reversed(rows)]
 
 
+@traced_class("db")
 class CategoryManager:
     """Класс для управления категориями"""
     
@@ -191,7 +220,7 @@ class CategoryManager:
     async def add_category(name: str):
         """Добавление новой категории"""
         try:
-            async with aiosqlite.connect(DB_PATH) as conn:
+            async with connect() as conn:
                 await conn.execute(
                     '''INSERT INTO categories (name) 
                     VALUES (?) 
@@ -201,108 +230,179 @@ class CategoryManager:
                 )
                 await conn.commit()
         except Exception as e:
-            print(f"Ошибка в add_category: {e}")  
+            logger.error("add_category failed: %s", e)
             raise e
+        category_page_cache.clear()
     
     @staticmethod
     async def delete_category(category_id: int):
         """Удаление категории и всех вопросов в ней"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
+            # Ответы на вопросы категории есть и в архиве (ATTACH - до начала транзакции)
+            await backend.attach_archive(conn)
             # Получаем все вопросы в категории
             async with conn.execute('SELECT id FROM questions WHERE category_id = ?', (category_id,)) as cursor:
                 question_ids = await cursor.fetchall()
             
-            # Удаляем ответы на эти вопросы
+            # Удаляем ответы пользователей и варианты ответов на эти вопросы
             for question_id in question_ids:
-                await conn.execute('DELETE FROM answers WHERE question_id = ?', (question_id[0],))
                 await conn.execute('DELETE FROM user_answers WHERE question_id = ?', (question_id[0],))
+                await conn.execute('DELETE FROM archive.user_answers WHERE question_id = ?', (question_id[0],))
+                await conn.execute('DELETE FROM answer_rollups WHERE question_id = ?', (question_id[0],))
+                await conn.execute('DELETE FROM answers WHERE question_id = ?', (question_id[0],))
+                await conn.execute('DELETE FROM question_signatures WHERE question_id = ?', (question_id[0],))
             
             # Удаляем вопросы
             await conn.execute('DELETE FROM questions WHERE category_id = ?', (category_id,))
             
             # Удаляем прогресс пользователей по этой категории
             await conn.execute('DELETE FROM user_progress WHERE category_id = ?', (category_id,))
+            await conn.execute('DELETE FROM review_schedule WHERE category_id = ?', (category_id,))
             
             # Удаляем саму категорию
             await conn.execute('DELETE FROM categories WHERE id = ?', (category_id,))
+            await conn.execute(_BUMP_BANK_VERSION, (category_id,))
             await conn.commit()
+        for question_id in question_ids:
+            question_cache.invalidate(question_id[0])
+        bank_version_cache.invalidate(category_id)
+        category_page_cache.clear()
+        question_page_cache.clear()
 
     @staticmethod
     async def get_all_categories():
         """Получить все категории для админ-панели"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute('SELECT id, name, is_active FROM categories ORDER BY created_at DESC') as cursor:
                 categories = await cursor.fetchall()
         return categories
     
     @staticmethod
     async def get_available_categories():
-        """Получить только доступные категории (is_active = 1), без ранжирования по уровню"""
-        async with aiosqlite.connect(DB_PATH) as conn:
-            async with conn.execute('SELECT id, name FROM categories WHERE is_active = 1 ORDER BY name') as cursor:
+        """Получить только доступные категории (is_active = TRUE), без ранжирования по уровню"""
+        async with connect() as conn:
+            async with conn.execute('SELECT id, name FROM categories WHERE is_active = TRUE ORDER BY name') as cursor:
                 categories = await cursor.fetchall()
         return categories
 
+    @staticmethod
+    async def get_available_categories_page(cursor: Optional[int] = None, backward: bool = False, limit: int = 20):
+        """Страница доступных категорий по имени после (или перед) категории cursor.
+
+        Возвращает (строки (id, name), курсор "назад", курсор "вперед"), см. _keyset_page.
+        Курсор - id категории, а не имя: так он помещается в 64 байта callback_data.
+        """
+        key = (cursor, backward, limit)
+        page = category_page_cache.get(key)
+        if page is not None:
+            return page
+        if cursor is None:
+            condition, parameters = '', ()
+        else:
+            condition = f"AND name {'<' if backward else '>'} (SELECT name FROM categories WHERE id = ?)"
+            parameters = (cursor,)
+        async with connect() as conn:
+            async with conn.execute(
+                f"SELECT id, name FROM categories WHERE is_active = TRUE {condition} "
+                f"ORDER BY name {'DESC' if backward else 'ASC'} LIMIT ?",
+                (*parameters, limit + 1)
+            ) as db_cursor:
+                rows = list(await db_cursor.fetchall())
+        page = _keyset_page(rows, limit, cursor, backward)
+        category_page_cache.put(key, page)
+        return page
+
     @staticmethod
     async def get_category_by_id(category_id: int):
         """Получение категории по ID"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute('SELECT id, name FROM categories WHERE id = ?', 
                                   (category_id,)) as cursor:
                 result = await cursor.fetchone()
         return result
     
+    @staticmethod
+    async def get_bank_version(category_id: int) -> int:
+        """Версия набора вопросов категории; растет при добавлении, удалении и скрытии вопросов"""
+        version = bank_version_cache.get(category_id)
+        if version is None:
+            async with connect() as conn:
+                async with conn.execute(
+                    'SELECT version FROM bank_versions WHERE category_id = ?', (category_id,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+            version = row[0] if row else 0
+            bank_version_cache.put(category_id, version)
+        return version
+
     @staticmethod
     async def update_category_status(category_id: int, is_active: bool):
         """Обновление статуса категории"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             await conn.execute(
                 'UPDATE categories SET is_active = ? WHERE id = ?',
                 (is_active, category_id)
             )
             await conn.commit()
+        category_page_cache.clear()
 
 
+@traced_class("db")
 class QuestionManager:
     """Класс для управления вопросами"""
     
     @staticmethod
     async def add_question(question_text: str, category_id: int, difficulty_level: str = 'beginner', explanation: str = None):
         """Добавление нового вопроса"""
-        async with aiosqlite.connect(DB_PATH) as conn:
-            cursor = await conn.execute(
-                'INSERT INTO questions (question_text, category_id, difficulty_level, explanation) VALUES (?, ?, ?, ?)',
+        async with connect() as conn:
+            async with conn.execute(
+                'INSERT INTO questions (question_text, category_id, difficulty_level, explanation) VALUES (?, ?, ?, ?) RETURNING id',
                 (question_text, category_id, difficulty_level, explanation)
-            )
-            question_id = cursor.lastrowid
+            ) as cursor:
+                (question_id,) = await cursor.fetchone()
+            await conn.execute(_UPSERT_QUESTION_SIGNATURE, (question_id, minhash.encode(minhash.signature(question_text))))
+            await conn.execute(_BUMP_BANK_VERSION, (category_id,))
             await conn.commit()
-            return question_id
+        bank_version_cache.invalidate(category_id)
+        question_page_cache.clear()
+        return question_id
     
     @staticmethod
     async def add_answer(question_id: int, answer_text: str, is_correct: bool = False):
         """Добавление ответа к вопросу"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             await conn.execute(
                 'INSERT INTO answers (question_id, answer_text, is_correct) VALUES (?, ?, ?)',
                 (question_id, answer_text, is_correct)
             )
             await conn.commit()
+        question_cache.invalidate(question_id)
     
     @staticmethod
     async def delete_question(question_id: int):
         """Удаление вопроса и всех его ответов"""
-        async with aiosqlite.connect(DB_PATH) as conn:
-            await conn.execute('DELETE FROM answers WHERE question_id = ?', (question_id,))
+        async with connect() as conn:
+            # Ответы на вопрос есть и в архиве (ATTACH - до начала транзакции)
+            await backend.attach_archive(conn)
+            await conn.execute(_BUMP_BANK_VERSION_BY_QUESTION, (question_id,))
             await conn.execute('DELETE FROM user_answers WHERE question_id = ?', (question_id,))
+            await conn.execute('DELETE FROM archive.user_answers WHERE question_id = ?', (question_id,))
+            await conn.execute('DELETE FROM answer_rollups WHERE question_id = ?', (question_id,))
+            await conn.execute('DELETE FROM review_schedule WHERE question_id = ?', (question_id,))
+            await conn.execute('DELETE FROM answers WHERE question_id = ?', (question_id,))
+            await conn.execute('DELETE FROM question_signatures WHERE question_id = ?', (question_id,))
             await conn.execute('DELETE FROM questions WHERE id = ?', (question_id,))
             await conn.commit()
+        question_cache.invalidate(question_id)
+        bank_version_cache.clear()
+        question_page_cache.clear()
     
     @staticmethod
     async def get_questions_by_category(category_id: int, limit: int = 10):
         """Получить вопросы по категории"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
-                'SELECT id, question_text, difficulty_level, explanation FROM questions WHERE category_id = ? AND is_active = 1 ORDER BY RANDOM() LIMIT ?',
+                'SELECT id, question_text, difficulty_level, explanation FROM questions WHERE category_id = ? AND is_active = TRUE ORDER BY RANDOM() LIMIT ?',
                 (category_id, limit)
             ) as cursor:
                 questions = await cursor.fetchall()
@@ -311,7 +411,7 @@ class QuestionManager:
     @staticmethod
     async def get_question_with_answers(question_id: int):
         """Получить вопрос с ответами"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             # Получаем вопрос
             async with conn.execute(
                 'SELECT id, question_text, difficulty_level, explanation FROM questions WHERE id = ?',
@@ -329,17 +429,47 @@ class QuestionManager:
             ) as cursor:
                 answers = await cursor.fetchall()
             
-            return {
+            question_data = {
                 'question': question,
                 'answers': answers
             }
+        # Показанный вопрос почти наверняка понадобится экрану ответа
+        question_cache.put(question_id, question_data)
+        return question_data
+
+    @staticmethod
+    async def get_question_cached(question_id: int):
+        """Вопрос с ответами из кэша процесса (при промахе - из БД)"""
+        question_data = question_cache.get(question_id)
+        if question_data is None:
+            question_data = await QuestionManager.get_question_with_answers(question_id)
+        return question_data
     
+    @staticmethod
+    async def get_question_category(question_id: int):
+        """ID категории вопроса"""
+        async with connect() as conn:
+            async with conn.execute('SELECT category_id FROM questions WHERE id = ?', (question_id,)) as cursor:
+                row = await cursor.fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    async def search_questions(query: str, limit: int = 5, offset: int = 0) -> Tuple[List[tuple], bool]:
+        """Полнотекстовый поиск для админов: (строки backend.search_questions, есть ли следующая страница)"""
+        # Индекс хранит текст с ё, замененной на е, - запрос нормализуем так же
+        terms = re.findall(r"\w+", query.lower().replace("ё", "е"))[:8]
+        if not terms:
+            return [], False
+        async with connect() as conn:
+            rows = await backend.search_questions(conn, terms, limit + 1, offset)
+        return rows[:limit], len(rows) > limit
+
     @staticmethod
     async def get_random_question_by_category(category_id: int):
         """Получить случайный вопрос по категории"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
-                'SELECT id FROM questions WHERE category_id = ? AND is_active = 1 ORDER BY RANDOM() LIMIT 1',
+                'SELECT id FROM questions WHERE category_id = ? AND is_active = TRUE ORDER BY RANDOM() LIMIT 1',
                 (category_id,)
             ) as cursor:
                 result = await cursor.fetchone()
@@ -351,9 +481,9 @@ class QuestionManager:
     @staticmethod
     async def get_random_question_global_all():
         """Получить случайный активный вопрос из всех категорий (без фильтра по ответам)"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
-                'SELECT id FROM questions WHERE is_active = 1 ORDER BY RANDOM() LIMIT 1'
+                'SELECT id FROM questions WHERE is_active = TRUE ORDER BY RANDOM() LIMIT 1'
             ) as cursor:
                 result = await cursor.fetchone()
         if result:
@@ -363,13 +493,13 @@ class QuestionManager:
     @staticmethod
     async def get_random_question_global_answered(user_id: int):
         """Получить случайный активный вопрос из всех категорий, на который пользователь уже отвечал"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
                 '''
                 SELECT q.id
                 FROM questions q
-                INNER JOIN user_answers ua ON q.id = ua.question_id
-                WHERE q.is_active = 1 AND ua.user_id = ?
+                INNER JOIN answer_rollups r ON q.id = r.question_id
+                WHERE q.is_active = TRUE AND r.user_id = ?
                 ORDER BY RANDOM() LIMIT 1
                 ''',
                 (user_id,)
@@ -380,16 +510,21 @@ class QuestionManager:
         return None
 
     @staticmethod
-    async def get_random_question_by_category_answered(user_id: int, category_id: int):
-        """Получить случайный активный вопрос из категории, на который пользователь уже отвечал"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+    async def get_unseen_random_question_by_category(user_id: int, category_id: int):
+        """Случайный активный вопрос по категории, который пользователь еще не видел или видел неправильно"""
+        async with connect() as conn:
             async with conn.execute(
                 '''
-                SELECT DISTINCT q.id
+                SELECT q.id
                 FROM questions q
-                INNER JOIN user_answers ua ON q.id = ua.question_id
-                WHERE q.is_active = 1 AND q.category_id = ? AND ua.user_id = ?
-                ORDER BY RANDOM() LIMIT 1
+                WHERE q.category_id = ?
+                  AND q.is_active = TRUE
+                  AND NOT EXISTS (
+                    SELECT 1 FROM answer_rollups r
+                    WHERE r.user_id = ? AND r.question_id = q.id AND r.correct_answers > 0
+                  )
+                ORDER BY RANDOM()
+                LIMIT 1
                 ''',
                 (category_id, user_id)
             ) as cursor:
@@ -399,65 +534,37 @@ class QuestionManager:
         return None
 
     @staticmethod
-    async def get_random_question_by_category_answered_excluding(user_id: int, category_id: int, excluded_question_ids: list):
-        """Получить случайный активный вопрос из категории, на который пользователь уже отвечал, исключая указанные ID"""
-        if not excluded_question_ids:
-            return await QuestionManager.get_random_question_by_category_answered(user_id, category_id)
-        
-        placeholders = ','.join(['?' for _ in excluded_question_ids])
-        async with aiosqlite.connect(DB_PATH) as conn:
-            async with conn.execute(
-                f'''
-                SELECT DISTINCT q.id
-                FROM questions q
-                INNER JOIN user_answers ua ON q.id = ua.question_id
-                WHERE q.is_active = 1 AND q.category_id = ? AND ua.user_id = ? 
-                AND q.id NOT IN ({placeholders})
-                ORDER BY RANDOM() LIMIT 1
-                ''',
-                (category_id, user_id) + tuple(excluded_question_ids)
-            ) as cursor:
-                result = await cursor.fetchone()
-        if result:
-            return await QuestionManager.get_question_with_answers(result[0])
-        return None
-
-    @staticmethod
-    async def get_unseen_random_question_by_category(user_id: int, category_id: int):
-        """Случайный активный вопрос по категории, который пользователь еще не видел или видел неправильно"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+    async def get_deck_question_ids(user_id: int, category_id: int) -> list:
+        """ID вопросов для колоды обучения: активные вопросы категории без правильного ответа пользователя"""
+        async with connect() as conn:
             async with conn.execute(
                 '''
                 SELECT q.id
                 FROM questions q
                 WHERE q.category_id = ?
-                  AND q.is_active = 1
+                  AND q.is_active = TRUE
                   AND NOT EXISTS (
-                    SELECT 1 FROM user_answers ua
-                    WHERE ua.user_id = ? AND ua.question_id = q.id AND ua.is_correct = 1
+                    SELECT 1 FROM answer_rollups r
+                    WHERE r.user_id = ? AND r.question_id = q.id AND r.correct_answers > 0
                   )
-                ORDER BY RANDOM()
-                LIMIT 1
                 ''',
                 (category_id, user_id)
             ) as cursor:
-                result = await cursor.fetchone()
-        if result:
-            return await QuestionManager.get_question_with_answers(result[0])
-        return None
+                rows = await cursor.fetchall()
+        return [row[0] for row in rows]
 
     @staticmethod
     async def get_unseen_random_question_global(user_id: int):
         """Случайный активный вопрос из любых категорий, который пользователь еще не видел или видел неправильно"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
                 '''
                 SELECT q.id
                 FROM questions q
-                WHERE q.is_active = 1
+                WHERE q.is_active = TRUE
                   AND NOT EXISTS (
-                    SELECT 1 FROM user_answers ua
-                    WHERE ua.user_id = ? AND ua.question_id = q.id AND ua.is_correct = 1
+                    SELECT 1 FROM answer_rollups r
+                    WHERE r.user_id = ? AND r.question_id = q.id AND r.correct_answers > 0
                   )
                 ORDER BY RANDOM()
                 LIMIT 1
@@ -472,17 +579,20 @@ class QuestionManager:
     @staticmethod
     async def update_question_status(question_id: int, is_active: bool):
         """Обновление статуса вопроса"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             await conn.execute(
                 'UPDATE questions SET is_active = ? WHERE id = ?',
                 (is_active, question_id)
             )
+            await conn.execute(_BUMP_BANK_VERSION_BY_QUESTION, (question_id,))
             await conn.commit()
+        bank_version_cache.clear()
+        question_page_cache.clear()
 
     @staticmethod
     async def get_question_status(question_id: int):
         """Получить текущий статус активности вопроса"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
                 'SELECT is_active FROM questions WHERE id = ?',
                 (question_id,)
@@ -493,24 +603,28 @@ class QuestionManager:
     @staticmethod
     async def update_question(question_id: int, question_text: str, difficulty_level: str, explanation: str | None):
         """Обновить текст, сложность и объяснение вопроса"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             await conn.execute(
                 'UPDATE questions SET question_text = ?, difficulty_level = ?, explanation = ? WHERE id = ?',
                 (question_text, difficulty_level, explanation, question_id)
             )
+            await conn.execute(_UPSERT_QUESTION_SIGNATURE, (question_id, minhash.encode(minhash.signature(question_text))))
             await conn.commit()
+        question_cache.invalidate(question_id)
+        question_page_cache.clear()
 
     @staticmethod
     async def delete_answers_for_question(question_id: int):
         """Удалить все ответы для вопроса"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             await conn.execute('DELETE FROM answers WHERE question_id = ?', (question_id,))
             await conn.commit()
+        question_cache.invalidate(question_id)
     
     @staticmethod
     async def get_all_questions_by_category(category_id: int):
         """Получить все вопросы категории для админ-панели"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
                 'SELECT id, question_text, difficulty_level, is_active FROM questions WHERE category_id = ? ORDER BY created_at DESC',
                 (category_id,)
@@ -518,30 +632,209 @@ class QuestionManager:
                 questions = await cursor.fetchall()
         return questions
 
+    @staticmethod
+    async def get_questions_page(category_id: int, cursor: Optional[int] = None, backward: bool = False, limit: int = 20):
+        """Страница вопросов категории для админ-панели, новые первыми (WHERE id < cursor ORDER BY id DESC).
+
+        Возвращает (строки (id, question_text, difficulty_level, is_active),
+        курсор "назад", курсор "вперед"), см. _keyset_page.
+        """
+        key = (category_id, cursor, backward, limit)
+        page = question_page_cache.get(key)
+        if page is not None:
+            return page
+        if cursor is None:
+            condition, parameters = '', ()
+        else:
+            condition, parameters = f"AND id {'>' if backward else '<'} ?", (cursor,)
+        async with connect() as conn:
+            async with conn.execute(
+                "SELECT id, question_text, difficulty_level, is_active FROM questions "
+                f"WHERE category_id = ? {condition} ORDER BY id {'ASC' if backward else 'DESC'} LIMIT ?",
+                (category_id, *parameters, limit + 1)
+            ) as db_cursor:
+                rows = list(await db_cursor.fetchall())
+        page = _keyset_page(rows, limit, cursor, backward)
+        question_page_cache.put(key, page)
+        return page
+
+    @staticmethod
+    async def get_question_signatures():
+        """Сигнатуры всех вопросов: (id, category_id, signature); недостающие считаются и сохраняются"""
+        async with connect() as conn:
+            async with conn.execute(
+                '''
+                SELECT q.id, q.category_id, s.signature, CASE WHEN s.signature IS NULL THEN q.question_text END
+                FROM questions q
+                LEFT JOIN question_signatures s ON s.question_id = q.id
+                '''
+            ) as cursor:
+                rows = await cursor.fetchall()
+            missing = [(question_id, minhash.encode(minhash.signature(text)))
+                       for question_id, _, signature, text in rows if signature is None]
+            if missing:
+                # Вопросы, добавленные до появления таблицы или в обход add_question
+                await conn.executemany(_UPSERT_QUESTION_SIGNATURE, missing)
+                await conn.commit()
+        computed = dict(missing)
+        return [(question_id, category_id, signature or computed[question_id])
+                for question_id, category_id, signature, _ in rows]
+
+    @staticmethod
+    async def get_question_texts(question_ids: List[int]) -> Dict[int, str]:
+        """Тексты вопросов по id (для отчетов)"""
+        if not question_ids:
+            return {}
+        placeholders = ', '.join('?' * len(question_ids))
+        async with connect() as conn:
+            async with conn.execute(
+                f'SELECT id, question_text FROM questions WHERE id IN ({placeholders})', tuple(question_ids)
+            ) as cursor:
+                return dict(await cursor.fetchall())
+
+    @staticmethod
+    async def count_questions_without_explanation(after_id: int = 0):
+        """Количество вопросов без объяснения (id больше after_id)"""
+        async with connect() as conn:
+            async with conn.execute(
+                'SELECT COUNT(*) FROM questions WHERE explanation IS NULL AND id > ?',
+                (after_id,)
+            ) as cursor:
+                result = await cursor.fetchone()
+        return result[0] if result else 0
+
+    @staticmethod
+    async def get_questions_without_explanation(after_id: int = 0, limit: int = 50):
+        """Порция вопросов без объяснения по возрастанию id вместе с ответами"""
+        async with connect() as conn:
+            async with conn.execute(
+                '''SELECT id, question_text, difficulty_level
+                FROM questions
+                WHERE explanation IS NULL AND id > ?
+                ORDER BY id
+                LIMIT ?''',
+                (after_id, limit)
+            ) as cursor:
+                questions = await cursor.fetchall()
+
+            if not questions:
+                return []
+
+            placeholders = ','.join(['?' for _ in questions])
+            async with conn.execute(
+                f'SELECT question_id, answer_text, is_correct FROM answers WHERE question_id IN ({placeholders}) ORDER BY id',
+                tuple(q[0] for q in questions)
+            ) as cursor:
+                answer_rows = await cursor.fetchall()
+
+        answers = {}
+        for question_id, answer_text, is_correct in answer_rows:
+            answers.setdefault(question_id, []).append((answer_text, is_correct))
+        return [
+            {'question': question, 'answers': answers.get(question[0], [])}
+            for question in questions
+        ]
+
+    @staticmethod
+    async def save_explanations(explanations: list, job: str = None, last_id: int = None):
+        """Записать порцию объяснений одной транзакцией (и сдвинуть чекпоинт задачи)
+
+        explanations - список пар (question_id, explanation). Уже заполненные
+        объяснения (например, отредактированные админом) не перезаписываются.
+        """
+        async with connect() as conn:
+            if explanations:
+                await conn.executemany(
+                    'UPDATE questions SET explanation = ? WHERE id = ? AND explanation IS NULL',
+                    [(explanation, question_id) for question_id, explanation in explanations]
+                )
+            if job is not None and last_id is not None:
+                await conn.execute(
+                    '''INSERT INTO job_checkpoints (job, last_id, updated_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT(job)
+                        DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at''',
+                    (job, last_id)
+                )
+            await conn.commit()
+        for question_id, _ in explanations:
+            question_cache.invalidate(question_id)
+
+
+@traced_class("db")
+class JobManager:
+    """Класс для чекпоинтов фоновых задач"""
+
+    @staticmethod
+    async def get_checkpoint(job: str) -> int:
+        """Последний обработанный id задачи (0, если задача еще не запускалась)"""
+        async with connect() as conn:
+            async with conn.execute(
+                'SELECT last_id FROM job_checkpoints WHERE job = ?',
+                (job,)
+            ) as cursor:
+                result = await cursor.fetchone()
+        return result[0] if result else 0
+
+    @staticmethod
+    async def reset_checkpoint(job: str):
+        """Сбросить чекпоинт задачи и счетчики попыток, чтобы начать с начала"""
+        async with connect() as conn:
+            await conn.execute('DELETE FROM job_checkpoints WHERE job = ?', (job,))
+            await conn.execute('DELETE FROM job_failures WHERE job = ?', (job,))
+            await conn.commit()
+
+    @staticmethod
+    async def record_failures(job: str, item_ids: list) -> dict:
+        """Учесть неудачную попытку по каждому элементу; {item_id: попыток всего}"""
+        if not item_ids:
+            return {}
+        placeholders = ','.join('?' for _ in item_ids)
+        async with connect() as conn:
+            await conn.executemany(
+                '''INSERT INTO job_failures (job, item_id, attempts, updated_at)
+                VALUES (?, ?, 1, CURRENT_TIMESTAMP)
+                ON CONFLICT(job, item_id)
+                    DO UPDATE SET attempts = job_failures.attempts + 1, updated_at = excluded.updated_at''',
+                [(job, item_id) for item_id in item_ids]
+            )
+            async with conn.execute(
+                f'SELECT item_id, attempts FROM job_failures WHERE job = ? AND item_id IN ({placeholders})',
+                (job, *item_ids)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            await conn.commit()
+        return {item_id: attempts for item_id, attempts in rows}
+
 
+@traced_class("db")
 class ProgressManager:
     """Класс для управления прогрессом пользователей"""
     
     @staticmethod
-    async def record_answer(user_id: int, question_id: int, answer_id: int, is_correct: bool):
-        """Запись ответа пользователя (только для первого ответа)"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+    async def record_answer(user_id: int, question_id: int, answer_id: int, is_correct: bool) -> Optional[int]:
+        """Запись ответа пользователя (только для первого ответа).
+
+        Возвращает новое число правильных ответов пользователя или None, если статистика не менялась.
+        """
+        async with connect() as conn:
             # Проверяем, отвечал ли пользователь на этот вопрос ранее правильно
             async with conn.execute(
-                'SELECT 1 FROM user_answers WHERE user_id = ? AND question_id = ? AND is_correct = 1 LIMIT 1',
+                'SELECT 1 FROM answer_rollups WHERE user_id = ? AND question_id = ? AND correct_answers > 0',
                 (user_id, question_id)
             ) as cursor:
                 already_answered_correctly = await cursor.fetchone()
             
             if already_answered_correctly:
                 # Если уже отвечал правильно, не изменяем статистику
-                return
+                return None
             
             # Записываем ответ
             await conn.execute(
                 'INSERT INTO user_answers (user_id, question_id, answer_id, is_correct) VALUES (?, ?, ?, ?)',
                 (user_id, question_id, answer_id, is_correct)
             )
+            await conn.execute(_UPSERT_ANSWER_ROLLUP, (user_id, question_id, 1 if is_correct else 0))
             
             # Получаем категорию вопроса
             async with conn.execute(
@@ -550,6 +843,7 @@ class ProgressManager:
             ) as cursor:
                 result = await cursor.fetchone()
             
+            correct_answers = None
             if result:
                 category_id = result[0]
                 
@@ -557,57 +851,45 @@ class ProgressManager:
                 # При правильном ответе: +1 к правильным, +1 к общим
                 # При неправильном ответе: +0 к правильным, +1 к общим
                 await conn.execute(
-                    '''INSERT OR IGNORE INTO user_progress 
+                    '''INSERT INTO user_progress
                     (user_id, category_id, questions_answered, correct_answers, last_activity)
-                    VALUES (?, ?, 0, 0, CURRENT_TIMESTAMP)''',
-                    (user_id, category_id)
+                    VALUES (?, ?, 1, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (user_id, category_id)
+                        DO UPDATE SET questions_answered = user_progress.questions_answered + 1,
+                                      correct_answers = user_progress.correct_answers + excluded.correct_answers,
+                                      last_activity = excluded.last_activity''',
+                    (user_id, category_id, 1 if is_correct else 0)
                 )
                 
-                await conn.execute(
-                    '''UPDATE user_progress 
-                    SET questions_answered = questions_answered + 1,
-                        correct_answers = correct_answers + ?,
-                        last_activity = CURRENT_TIMESTAMP
-                    WHERE user_id = ? AND category_id = ?''',
-                    (1 if is_correct else 0, user_id, category_id)
-                )
-                
-                # Обновляем общую статистику пользователя
-                await conn.execute(
+                # Обновляем общую статистику пользователя (новый счет нужен рейтингу)
+                async with conn.execute(
                     '''UPDATE users 
                     SET total_questions = total_questions + 1,
                         correct_answers = correct_answers + ?
-                    WHERE user_id = ?''',
+                    WHERE user_id = ?
+                    RETURNING correct_answers''',
                     (1 if is_correct else 0, user_id)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row:
+                    correct_answers = row[0]
+                
+                # Вопрос попадает в расписание повторения (повторный ответ в обучении - только после ошибки)
+                review = sm2_step(DEFAULT_EASE, 0, 0, is_correct, int(time.time()), settings.REVIEW_RELEARN_SECONDS)
+                await conn.execute(
+                    _UPSERT_REVIEW_SCHEDULE,
+                    (user_id, question_id, category_id, review.ease, review.interval, review.repetitions, review.due_at)
                 )
             
             await conn.commit()
-
-    @staticmethod
-    async def record_answer_repeat_mode(user_id: int, question_id: int, answer_id: int, is_correct: bool):
-        """Запись ответа пользователя в режиме повторения (только в user_answers, без обновления статистики)"""
-        async with aiosqlite.connect(DB_PATH) as conn:
-            # Записываем ответ только в user_answers, НЕ обновляем user_progress и статистику пользователя
-            await conn.execute(
-                'INSERT INTO user_answers (user_id, question_id, answer_id, is_correct) VALUES (?, ?, ?, ?)',
-                (user_id, question_id, answer_id, is_correct)
-            )
-            await conn.commit()
-
-    @staticmethod
-    async def clear_repeat_mode_answers(user_id: int):
-        """Очистить все ответы пользователя в режиме повторения (для новой сессии)"""
-        async with aiosqlite.connect(DB_PATH) as conn:
-            # Удаляем все записи user_answers для пользователя
-            await conn.execute('DELETE FROM user_answers WHERE user_id = ?', (user_id,))
-            await conn.commit()
+        return correct_answers
 
     @staticmethod
     async def user_has_answered_question(user_id: int, question_id: int) -> bool:
         """Проверить, отвечал ли пользователь на данный вопрос ранее"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
-                'SELECT 1 FROM user_answers WHERE user_id = ? AND question_id = ? LIMIT 1',
+                'SELECT 1 FROM answer_rollups WHERE user_id = ? AND question_id = ?',
                 (user_id, question_id)
             ) as cursor:
                 row = await cursor.fetchone()
@@ -616,9 +898,9 @@ class ProgressManager:
     @staticmethod
     async def user_has_answered_correctly(user_id: int, question_id: int) -> bool:
         """Проверить, отвечал ли пользователь правильно на данный вопрос"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
-                'SELECT 1 FROM user_answers WHERE user_id = ? AND question_id = ? AND is_correct = 1 LIMIT 1',
+                'SELECT 1 FROM answer_rollups WHERE user_id = ? AND question_id = ? AND correct_answers > 0',
                 (user_id, question_id)
             ) as cursor:
                 row = await cursor.fetchone()
@@ -627,7 +909,7 @@ class ProgressManager:
     @staticmethod
     async def get_user_progress_by_category(user_id: int, category_id: int):
         """Получить прогресс пользователя по категории"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
                 'SELECT questions_answered, correct_answers FROM user_progress WHERE user_id = ? AND category_id = ?',
                 (user_id, category_id)
@@ -647,15 +929,15 @@ class ProgressManager:
     @staticmethod
     async def get_user_overall_progress(user_id: int):
         """Получить общий прогресс пользователя"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
                 '''SELECT 
-                    COUNT(*) as total_answered,
-                    SUM(CASE WHEN ua.is_correct = 1 THEN 1 ELSE 0 END) as total_correct,
+                    SUM(r.answers) as total_answered,
+                    SUM(r.correct_answers) as total_correct,
                     COUNT(DISTINCT q.category_id) as categories_studied
-                FROM user_answers ua
-                JOIN questions q ON ua.question_id = q.id
-                WHERE ua.user_id = ?''',
+                FROM answer_rollups r
+                JOIN questions q ON r.question_id = q.id
+                WHERE r.user_id = ?''',
                 (user_id,)
             ) as cursor:
                 result = await cursor.fetchone()
@@ -674,16 +956,16 @@ class ProgressManager:
     @staticmethod
     async def get_category_stats():
         """Получить статистику по категориям"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
                 '''SELECT 
                     c.name,
                     COUNT(DISTINCT q.id) as total_questions,
                     COUNT(DISTINCT up.user_id) as users_studied
                 FROM categories c
-                LEFT JOIN questions q ON c.id = q.category_id AND q.is_active = 1
+                LEFT JOIN questions q ON c.id = q.category_id AND q.is_active = TRUE
                 LEFT JOIN user_progress up ON c.id = up.category_id
-                WHERE c.is_active = 1
+                WHERE c.is_active = TRUE
                 GROUP BY c.id, c.name
                 ORDER BY c.name''',
             ) as cursor:
@@ -693,21 +975,21 @@ class ProgressManager:
     @staticmethod
     async def get_user_stats_by_categories(user_id: int):
         """Получить статистику пользователя по категориям"""
-        async with aiosqlite.connect(DB_PATH) as conn:
+        async with connect() as conn:
             async with conn.execute(
                 '''SELECT 
                     c.name,
-                    COUNT(*) as total_questions_answered,
-                    SUM(CASE WHEN ua.is_correct = 1 THEN 1 ELSE 0 END) as total_correct_answers,
+                    SUM(r.answers) as total_questions_answered,
+                    SUM(r.correct_answers) as total_correct_answers,
                     CASE 
-                        WHEN COUNT(*) > 0 
-                        THEN ROUND((SUM(CASE WHEN ua.is_correct = 1 THEN 1 ELSE 0 END) * 100.0 / COUNT(*)), 1)
+                        WHEN SUM(r.answers) > 0 
+                        THEN ROUND((SUM(r.correct_answers) * 100.0 / SUM(r.answers)), 1)
                         ELSE 0 
                     END as accuracy
-                FROM user_answers ua
-                JOIN questions q ON ua.question_id = q.id
+                FROM answer_rollups r
+                JOIN questions q ON r.question_id = q.id
                 JOIN categories c ON q.category_id = c.id
-                WHERE ua.user_id = ? AND c.is_active = 1
+                WHERE r.user_id = ? AND c.is_active = TRUE
                 GROUP BY c.id, c.name
                 ORDER BY c.name''',
                 (user_id,)
@@ -716,6 +998,313 @@ class ProgressManager:
         return stats
 
 
+@traced_class("db")
+class ReviewManager:
+    """Расписание интервального повторения (SM-2) в таблице review_schedule"""
+
+    @staticmethod
+    async def get_review_queue(user_id: int, category_id: int, limit: int) -> list:
+        """ID активных вопросов категории, срок повторения которых наступил, по возрастанию due_at - проход по индексу"""
+        async with connect() as conn:
+            async with conn.execute(
+                '''
+                SELECT rs.question_id
+                FROM review_schedule rs
+                JOIN questions q ON q.id = rs.question_id
+                WHERE rs.user_id = ? AND rs.category_id = ? AND rs.due_at <= ? AND q.is_active = TRUE
+                ORDER BY rs.due_at
+                LIMIT ?
+                ''',
+                (user_id, category_id, int(time.time()), limit)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    async def reschedule(user_id: int, grades: list):
+        """Пересчет расписания по пачке ответов [(question_id, is_correct), ...] одной транзакцией"""
+        if not grades:
+            return
+        question_ids = list(dict.fromkeys(question_id for question_id, _ in grades))
+        placeholders = ','.join('?' for _ in question_ids)
+        now = int(time.time())
+        async with connect() as conn:
+            async with conn.execute(
+                f'''
+                SELECT rs.question_id, rs.category_id, rs.ease, rs.interval_seconds, rs.repetitions
+                FROM review_schedule rs
+                WHERE rs.user_id = ? AND rs.question_id IN ({placeholders})
+                ''',
+                (user_id, *question_ids)
+            ) as cursor:
+                current = {row[0]: row[1:] for row in await cursor.fetchall()}
+            rows = []
+            for question_id, is_correct in grades:
+                if question_id not in current:
+                    # Вопрос удалили или расписание очистили, пока шла сессия
+                    continue
+                category_id, ease, interval, repetitions = current[question_id]
+                review = sm2_step(ease, interval, repetitions, is_correct, now, settings.REVIEW_RELEARN_SECONDS)
+                current[question_id] = (category_id, review.ease, review.interval, review.repetitions)
+                rows.append((user_id, question_id, category_id, review.ease, review.interval, review.repetitions, review.due_at))
+            if rows:
+                await conn.executemany(_UPSERT_REVIEW_SCHEDULE, rows)
+                await conn.commit()
+
+
+@traced_class("db")
+class ArchiveManager:
+    """Перенос старой истории user_answers в архив (archive.user_answers, см. backend.attach_archive)"""
+
+    @staticmethod
+    async def archive_chunk(horizon_days: int, chunk_size: int) -> int:
+        """Переносит до chunk_size самых ранних ответов старше horizon_days одной транзакцией; возвращает их число"""
+        older = backend.older_than_days('answered_at')
+        async with connect() as conn:
+            await backend.attach_archive(conn)
+            async with conn.execute(
+                f'SELECT id FROM user_answers WHERE {older} ORDER BY id LIMIT ?',
+                (horizon_days, chunk_size)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            if not rows:
+                return 0
+            # Диапазон id вместо списка: условие по времени повторяется, молодые строки внутри диапазона остаются
+            bounds = (rows[0][0], rows[-1][0], horizon_days)
+            await conn.execute(
+                f'''
+                INSERT INTO archive.user_answers (id, user_id, question_id, answer_id, is_correct, answered_at)
+                SELECT id, user_id, question_id, answer_id, is_correct, answered_at
+                FROM user_answers
+                WHERE id BETWEEN ? AND ? AND {older}
+                ON CONFLICT (id) DO NOTHING
+                ''',
+                bounds
+            )
+            await conn.execute(f'DELETE FROM user_answers WHERE id BETWEEN ? AND ? AND {older}', bounds)
+            await conn.commit()
+        return len(rows)
+
+    @staticmethod
+    async def get_archive_stats(horizon_days: int) -> dict:
+        """Строки в горячей таблице и архиве, сколько из горячих уже старше горизонта"""
+        older = backend.older_than_days('answered_at')
+        async with connect() as conn:
+            await backend.attach_archive(conn)
+            async with conn.execute('SELECT COUNT(*) FROM user_answers') as cursor:
+                (hot,) = await cursor.fetchone()
+            async with conn.execute(f'SELECT COUNT(*) FROM user_answers WHERE {older}', (horizon_days,)) as cursor:
+                (pending,) = await cursor.fetchone()
+            async with conn.execute('SELECT COUNT(*) FROM archive.user_answers') as cursor:
+                (archived,) = await cursor.fetchone()
+            async with conn.execute('SELECT COUNT(*) FROM answer_rollups') as cursor:
+                (rollups,) = await cursor.fetchone()
+            await conn.commit()
+        return {'hot': hot, 'pending': pending, 'archived': archived, 'rollups': rollups}
+
+
+@traced_class("db")
+class StatsManager:
+    """Агрегированная статистика системы и ее снимки (таблица stats_snapshots)"""
+
+    @staticmethod
+    async def compute_system_stats() -> dict:
+        """Тяжелые агрегаты для админ-панели: активность, ответы по часам, точность по категориям"""
+        recent = backend.newer_than_hours('answered_at')
+        hour = backend.hour_bucket('answered_at')
+        async with connect() as conn:
+            async with conn.execute('SELECT COUNT(*) FROM users') as cursor:
+                (users,) = await cursor.fetchone()
+            activity = {}
+            for key, hours in (('dau', 24), ('wau', 24 * 7)):
+                async with conn.execute(
+                    f'SELECT COUNT(DISTINCT user_id) FROM user_answers WHERE {recent}', (hours,)
+                ) as cursor:
+                    (activity[key],) = await cursor.fetchone()
+            async with conn.execute(
+                f'SELECT {hour}, COUNT(*) FROM user_answers WHERE {recent} GROUP BY 1 ORDER BY 1', (24,)
+            ) as cursor:
+                hourly = [[bucket, count] for bucket, count in await cursor.fetchall()]
+            async with conn.execute(
+                f'SELECT COUNT(*) FROM user_answers WHERE {recent}', (1,)
+            ) as cursor:
+                (last_hour,) = await cursor.fetchone()
+
+            # Каждый агрегат по категориям - отдельный GROUP BY без соединения с другими таблицами фактов
+            async with conn.execute(
+                'SELECT id, name FROM categories WHERE is_active = TRUE ORDER BY name'
+            ) as cursor:
+                categories = await cursor.fetchall()
+            async with conn.execute(
+                'SELECT category_id, COUNT(*) FROM questions WHERE is_active = TRUE GROUP BY category_id'
+            ) as cursor:
+                active_questions = dict(await cursor.fetchall())
+            async with conn.execute(
+                'SELECT category_id, COUNT(*) FROM user_progress GROUP BY category_id'
+            ) as cursor:
+                users_studied = dict(await cursor.fetchall())
+            async with conn.execute(
+                '''SELECT q.category_id, SUM(r.answers), SUM(r.correct_answers)
+                FROM answer_rollups r
+                JOIN questions q ON q.id = r.question_id
+                GROUP BY q.category_id'''
+            ) as cursor:
+                # SUM в PostgreSQL возвращает numeric (Decimal)
+                answers = {category_id: (int(total), int(correct)) for category_id, total, correct in await cursor.fetchall()}
+
+        category_stats = []
+        for category_id, name in categories:
+            total, correct = answers.get(category_id, (0, 0))
+            category_stats.append({
+                'id': category_id,
+                'name': name,
+                'active_questions': active_questions.get(category_id, 0),
+                'users_studied': users_studied.get(category_id, 0),
+                'answers': total,
+                'accuracy': round(correct * 100.0 / total, 1) if total else 0,
+            })
+        return {
+            'users': users,
+            'dau': activity['dau'],
+            'wau': activity['wau'],
+            'answers_last_hour': last_hour,
+            'answers_24h': sum(count for _, count in hourly),
+            'hourly': hourly,
+            'categories': category_stats,
+        }
+
+    @staticmethod
+    async def save_snapshot(name: str, payload: dict, computed_at: Optional[int] = None) -> int:
+        """Сохраняет снимок; возвращает время расчета (unix)"""
+        computed_at = int(time.time()) if computed_at is None else computed_at
+        async with connect() as conn:
+            await conn.execute(
+                '''INSERT INTO stats_snapshots (name, payload, computed_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET payload = excluded.payload, computed_at = excluded.computed_at''',
+                (name, json.dumps(payload, ensure_ascii=False), computed_at)
+            )
+            await conn.commit()
+        return computed_at
+
+    @staticmethod
+    async def get_snapshot(name: str) -> Optional[Tuple[dict, int]]:
+        """Снимок и время его расчета или None, если его еще не считали"""
+        async with connect() as conn:
+            async with conn.execute(
+                'SELECT payload, computed_at FROM stats_snapshots WHERE name = ?',
+                (name,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+
+@traced_class("db")
+class LeaderboardManager:
+    """Очки рейтинга: за все время - users.correct_answers, за неделю - leaderboard_weeks"""
+
+    @staticmethod
+    async def get_all_time_scores() -> List[Tuple[int, int]]:
+        """(user_id, правильных ответов) пользователей с ненулевым счетом"""
+        async with connect() as conn:
+            async with conn.execute('SELECT user_id, correct_answers FROM users WHERE correct_answers > 0') as cursor:
+                return await cursor.fetchall()
+
+    @staticmethod
+    async def get_weekly_scores(week: int) -> List[Tuple[int, int]]:
+        async with connect() as conn:
+            async with conn.execute(
+                'SELECT user_id, correct_answers FROM leaderboard_weeks WHERE week = ?',
+                (week,)
+            ) as cursor:
+                return await cursor.fetchall()
+
+    @staticmethod
+    async def save_weekly_scores(rows: List[Tuple[int, int, int]]):
+        """Сохраняет счета (week, user_id, правильных ответов); значения абсолютные, повтор безопасен"""
+        async with connect() as conn:
+            await conn.executemany(
+                '''INSERT INTO leaderboard_weeks (week, user_id, correct_answers) VALUES (?, ?, ?)
+                ON CONFLICT (week, user_id) DO UPDATE SET correct_answers = excluded.correct_answers''',
+                rows
+            )
+            await conn.commit()
+
+    @staticmethod
+    async def get_user_names(user_ids: List[int]) -> Dict[int, str]:
+        """Имена для строк рейтинга: @username, иначе имя"""
+        if not user_ids:
+            return {}
+        placeholders = ", ".join("?" * len(user_ids))
+        async with connect() as conn:
+            async with conn.execute(
+                f'SELECT user_id, username, first_name FROM users WHERE user_id IN ({placeholders})',
+                tuple(user_ids)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        return {user_id: f"@{username}" if username else (first_name or str(user_id)) for user_id, username, first_name in rows}
+
+
+@traced_class("db")
+class ExportManager:
+    """Выгрузки для преподавателей: строки читаются порциями (backend.iterate), а не fetchall"""
+
+    # Вид выгрузки -> (столбцы, запрос). Булевы значения - 0/1, чтобы выгрузки не зависели от бэкенда
+    EXPORTS = {
+        # Прогресс по (пользователь, категория); порядок совпадает с уникальным индексом, сортировки нет
+        'progress': (
+            ('user_id', 'username', 'first_name', 'category', 'questions_answered', 'correct_answers', 'last_activity'),
+            '''SELECT up.user_id, u.username, u.first_name, c.name, up.questions_answered, up.correct_answers, up.last_activity
+            FROM user_progress up
+            LEFT JOIN users u ON u.user_id = up.user_id
+            LEFT JOIN categories c ON c.id = up.category_id
+            ORDER BY up.user_id, up.category_id''',
+        ),
+        # Итоги по вопросам из answer_rollups (включают архив)
+        'questions': (
+            ('question_id', 'category', 'question_text', 'is_active', 'answers', 'correct_answers', 'users', 'accuracy'),
+            '''SELECT q.id, c.name, q.question_text, CASE WHEN q.is_active THEN 1 ELSE 0 END,
+                   COALESCE(r.answers, 0), COALESCE(r.correct_answers, 0), COALESCE(r.users, 0),
+                   CASE WHEN r.answers > 0
+                        THEN CAST(ROUND(r.correct_answers * 100.0 / r.answers, 1) AS DOUBLE PRECISION)
+                        ELSE 0 END
+            FROM questions q
+            LEFT JOIN categories c ON c.id = q.category_id
+            LEFT JOIN (
+                SELECT question_id, CAST(SUM(answers) AS BIGINT) AS answers,
+                       CAST(SUM(correct_answers) AS BIGINT) AS correct_answers, COUNT(*) AS users
+                FROM answer_rollups
+                GROUP BY question_id
+            ) r ON r.question_id = q.id
+            ORDER BY q.id''',
+        ),
+        # Все ответы: горячая таблица и архив, в порядке хранения
+        'answers': (
+            ('answered_at', 'user_id', 'question_id', 'category', 'question_text', 'answer_text', 'is_correct'),
+            '''SELECT a.answered_at, a.user_id, a.question_id, c.name, q.question_text, ans.answer_text,
+                   CASE WHEN a.is_correct THEN 1 ELSE 0 END
+            FROM (
+                SELECT user_id, question_id, answer_id, is_correct, answered_at FROM archive.user_answers
+                UNION ALL
+                SELECT user_id, question_id, answer_id, is_correct, answered_at FROM user_answers
+            ) a
+            LEFT JOIN questions q ON q.id = a.question_id
+            LEFT JOIN categories c ON c.id = q.category_id
+            LEFT JOIN answers ans ON ans.id = a.answer_id''',
+        ),
+    }
+
+    @staticmethod
+    async def iter_export(kind: str, batch_size: int = 5000) -> AsyncIterator[List[tuple]]:
+        """Строки выгрузки kind порциями по batch_size; соединение занято до конца чтения"""
+        _, sql = ExportManager.EXPORTS[kind]
+        async with connect() as conn:
+            if kind == 'answers':
+                await backend.attach_archive(conn)
+            async for rows in backend.iterate(conn, sql, (), batch_size):
+                yield rows
+
 # Функции-алиасы для обратной совместимости
 async def create_all_tables():
     """Алиас для DatabaseManager.create_all_tables"""
@@ -0,0 +1,207 @@
+import re
+import sqlite3
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import aiosqlite
+from aiosqlite.context import contextmanager
+from ..utils.logger import logger
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"IN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w?])-?\d+(?:\.\d+)?\b")
+
+
+def normalize_sql(sql: str) -> str:
+    """Приводит запрос к ключу: одна строка, литералы и списки IN (?, ?, ...) свернуты"""
+    sql = _WHITESPACE.sub(" ", sql).strip().rstrip(";")
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+class QueryStats:
+    """Накопленная статистика одного нормализованного запроса"""
+
+    def __init__(self, sql: str, sample_size: int):
+        self.sql = sql
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.samples = deque(maxlen=sample_size)
+
+    def add(self, duration: float, rows: int):
+        self.calls += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.rows += rows
+        self.samples.append(duration)
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class QueryProfiler:
+    """Профилировщик SQL: время, вызовы и строки по нормализованным запросам + лог медленных"""
+
+    def __init__(self, slow_seconds: float = 0.1, sample_size: int = 500):
+        self.slow_seconds = slow_seconds
+        self.sample_size = sample_size
+        self.stats: Dict[str, QueryStats] = {}
+        self.total_statements = 0
+        self._plans: Dict[str, str] = {}
+        self._listeners: List[Callable[[str, float, int], None]] = []
+
+    def add_listener(self, listener: Callable[[str, float, int], None]):
+        """listener(normalized_sql, duration, rows) вызывается после каждого запроса"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, float, int], None]):
+        self._listeners.remove(listener)
+
+    def record(self, sql: str, duration: float, rows: int) -> bool:
+        """Учитывает выполнение запроса. Возвращает True, если запрос медленный"""
+        key = normalize_sql(sql)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = QueryStats(key, self.sample_size)
+        stats.add(duration, rows)
+        self.total_statements += 1
+        for listener in self._listeners:
+            listener(key, duration, rows)
+        return duration >= self.slow_seconds
+
+    def top(self, n: int = 10, order_by: str = "total") -> List[QueryStats]:
+        return sorted(self.stats.values(), key=lambda s: getattr(s, order_by), reverse=True)[:n]
+
+    def reset(self):
+        self.stats.clear()
+        self.total_statements = 0
+
+    def report(self, n: int = 10) -> str:
+        """Текстовый отчет top-N запросов по суммарному времени"""
+        lines = [f"statements: {self.total_statements}, distinct: {len(self.stats)}"]
+        for stats in self.top(n):
+            lines.append(
+                f"{stats.total * 1000:9.1f} ms total | {stats.calls:6d} calls | "
+                f"avg {stats.avg * 1000:.2f} ms | p99 {stats.percentile(0.99) * 1000:.2f} ms | "
+                f"rows {stats.rows}\n    {stats.sql[:200]}"
+            )
+        return "\n".join(lines)
+
+    async def log_slow(self, conn: "ProfiledConnection", sql: str, parameters: Any, duration: float):
+        key = normalize_sql(sql)
+        plan = self._plans.get(key)
+        if plan is None and sql.lstrip()[:6].upper() in ("SELECT", "UPDATE", "DELETE", "INSERT"):
+            try:
+                rows = await conn._execute(conn._execute_fetchall, f"EXPLAIN QUERY PLAN {sql}", parameters)
+                plan = "; ".join(str(row[-1]) for row in rows)
+            except Exception as e:
+                plan = f"<EXPLAIN failed: {e}>"
+            self._plans[key] = plan
+        logger.warning("slow query %.1f ms: %s | plan: %s", duration * 1000, key[:300], plan or "-")
+
+
+class ProfiledCursor(aiosqlite.Cursor):
+    """Курсор, досчитывающий время выборки и число строк до закрытия"""
+
+    def __init__(self, conn: "ProfiledConnection", cursor, sql: str, parameters: Any, duration: float):
+        super().__init__(conn, cursor)
+        self._sql = sql
+        self._parameters = parameters
+        self._duration = duration
+        self._rows = 0
+        self._finished = False
+
+    async def fetchone(self):
+        started = time.perf_counter()
+        row = await super().fetchone()
+        self._duration += time.perf_counter() - started
+        if row is not None:
+            self._rows += 1
+        return row
+
+    async def fetchmany(self, size: Optional[int] = None) -> Iterable:
+        started = time.perf_counter()
+        rows = await super().fetchmany(size)
+        self._duration += time.perf_counter() - started
+        self._rows += len(rows)
+        return rows
+
+    async def fetchall(self) -> Iterable:
+        started = time.perf_counter()
+        rows = await super().fetchall()
+        self._duration += time.perf_counter() - started
+        self._rows += len(rows)
+        return rows
+
+    async def close(self):
+        await self._finish()
+        await super().close()
+
+    async def _finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        self._conn._pending.discard(self)
+        if self._rows == 0 and self._cursor.rowcount > 0:
+            # DML: считаем затронутые строки
+            self._rows = self._cursor.rowcount
+        if self._conn.profiler.record(self._sql, self._duration, self._rows):
+            await self._conn.profiler.log_slow(self._conn, self._sql, self._parameters, self._duration)
+
+
+class ProfiledConnection(aiosqlite.Connection):
+    """Соединение aiosqlite, которое пропускает каждый запрос через профилировщик"""
+
+    def __init__(self, connector, iter_chunk_size: int, profiler: QueryProfiler):
+        super().__init__(connector, iter_chunk_size)
+        self.profiler = profiler
+        self._pending = set()
+
+    @contextmanager
+    async def execute(self, sql: str, parameters: Optional[Iterable[Any]] = None) -> ProfiledCursor:
+        if parameters is None:
+            parameters = []
+        started = time.perf_counter()
+        cursor = await self._execute(self._conn.execute, sql, parameters)
+        profiled = ProfiledCursor(self, cursor, sql, parameters, time.perf_counter() - started)
+        if cursor.description is None:
+            # Запрос без результата - статистика готова сразу
+            await profiled._finish()
+        else:
+            self._pending.add(profiled)
+        return profiled
+
+    @contextmanager
+    async def executemany(self, sql: str, parameters: Iterable[Iterable[Any]]) -> aiosqlite.Cursor:
+        parameters = list(parameters)
+        started = time.perf_counter()
+        cursor = await self._execute(self._conn.executemany, sql, parameters)
+        duration = time.perf_counter() - started
+        if self.profiler.record(sql, duration, max(cursor.rowcount, 0)):
+            logger.warning("slow executemany %.1f ms (%s rows): %s", duration * 1000, len(parameters), normalize_sql(sql)[:300])
+        return aiosqlite.Cursor(self, cursor)
+
+    async def close(self):
+        # Курсоры, которые не закрыли явно, учитываем при закрытии соединения
+        for cursor in list(self._pending):
+            await cursor._finish()
+        await super().close()
+
+
+def profiled_connect(database: str, profiler: QueryProfiler, iter_chunk_size: int = 64, **kwargs) -> ProfiledConnection:
+    """Аналог aiosqlite.connect, возвращающий ProfiledConnection"""
+    def connector():
+        return sqlite3.connect(str(database), **kwargs)
+
+    return ProfiledConnection(connector, iter_chunk_size, profiler)
@@ -1,15 +1,28 @@
 
+import asyncio
+import html
+import time
 from aiogram.fsm.state import StatesGroup, State
 from aiogram import F, types, Dispatcher
 from aiogram.filters import Command  
 from ..config import get_base_keyboard, get_my_keyboard, admin_get_categories_keyboard, admin_get_questions_keyboard, get_difficulty_keyboard, get_question_management_keyboard
-from ..config.keyboards import admin_get_categories_for_questions_keyboard
-import sqlite3
+from ..config.keyboards import admin_get_categories_for_questions_keyboard, get_export_keyboard, EXPORT_KINDS
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
-from ..database.models import QuestionManager, CategoryManager, ProgressManager
+from ..database.backends.base import SEARCH_MARK_END, SEARCH_MARK_START
+from ..database.models import QuestionManager, CategoryManager, profiler
+from ..services.dedup import question_dedup
+from ..services.exporter import AnalyticsExporter
+from ..services.stats_snapshot import stats_aggregator
 from ..config import get_admin_keyboard
 from ..config.settings import settings
+from ..utils.logger import logger
+from ..utils.metrics import metrics
+from ..utils.tracing import tracer
+
+# Результатов поиска /search на странице
+SEARCH_PAGE_SIZE = 5
+
 
 class AdminStates(StatesGroup):
     waiting_broadcast = State() 
@@ -32,9 +45,15 @@ class AdminStates(StatesGroup):
 
 class AdminHandlers:
     def __init__(self, dp: Dispatcher):
-        self.admin_ids = settings.get_admin_ids()
+        self.exporter = AnalyticsExporter(settings.EXPORT_BATCH_SIZE, settings.EXPORT_PART_MB * 1024 * 1024)
+        # Текущая выгрузка (одна на процесс): ссылка держится, пока задача не закончится
+        self._export_task = None
 
         dp.message.register(self.admin_panel, Command("admin"))
+        dp.message.register(self.show_metrics, Command("metrics"))
+        dp.message.register(self.show_db_stats, Command("dbstats"))
+        dp.message.register(self.show_traces, Command("traces"))
+        dp.message.register(self.search_questions_command, Command("search"))
         dp.callback_query.register(self.admin_panel_callback, F.data == "admin")        
 
         # Handle only top-level admin actions; do not swallow more specific admin_* callbacks
@@ -46,8 +65,14 @@ class AdminHandlers:
                 F.data == "admin_questions"
             ) | (
                 F.data == "admin_stats"
+            ) | (
+                F.data == "admin_stats_refresh"
+            ) | (
+                F.data == "admin_export"
             )
         )
+        dp.callback_query.register(self.start_export, F.data.startswith("admin_export_"))
+        dp.callback_query.register(self.search_page_callback, F.data.startswith("admin_search_"))
 
         dp.message.register(
             self.broadcast_message,
@@ -111,6 +136,10 @@ class AdminHandlers:
             self.process_questions_category_selection,
             F.data.startswith("admin_qcat_")
         )
+        dp.callback_query.register(
+            self.process_questions_page,
+            F.data.startswith("admin_qpage_")
+        )
         dp.callback_query.register(
             self.process_question_selection,
             F.data.startswith("admin_question_")
@@ -199,9 +228,6 @@ class AdminHandlers:
         
     async def admin_panel(self, message: types.Message, state: FSMContext):
         await state.clear()        
-        if message.from_user.id not in self.admin_ids:
-            await message.answer("У вас нет доступа к админ-панели.")
-            return
         await message.answer(
             "Что бы вы хотели сделать, админ?",
             reply_markup=get_admin_keyboard()
@@ -209,9 +235,6 @@ class AdminHandlers:
 
     async def admin_panel_callback(self, callback: types.CallbackQuery, state: FSMContext):     
         await state.clear()           
-        if callback.from_user.id not in self.admin_ids:
-            await callback.answer("У вас нет доступа к админ-панели", show_alert=True)
-            return
         await callback.message.edit_text(
             "Что бы вы хотели сделать, админ?",
             reply_markup=get_admin_keyboard()
@@ -221,10 +244,6 @@ class AdminHandlers:
     async def admin_action_callback(self, callback: types.CallbackQuery, state: FSMContext):
         await state.clear()
         data = "_".join(callback.data.split("_")[1:])
-        if callback.from_user.id not in self.admin_ids:
-            await callback.answer("Нет доступа", show_alert=True)
-            return
-        
         if data == "mailing":
             await callback.message.answer(
                 "📢 Отправьте текст для рассылки.\n\n💡 Вы также можете отправить фотографию с подписью - она будет разослана всем пользователям.", 
@@ -244,6 +263,20 @@ class AdminHandlers:
             await self.show_admin_stats(callback)
             await callback.answer()
             
+        elif data == "stats_refresh":
+            await self.show_admin_stats(callback, refresh=True)
+            await callback.answer("Статистика пересчитана")
+            
+        elif data == "export":
+            await callback.message.edit_text(
+                "📤 <b>Выгрузки для преподавателей</b>\n\n"
+                "Файлы gzip (CSV открывается в Excel, NDJSON - по JSON-объекту на строку). "
+                f"Большие выгрузки делятся на части по {settings.EXPORT_PART_MB} МБ.",
+                reply_markup=get_export_keyboard(),
+                parse_mode="HTML"
+            )
+            await callback.answer()
+            
         elif data == "add_category":
             await callback.message.edit_text(
                 "📝 Введите название новой категории:",
@@ -315,12 +348,18 @@ class AdminHandlers:
             # Создаем локальную клавиатуру управления с корректной кнопкой Назад
             data = await state.get_data()
             category_id = data.get('selected_category_id')
+            if category_id:
+                back_data = f"admin_qcat_{category_id}"
+            elif data.get('search_query'):
+                back_data = f"admin_search_{data.get('search_page', 0)}"
+            else:
+                back_data = "admin_questions"
             keyboard = types.InlineKeyboardMarkup(
                 inline_keyboard=[
                     [types.InlineKeyboardButton(text="✏️ Редактировать", callback_data=f"edit_question_{question_id}")],
                     [types.InlineKeyboardButton(text="🔄 Изменить статус", callback_data=f"toggle_question_{question_id}")],
                     [types.InlineKeyboardButton(text="🗑️ Удалить", callback_data=f"delete_question_{question_id}")],
-                    [types.InlineKeyboardButton(text="Назад", callback_data=(f"admin_qcat_{category_id}" if category_id else "admin_questions"))],
+                    [types.InlineKeyboardButton(text="Назад", callback_data=back_data)],
                 ]
             )
             
@@ -409,6 +448,14 @@ class AdminHandlers:
         )
         await callback.answer()
 
+    async def process_questions_page(self, callback: types.CallbackQuery, state: FSMContext):
+        """Соседняя страница вопросов категории: admin_qpage_<категория>_<next|prev>_<id>"""
+        _, _, category_id, direction, cursor = callback.data.split("_")
+        await callback.message.edit_reply_markup(
+            reply_markup=await admin_get_questions_keyboard(int(category_id), int(cursor), direction == "prev")
+        )
+        await callback.answer()
+
     async def process_new_category_name(self, message: types.Message, state: FSMContext):
         """Обработка названия новой категории"""
         category_name = message.text.strip()
@@ -428,6 +475,7 @@ class AdminHandlers:
             )
             await state.clear()
         except Exception as e:
+            logger.exception("add category failed")
             await message.answer(
                 f"❌ Ошибка при добавлении категории: {str(e)}",
                 reply_markup=types.InlineKeyboardMarkup(
@@ -475,6 +523,7 @@ class AdminHandlers:
                 )
                 await state.clear()
             except Exception as e:
+                logger.exception("add category failed")
                 await callback.message.edit_text(
                     f"❌ Ошибка при добавлении категории: {str(e)}",
                     reply_markup=types.InlineKeyboardMarkup(
@@ -506,6 +555,7 @@ class AdminHandlers:
                         explanation=question_explanation,
                     )
                     await state.update_data(current_question_id=question_id, draft_answers=[])
+                question_dedup.remember(question_id, category_id, question_text)
                 await callback.message.edit_text(
                     "🧩 Теперь добавим варианты ответов. Отправьте текст ответа:",
                     reply_markup=types.InlineKeyboardMarkup(
@@ -515,6 +565,7 @@ class AdminHandlers:
                 )
                 await state.set_state(AdminStates.waiting_answer_text)
             except Exception as e:
+                logger.exception("save question failed")
                 await callback.message.edit_text(
                     f"❌ Ошибка при сохранении вопроса: {str(e)}",
                     reply_markup=types.InlineKeyboardMarkup(
@@ -566,8 +617,21 @@ class AdminHandlers:
         await state.update_data(question_text=question_text)
         await state.set_state(AdminStates.waiting_question_explanation)
         
+        # Почти-дубликаты в той же категории: предупреждаем, но решение за админом (можно отменить)
+        data = await state.get_data()
+        warning = ""
+        category_id = data.get('question_category_id')
+        if category_id:
+            exclude_id = data.get('current_question_id') if data.get('is_edit') else None
+            similar = (await question_dedup.find_similar(category_id, question_text, exclude_id))[:3]
+            if similar:
+                texts = await QuestionManager.get_question_texts([question_id for question_id, _ in similar])
+                warning = "⚠️ В категории уже есть похожие вопросы:\n" + "".join(
+                    f"• #{question_id} ({score:.0%}): {texts.get(question_id, '')[:80]}\n" for question_id, score in similar
+                ) + "\n"
+        
         await message.answer(
-            "💡 Введите объяснение к вопросу (или отправьте '-' чтобы пропустить):",
+            warning + "💡 Введите объяснение к вопросу (или отправьте '-' чтобы пропустить):",
             reply_markup=types.InlineKeyboardMarkup(
                 inline_keyboard=[[
                     types.InlineKeyboardButton(text="Отмена", callback_data="admin_questions")
@@ -612,42 +676,47 @@ class AdminHandlers:
             )
         )
 
-    async def show_admin_stats(self, callback: types.CallbackQuery):
-        """Показывает статистику для админа"""
+    async def show_admin_stats(self, callback: types.CallbackQuery, refresh: bool = False):
+        """Показывает статистику для админа из снимка (services/stats_snapshot.py)"""
         try:
-            stats = await ProgressManager.get_category_stats()
-            
-            if not stats:
-                await callback.message.edit_text(
-                    "📊 Статистика пока недоступна",
-                    reply_markup=types.InlineKeyboardMarkup(
-                        inline_keyboard=[[
-                            types.InlineKeyboardButton(text="Назад", callback_data="admin")
-                        ]]
-                    )
-                )
-                return
+            if refresh:
+                stats, computed_at = await stats_aggregator.refresh()
+            else:
+                stats, computed_at = await stats_aggregator.get()
             
-            text = "📊 <b>Статистика системы:</b>\n\n"
+            age = int(time.time() - computed_at)
+            updated = "только что" if age < 60 else f"{age // 60} мин назад"
+            text = "📊 <b>Статистика системы:</b>\n"
+            text += f"🕒 Обновлено: {time.strftime('%d.%m %H:%M:%S', time.localtime(computed_at))} ({updated})\n\n"
+            text += f"👥 Пользователей: {stats['users']}\n"
+            text += f"📅 Активны за сутки (DAU): {stats['dau']}, за неделю (WAU): {stats['wau']}\n"
+            text += f"✍️ Ответов за час: {stats['answers_last_hour']}, за сутки: {stats['answers_24h']}"
+            if stats['hourly']:
+                peak_hour, peak = max(stats['hourly'], key=lambda bucket: bucket[1])
+                text += f" (в среднем {stats['answers_24h'] / 24:.1f}/ч, пик {peak} в {peak_hour[-5:]})"
+            text += "\n\n"
             
-            for stat in stats:
-                name, difficulty, total_questions, users_studied = stat
-                difficulty_emoji = {"beginner": "🟢", "intermediate": "🟡", "advanced": "🔴"}.get(difficulty, "⚪")
-                text += f"{difficulty_emoji} <b>{name}</b>\n"
-                text += f"   📚 Вопросов: {total_questions}\n"
-                text += f"   👥 Изучали: {users_studied} чел.\n\n"
+            if not stats['categories']:
+                text += "Активных категорий пока нет\n"
+            for category in stats['categories']:
+                text += f"<b>{html.escape(category['name'])}</b>\n"
+                text += f"   📚 Активных вопросов: {category['active_questions']}\n"
+                text += f"   👥 Изучали: {category['users_studied']} чел.\n"
+                text += f"   🎯 Ответов: {category['answers']}, точность: {category['accuracy']}%\n\n"
             
             await callback.message.edit_text(
                 text,
                 reply_markup=types.InlineKeyboardMarkup(
-                    inline_keyboard=[[
-                        types.InlineKeyboardButton(text="Назад", callback_data="admin")
-                    ]]
+                    inline_keyboard=[
+                        [types.InlineKeyboardButton(text="🔄 Обновить", callback_data="admin_stats_refresh")],
+                        [types.InlineKeyboardButton(text="Назад", callback_data="admin")]
+                    ]
                 ),
                 parse_mode="HTML"
             )
             
         except Exception as e:
+            logger.exception("admin stats failed")
             await callback.message.edit_text(
                 f"❌ Ошибка при загрузке статистики: {str(e)}",
                 reply_markup=types.InlineKeyboardMarkup(
@@ -657,17 +726,156 @@ class AdminHandlers:
                 )
             )
 
+    async def start_export(self, callback: types.CallbackQuery, state: FSMContext):
+        """Запускает выгрузку в фоне: хендлер не держит очередь апдейтов админа до конца выгрузки"""
+        kind, fmt = callback.data[len("admin_export_"):].rsplit("_", 1)
+        if kind not in EXPORT_KINDS:
+            await callback.answer("Неизвестная выгрузка", show_alert=True)
+            return
+        if self._export_task is not None and not self._export_task.done():
+            await callback.answer("Дождитесь окончания текущей выгрузки", show_alert=True)
+            return
+        
+        status = await callback.message.answer(f"⏳ {EXPORT_KINDS[kind]} ({fmt.upper()}): выгрузка началась")
+        self._export_task = asyncio.create_task(self._run_export(callback.bot, status, kind, fmt))
+        await callback.answer()
+
+    async def _run_export(self, bot, status: types.Message, kind: str, fmt: str):
+        title = f"{EXPORT_KINDS[kind]} ({fmt.upper()})"
+        
+        async def progress(rows: int):
+            try:
+                await status.edit_text(f"⏳ {title}: выгружено {rows} строк...")
+            except Exception:
+                # Прогресс не важнее самой выгрузки (например, лимит на редактирование)
+                logger.warning("export progress update failed", exc_info=True)
+        
+        try:
+            result = await self.exporter.export(kind, fmt, on_progress=progress)
+        except Exception as e:
+            logger.exception("export failed")
+            await status.edit_text(f"❌ {title}: ошибка выгрузки: {e}")
+            return
+        try:
+            parts = len(result.files)
+            await status.edit_text(f"📤 {title}: {result.rows} строк за {result.elapsed} с, отправляю файлов: {parts}")
+            for number, path in enumerate(result.files, 1):
+                caption = f"{title}, часть {number} из {parts}" if parts > 1 else title
+                await bot.send_document(status.chat.id, types.FSInputFile(path), caption=caption)
+            await status.edit_text(f"✅ {title}: {result.rows} строк, файлов: {parts}")
+        except Exception as e:
+            logger.exception("export upload failed")
+            await status.edit_text(f"❌ {title}: не удалось отправить файл: {e}")
+        finally:
+            result.cleanup()
+
+    async def show_metrics(self, message: types.Message):
+        """Сводка метрик хендлеров: запросы, ошибки, средняя задержка и p95"""
+        histograms = metrics.histograms("bot_handler_latency_seconds")
+        errors = metrics.counters("bot_handler_errors_total")
+        if not histograms:
+            await message.answer("📈 Метрик пока нет")
+            return
+        
+        # Сортируем по суммарному времени: сверху то, что больше всего нагружает бота
+        rows = sorted(histograms.items(), key=lambda item: item[1].sum, reverse=True)
+        text = "📈 <b>Метрики хендлеров</b> (по суммарному времени)\n\n"
+        for labels, histogram in rows[:20]:
+            handler = html.escape(dict(labels).get('handler', ''))
+            text += (
+                f"<code>{handler}</code>: {histogram.count} запр., "
+                f"ошибок {int(errors.get(labels, 0))}, "
+                f"ср. {histogram.mean * 1000:.0f} мс, "
+                f"p95 {histogram.quantile(0.95) * 1000:.0f} мс\n"
+            )
+        await message.answer(text, parse_mode="HTML")
+
+    async def show_db_stats(self, message: types.Message):
+        """Топ-N SQL-запросов по суммарному времени: /dbstats [N] или /dbstats reset"""
+        args = (message.text or "").split()[1:]
+        if args and args[0] == "reset":
+            profiler.reset()
+            await message.answer("🗄 Статистика запросов сброшена")
+            return
+        limit = int(args[0]) if args and args[0].isdigit() else 10
+        
+        report = profiler.report(limit)
+        # Ограничение Telegram - 4096 символов на сообщение
+        await message.answer(f"🗄 <b>SQL по суммарному времени</b>\n<pre>{html.escape(report)[:3900]}</pre>", parse_mode="HTML")
+
+    async def show_traces(self, message: types.Message):
+        """Самые медленные недавние апдейты с разбивкой времени по спанам: /traces [N]"""
+        if not tracer.enabled:
+            await message.answer("🧭 Трассировка выключена (TRACE_ENABLED=0)")
+            return
+        args = (message.text or "").split()[1:]
+        limit = min(int(args[0]), 20) if args and args[0].isdigit() else 5
+        
+        report = tracer.report(limit)
+        await message.answer(f"🧭 <b>Медленные апдейты</b>\n<pre>{html.escape(report)[:3900]}</pre>", parse_mode="HTML")
+
+    async def search_questions_command(self, message: types.Message, state: FSMContext):
+        """Полнотекстовый поиск по вопросам, ответам и объяснениям: /search <текст>"""
+        query = (message.text or "").partition(" ")[2].strip()
+        if not query:
+            await message.answer("🔎 Использование: /search <слова из вопроса, ответа или объяснения>")
+            return
+        await state.clear()
+        # Запрос в состоянии - кнопки страниц и "Назад" из карточки вопроса возвращаются к нему
+        await state.update_data(search_query=query, search_page=0)
+        text, keyboard = await self._render_search(query, 0)
+        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+    async def search_page_callback(self, callback: types.CallbackQuery, state: FSMContext):
+        data = await state.get_data()
+        query = data.get('search_query')
+        if not query:
+            await callback.answer("Поиск устарел, повторите /search", show_alert=True)
+            return
+        page = int(callback.data.split("_")[2])
+        await state.update_data(search_page=page, selected_category_id=None)
+        text, keyboard = await self._render_search(query, page)
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+        await callback.answer()
+
+    async def _render_search(self, query: str, page: int):
+        started = time.perf_counter()
+        rows, has_next = await QuestionManager.search_questions(query, SEARCH_PAGE_SIZE, page * SEARCH_PAGE_SIZE)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if not rows:
+            text = f"🔎 По запросу «{html.escape(query)}» ничего не найдено"
+            if page:
+                text += " на этой странице"
+            return text, types.InlineKeyboardMarkup(inline_keyboard=[[
+                types.InlineKeyboardButton(text="Назад", callback_data="admin_questions")
+            ]])
+
+        text = f"🔎 <b>Поиск:</b> {html.escape(query)} (стр. {page + 1}, {elapsed_ms:.0f} мс)\n\n"
+        buttons = []
+        for number, (question_id, category_name, is_active, fragment) in enumerate(rows, page * SEARCH_PAGE_SIZE + 1):
+            # Экранируем текст, потом превращаем метки совпадений в жирный шрифт
+            fragment = html.escape(fragment or "").replace(SEARCH_MARK_START, "<b>").replace(SEARCH_MARK_END, "</b>")
+            status_emoji = "✅" if is_active else "❌"
+            text += f"{number}. {status_emoji} <i>{html.escape(category_name)}</i>\n{fragment}\n\n"
+            buttons.append([types.InlineKeyboardButton(text=f"{number}. Открыть вопрос", callback_data=f"admin_question_{question_id}")])
+
+        navigation = []
+        if page > 0:
+            navigation.append(types.InlineKeyboardButton(text="⬅️", callback_data=f"admin_search_{page - 1}"))
+        if has_next:
+            navigation.append(types.InlineKeyboardButton(text="➡️", callback_data=f"admin_search_{page + 1}"))
+        if navigation:
+            buttons.append(navigation)
+        buttons.append([types.InlineKeyboardButton(text="Назад", callback_data="admin_questions")])
+        return text, types.InlineKeyboardMarkup(inline_keyboard=buttons)
+
     async def broadcast_message(self, message: types.Message, state: FSMContext):
         """Обработчик рассылки сообщений"""
         from ..database.models import UserManager
         
         try:
             # Получаем всех пользователей
-            conn = sqlite3.connect(settings.DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("SELECT user_id FROM users")
-            user_ids = [row[0] for row in cursor.fetchall()]
-            conn.close()
+            user_ids = await UserManager.get_all_user_ids()
             
             sent = 0
             failed = 0
@@ -686,7 +894,7 @@ class AdminHandlers:
                         )
                         sent += 1
                     except Exception as e:
-                        print(f"Ошибка отправки фото пользователю {user_id}: {e}")
+                        logger.warning("broadcast photo failed: %s", e, extra={'user_id': user_id})
                         failed += 1
                         continue
                         
@@ -706,7 +914,7 @@ class AdminHandlers:
                         )
                         sent += 1
                     except Exception as e:
-                        print(f"Ошибка отправки сообщения пользователю {user_id}: {e}")
+                        logger.warning("broadcast message failed: %s", e, extra={'user_id': user_id})
                         failed += 1
                         continue
                         
@@ -720,6 +928,7 @@ class AdminHandlers:
             )
             
         except Exception as e:
+            logger.exception("broadcast failed")
             await message.answer(
                 f"❌ Ошибка при рассылке: {str(e)}",
                 reply_markup=get_admin_keyboard()
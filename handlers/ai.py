@@ -4,11 +4,18 @@ from ..services.ai import AI_GPT
 from ..config import get_base_keyboard
 from ..database.models import MessageManager
 from .admin import AdminStates
+from ..utils.logger import logger
+from ..utils.metrics import metrics
 import asyncio
 
+metrics.describe("ai_circuit_state", "Состояние предохранителя AI: 0 - closed, 1 - half_open, 2 - open")
+metrics.describe("ai_circuit_rejected_total", "Запросы к AI, отклоненные предохранителем")
+metrics.describe("ai_circuit_transitions_total", "Смены состояния предохранителя AI")
+
 class AI_Handlers:  
     def __init__(self, dp: Dispatcher):
         self.gpt = AI_GPT()
+        metrics.register_collector(self.collect_metrics)
         dp.message.register(
             self.fallback_handler,
             F.text,
@@ -20,12 +27,26 @@ class AI_Handlers:
             # ~StateFilter(AdminStates.waiting_flower_category),
         )
 
+    def collect_metrics(self, registry):
+        """Состояние предохранителей AI для экспорта метрик"""
+        states = {"closed": 0, "half_open": 1, "open": 2}
+        for stats in self.gpt.stats():
+            registry.set_gauge("ai_circuit_state", states[stats['state']], endpoint=stats['name'])
+            registry.set_counter("ai_circuit_rejected_total", stats['rejected'], endpoint=stats['name'])
+            for transition, count in stats['transitions'].items():
+                registry.set_counter("ai_circuit_transitions_total", count, endpoint=stats['name'], transition=transition)
+
     async def fallback_handler(self, message: types.Message):
         if message.text and message.text.startswith('/'):
             return
             
         user_id = message.from_user.id
 
+        # Предохранители открыты - отвечаем сразу, не дожидаясь таймаута
+        if not self.gpt.is_available():
+            await message.answer(AI_GPT.UNAVAILABLE_TEXT, reply_markup=get_base_keyboard())
+            return
+
         try:
             await MessageManager.add_message(user_id, "user", message.text)
             history = await MessageManager.get_history(user_id, limit=5)
@@ -69,6 +90,11 @@ class AI_Handlers:
                     # Если не удалось отредактировать, продолжаем
                     pass
             
+            # Ответа нет (ошибка или пустой поток) - не сохраняем пустоту в историю
+            if not full_response:
+                await bot_message.edit_text(AI_GPT.UNAVAILABLE_TEXT, reply_markup=get_base_keyboard())
+                return
+            
             # Финальное обновление без курсора
             try:
                 await bot_message.edit_text(full_response, reply_markup=get_base_keyboard())
@@ -85,5 +111,6 @@ class AI_Handlers:
 
         except Exception as e:
             # В случае ошибки удаляем сообщение "печатает..." и показываем ошибку
+            logger.exception("AI chat failed")
             
             await message.answer(f"Произошла ошибка: {str(e)}", reply_markup=get_base_keyboard())
\ No newline at end of file
@@ -1,8 +1,11 @@
 from aiogram import F, types, Dispatcher
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from ..config import get_base_keyboard, get_categories_keyboard, get_learning_keyboard, get_learning_keyboard_main
+import html
+from ..config import get_base_keyboard, get_categories_keyboard, get_learning_keyboard, get_learning_keyboard_main, get_leaderboard_keyboard
 from ..database.models import UserManager, ProgressManager
+from ..services.leaderboard import leaderboard
+from ..services.review import review_scheduler
 
 class BaseHandlers:
     def __init__(self, dp: Dispatcher):
@@ -11,10 +14,13 @@ class BaseHandlers:
         dp.callback_query.register(self.select_category, F.data == "select_category")
         dp.callback_query.register(self.random_question, F.data == "random_question")
         dp.callback_query.register(self.my_stats, F.data == "my_stats")
+        dp.callback_query.register(self.show_leaderboard, F.data.in_({"leaderboard", "leaderboard_week"}))
         dp.callback_query.register(self.about, F.data == "about")
         dp.callback_query.register(self.main_menu, F.data == "main_menu")
 
     async def start_cmd(self, message: types.Message, state: FSMContext):
+        # Неотправленные ответы повторения пересчитываются до сброса состояния
+        await review_scheduler.flush(state, message.from_user.id)
         await state.clear()
         await UserManager.add_user(
             user_id=message.from_user.id,
@@ -29,6 +35,7 @@ class BaseHandlers:
             reply_markup=get_base_keyboard()
         )
     async def start_learning(self, callback: types.CallbackQuery, state: FSMContext):
+        await review_scheduler.flush(state, callback.from_user.id)
         await state.clear()
         # Ensure user is in DB for future broadcasts
         from ..database.models import UserManager
@@ -46,6 +53,7 @@ class BaseHandlers:
         await callback.answer()
 
     async def select_category(self, callback: types.CallbackQuery, state: FSMContext):
+        await review_scheduler.flush(state, callback.from_user.id)
         await state.clear()
         categories_keyboard = await get_categories_keyboard()
         await callback.message.edit_text(
@@ -56,6 +64,7 @@ class BaseHandlers:
         await callback.answer()
 
     async def random_question(self, callback: types.CallbackQuery, state: FSMContext):
+        await review_scheduler.flush(state, callback.from_user.id)
         await state.clear()
         from ..database.models import CategoryManager, QuestionManager
         
@@ -70,11 +79,7 @@ class BaseHandlers:
             await callback.answer()
             return
         # Если нашли глобально, вытянем category_id
-        from ..database.models import aiosqlite, DB_PATH
-        async with aiosqlite.connect(DB_PATH) as conn:
-            async with conn.execute('SELECT category_id FROM questions WHERE id = ?', (question_data['question'][0],)) as cur:
-                row = await cur.fetchone()
-                category_id = row[0] if row else None
+        category_id = await QuestionManager.get_question_category(question_data['question'][0])
         await self.show_question(callback, question_data, category_id, state)
         await callback.answer()
 
@@ -88,7 +93,7 @@ class BaseHandlers:
         
         question_id, question_text, difficulty_level, explanation = question
         
-        # Сохраняем данные вопроса в state для проверки ответа
+        # Режим и категория нужны "Следующему вопросу"; ответ проверяется по подписанной кнопке
         is_repeat_mode = False
         if state:
             data = await state.get_data()
@@ -96,15 +101,8 @@ class BaseHandlers:
             await state.update_data(
                 current_question_id=question_id,
                 current_category_id=category_id,
-                correct_answer_id=None,
                 is_repeat_mode=is_repeat_mode
             )
-            
-            # Находим правильный ответ
-            for answer in answers:
-                if answer[2]:  # is_correct
-                    await state.update_data(correct_answer_id=answer[0])
-                    break
         
         # Добавляем подпись режима и эмодзи сложности
         difficulty_emoji = {"beginner": "🟢", "intermediate": "🟡", "advanced": "🔴"}.get(difficulty_level, "⚪")
@@ -113,7 +111,7 @@ class BaseHandlers:
         
         await callback.message.edit_text(
             text,
-            reply_markup=get_question_keyboard(answers),
+            reply_markup=get_question_keyboard(answers, callback.from_user.id, question_id, category_id, is_repeat_mode),
             parse_mode="HTML"
         )
 
@@ -142,7 +140,11 @@ class BaseHandlers:
         stats_text += f"• Всего вопросов: {overall_progress['total_questions_answered']}\n"
         stats_text += f"• Правильных ответов: {overall_progress['total_correct_answers']}\n"
         stats_text += f"• Точность: {overall_progress['accuracy']}%\n"
-        stats_text += f"• Изучено категорий: {overall_progress['categories_studied']}\n\n"
+        stats_text += f"• Изучено категорий: {overall_progress['categories_studied']}\n"
+        rank, _, participants = await leaderboard.get_rank(callback.from_user.id)
+        if rank is not None:
+            stats_text += f"• Место в рейтинге: {rank} из {participants}\n"
+        stats_text += "\n"
         
         # Статистика по категориям
         if category_stats:
@@ -159,6 +161,30 @@ class BaseHandlers:
         )
         await callback.answer()
 
+    async def show_leaderboard(self, callback: types.CallbackQuery, state: FSMContext):
+        """Топ пользователей по правильным ответам и место пользователя (за неделю или за все время)"""
+        weekly = callback.data == "leaderboard_week"
+        top = await leaderboard.get_top(weekly)
+        rank, score, participants = await leaderboard.get_rank(callback.from_user.id, weekly)
+        
+        text = f"🏆 <b>Рейтинг {'за неделю' if weekly else 'за все время'}</b>\n\n"
+        if not top:
+            text += "Пока никто не ответил правильно - станьте первым!\n"
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        for place, name, correct_answers in top:
+            text += f"{medals.get(place, f'{place}.')} {html.escape(name)} - {correct_answers}\n"
+        if rank is not None:
+            text += f"\n📍 Ваше место: {rank} из {participants} (правильных ответов: {score})"
+        else:
+            text += "\n📍 Вас пока нет в рейтинге - ответьте правильно хотя бы на один вопрос"
+        
+        await callback.message.edit_text(
+            text,
+            reply_markup=get_leaderboard_keyboard(weekly),
+            parse_mode="HTML"
+        )
+        await callback.answer()
+
     async def about(self, callback: types.CallbackQuery, state: FSMContext):
         """Информация о боте"""
         about_text = (
@@ -185,6 +211,7 @@ class BaseHandlers:
 
     async def main_menu(self, callback: types.CallbackQuery, state: FSMContext):
         """Возврат в главное меню"""
+        await review_scheduler.flush(state, callback.from_user.id)
         await state.clear()
         await callback.message.edit_text(
             "🏠 <b>Главное меню</b>\n\nВыберите действие:",
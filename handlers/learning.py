@@ -1,3 +1,4 @@
+import random
 from aiogram import F, types, Dispatcher
 from aiogram.fsm.context import FSMContext
 from ..database.models import CategoryManager, QuestionManager, ProgressManager
@@ -8,6 +9,11 @@ from ..config.keyboards import (
     get_question_navigation_keyboard,
     get_repeat_session_completed_keyboard
 )
+from ..services.decks import question_decks
+from ..services.leaderboard import leaderboard
+from ..services.prefetch import question_prefetcher
+from ..services.review import review_scheduler
+from ..utils.callback_tokens import answer_tokens
 
 class LearningHandlers:
     def __init__(self, dp: Dispatcher):
@@ -18,10 +24,13 @@ class LearningHandlers:
         dp.callback_query.register(self.restart_repeat_session, F.data == "restart_repeat_session")
         dp.callback_query.register(self.my_stats, F.data == "my_stats")
         dp.callback_query.register(self.category_selected, F.data.startswith("category_"))
+        dp.callback_query.register(self.categories_page, F.data.startswith("catpage_"))
         dp.callback_query.register(self.answer_question, F.data.startswith("answer_"))
         dp.callback_query.register(self.next_question, F.data.startswith("next_question_"))
 
     async def start_learning(self, callback: types.CallbackQuery, state: FSMContext):
+        # Неотправленные ответы повторения пересчитываются до сброса состояния
+        await review_scheduler.flush(state, callback.from_user.id)
         await state.clear()
         await callback.message.edit_text(
             "📚 <b>Режим: Обучение</b>\n\nВыберите способ обучения:",
@@ -31,6 +40,7 @@ class LearningHandlers:
         await callback.answer()
 
     async def select_category(self, callback: types.CallbackQuery, state: FSMContext):
+        await review_scheduler.flush(state, callback.from_user.id)
         await state.clear()
         categories_keyboard = await get_categories_keyboard()
         await callback.message.edit_text(
@@ -41,6 +51,7 @@ class LearningHandlers:
         await callback.answer()
 
     async def random_question(self, callback: types.CallbackQuery, state: FSMContext):
+        await review_scheduler.flush(state, callback.from_user.id)
         await state.clear()
         
         # Глобально случайный невиденный вопрос
@@ -54,11 +65,7 @@ class LearningHandlers:
             await callback.answer()
             return
         # найти категорию
-        from ..database.models import aiosqlite, DB_PATH
-        async with aiosqlite.connect(DB_PATH) as conn:
-            async with conn.execute('SELECT category_id FROM questions WHERE id = ?', (question_data['question'][0],)) as cur:
-                row = await cur.fetchone()
-                category_id = row[0] if row else None
+        category_id = await QuestionManager.get_question_category(question_data['question'][0])
         
         # Добавляем режим обучения для случайного вопроса
         await state.update_data(is_repeat_mode=False)
@@ -66,6 +73,7 @@ class LearningHandlers:
         await callback.answer()
 
     async def review_mode(self, callback: types.CallbackQuery, state: FSMContext):
+        await review_scheduler.flush(state, callback.from_user.id)
         await state.clear()
         
         # Сохраняем режим повторения в состоянии и инициализируем сессию
@@ -85,8 +93,9 @@ class LearningHandlers:
 
     async def restart_repeat_session(self, callback: types.CallbackQuery, state: FSMContext):
         """Перезапуск сессии повторения"""
-        # Сбрасываем список отвеченных вопросов в сессии
-        await state.update_data(repeat_session_answered_questions=[])
+        # Сбрасываем список отвеченных вопросов в сессии и колоду
+        await review_scheduler.flush(state, callback.from_user.id)
+        await state.update_data(repeat_session_answered_questions=[], **{question_decks.FIELD: None})
         
         # Показываем выбор категорий для повторения
         await callback.message.edit_text(
@@ -96,6 +105,15 @@ class LearningHandlers:
         )
         await callback.answer()
 
+    async def categories_page(self, callback: types.CallbackQuery, state: FSMContext):
+        """Соседняя страница категорий: catpage_next_<id> / catpage_prev_<id>"""
+        _, direction, cursor = callback.data.split("_")
+        # Меняется только клавиатура: текст и режим (обучение/повторение) остаются прежними
+        await callback.message.edit_reply_markup(
+            reply_markup=await get_categories_keyboard(int(cursor), direction == "prev")
+        )
+        await callback.answer()
+
     async def category_selected(self, callback: types.CallbackQuery, state: FSMContext):
         category_id = int(callback.data.split("_")[1])
         
@@ -103,33 +121,27 @@ class LearningHandlers:
         data = await state.get_data()
         is_repeat_mode = data.get('is_repeat_mode', False)
         
-        if is_repeat_mode:
-            # В режиме повторения показываем только вопросы, на которые уже отвечали, исключая уже показанные в сессии
-            answered_in_session = data.get('repeat_session_answered_questions', [])
-            question_data = await QuestionManager.get_random_question_by_category_answered_excluding(
-                callback.from_user.id, category_id, answered_in_session
-            )
-            if not question_data:
-                # Все вопросы в сессии закончились - показываем сообщение о завершении
+        # При входе в категорию колода сессии собирается заново
+        question_data = await self._pick_next_question(
+            callback.from_user.id, category_id, is_repeat_mode, state, new_deck=True
+        )
+        
+        if not question_data:
+            if is_repeat_mode:
+                # Вопросов с наступившим сроком повторения не осталось - будущие не показываем
                 await callback.message.edit_text(
-                    "🔁 <b>Режим: Повторение</b>\n\n🎉 <b>Молодец! Вы все повторили!</b>\n\nВ этой категории больше нет вопросов для повторения в текущей сессии.",
+                    "🔁 <b>Режим: Повторение</b>\n\n🎉 <b>Молодец! Сейчас повторять нечего.</b>\n\nВ этой категории нет вопросов, срок повторения которых уже наступил. Загляните позже.",
                     reply_markup=get_repeat_session_completed_keyboard(),
                     parse_mode="HTML"
                 )
-                await callback.answer()
-                return
-        else:
-            # Обычный режим - показываем неотвеченные вопросы
-            question_data = await QuestionManager.get_unseen_random_question_by_category(callback.from_user.id, category_id)
-            
-            if not question_data:
+            else:
                 await callback.message.edit_text(
                     "📚 <b>Режим: Обучение</b>\n\n📚 В этой категории пока нет вопросов.",
                     reply_markup=get_learning_keyboard(),
                     parse_mode="HTML"
                 )
-                await callback.answer()
-                return
+            await callback.answer()
+            return
         
         # Подготовим данные вопроса и состояние
         question = question_data['question']
@@ -146,13 +158,8 @@ class LearningHandlers:
         await state.update_data(
             current_question_id=question_id,
             current_category_id=category_id,
-            correct_answer_id=None,
             is_repeat_mode=is_repeat_mode
         )
-        for answer in answers:
-            if answer[2]:
-                await state.update_data(correct_answer_id=answer[0])
-                break
         
         difficulty_emoji = {"beginner": "🟢", "intermediate": "🟡", "advanced": "🔴"}.get(difficulty_level, "⚪")
         
@@ -162,7 +169,7 @@ class LearningHandlers:
         
         await callback.message.edit_text(
             text,
-            reply_markup=get_question_keyboard(answers),
+            reply_markup=get_question_keyboard(answers, callback.from_user.id, question_id, category_id, is_repeat_mode),
             parse_mode="HTML"
         )
         await callback.answer()
@@ -176,7 +183,7 @@ class LearningHandlers:
         
         question_id, question_text, difficulty_level, explanation = question
         
-        # Сохраняем данные вопроса в state для проверки ответа
+        # Режим и категория нужны "Следующему вопросу"; ответ проверяется по подписанной кнопке
         is_repeat_mode = False
         if state:
             data = await state.get_data()
@@ -192,15 +199,8 @@ class LearningHandlers:
             await state.update_data(
                 current_question_id=question_id,
                 current_category_id=category_id,
-                correct_answer_id=None,
                 is_repeat_mode=is_repeat_mode
             )
-            
-            # Находим правильный ответ
-            for answer in answers:
-                if answer[2]:  # is_correct
-                    await state.update_data(correct_answer_id=answer[0])
-                    break
         
         # Добавляем подпись режима и эмодзи сложности
         difficulty_emoji = {"beginner": "🟢", "intermediate": "🟡", "advanced": "🔴"}.get(difficulty_level, "⚪")
@@ -209,40 +209,41 @@ class LearningHandlers:
         
         await callback.message.edit_text(
             text,
-            reply_markup=get_question_keyboard(answers),
+            reply_markup=get_question_keyboard(answers, callback.from_user.id, question_id, category_id, is_repeat_mode),
             parse_mode="HTML"
         )
 
     async def answer_question(self, callback: types.CallbackQuery, state: FSMContext):
-        """Обрабатывает ответ пользователя на вопрос"""
-        token = callback.data.split("_", 1)[1]
-        if not token.isdigit():
-            await callback.answer()
-            return
-        answer_id = int(token)
-        
-        data = await state.get_data()
-        question_id = data.get('current_question_id')
-        correct_answer_id = data.get('correct_answer_id')
-        
-        if not question_id or correct_answer_id is None:
-            await callback.answer("Ошибка: данные вопроса не найдены", show_alert=True)
+        """Обрабатывает ответ пользователя на вопрос (вопрос, ответ и режим - из подписанной кнопки)"""
+        token = answer_tokens.verify(callback.from_user.id, callback.data)
+        if token is None:
+            await callback.answer("Этот вопрос устарел, откройте новый", show_alert=True)
             return
         
-        is_correct = answer_id == correct_answer_id
-        
-        # Проверяем режим
-        is_repeat_mode = data.get('is_repeat_mode', False)
-        if is_repeat_mode:
-            # В режиме повторения НЕ записываем в БД, НЕ изменяем статистику
-            pass
+        if token.is_repeat_mode:
+            # В режиме повторения статистику не изменяем - ответ только сдвигает расписание SM-2 (пачкой)
+            await review_scheduler.grade(state, callback.from_user.id, token.question_id, token.is_correct)
         else:
             # Обычный режим - записываем статистику (только при первом ответе)
-            from ..database.models import ProgressManager
-            await ProgressManager.record_answer(callback.from_user.id, question_id, answer_id, is_correct)
+            correct_answers = await ProgressManager.record_answer(
+                callback.from_user.id, token.question_id, token.answer_id, token.is_correct
+            )
+            if token.is_correct and correct_answers is not None:
+                leaderboard.record_correct(callback.from_user.id, correct_answers)
+        
+        # Пока пользователь читает результат, подбираем следующий вопрос (ответ уже записан)
+        if token.category_id:
+            question_prefetcher.schedule(
+                callback.from_user.id,
+                (token.category_id, token.is_repeat_mode),
+                lambda: self._load_next_question(callback.from_user.id, token.category_id, token.is_repeat_mode, state)
+            )
         
-        # Получаем информацию о правильном ответе
-        question_data = await QuestionManager.get_question_with_answers(question_id)
+        # Текст правильного ответа и объяснение - из кэша вопросов
+        question_data = await QuestionManager.get_question_cached(token.question_id)
+        if not question_data:
+            await callback.answer("Вопрос не найден", show_alert=True)
+            return
         correct_answer_text = None
         for answer in question_data['answers']:
             if answer[2]:  # is_correct
@@ -250,7 +251,7 @@ class LearningHandlers:
                 break
         
         # Формируем ответ
-        if is_correct:
+        if token.is_correct:
             result_text = "✅ <b>Правильно!</b>"
         else:
             result_text = f"❌ <b>Неправильно!</b>\n\nПравильный ответ: {correct_answer_text}"
@@ -262,13 +263,74 @@ class LearningHandlers:
         
         await callback.message.edit_text(
             result_text,
-            reply_markup=get_question_navigation_keyboard(question_id, data.get('current_category_id')),
+            reply_markup=get_question_navigation_keyboard(token.question_id, token.category_id),
             parse_mode="HTML"
         )
         await callback.answer()
 
+    @staticmethod
+    async def _pick_by_query(user_id: int, category_id: int, is_repeat_mode: bool, answered_in_session: list):
+        if is_repeat_mode:
+            # В режиме повторения - самый просроченный из наступивших по расписанию, кроме уже показанных в сессии
+            question_ids = await review_scheduler.queue(user_id, category_id, answered_in_session, limit=1)
+            return await QuestionManager.get_question_with_answers(question_ids[0]) if question_ids else None
+        # Обычный режим - показываем неотвеченные вопросы
+        return await QuestionManager.get_unseen_random_question_by_category(user_id, category_id)
+
+    @staticmethod
+    async def _load_from_deck(question_id: int):
+        """Вопрос из колоды через кэш; ответы перемешиваются заново при каждом показе"""
+        question_data = await QuestionManager.get_question_cached(question_id)
+        if question_data is None:
+            return None
+        answers = list(question_data['answers'])
+        random.shuffle(answers)
+        return {'question': question_data['question'], 'answers': answers}
+
+    async def _pick_next_question(self, user_id: int, category_id: int, is_repeat_mode: bool, state: FSMContext,
+                                  new_deck: bool = False):
+        """Следующий вопрос категории: из колоды сессии или, без колод, запросом выбора"""
+        if not question_decks.enabled:
+            answered_in_session = []
+            if is_repeat_mode:
+                answered_in_session = (await state.get_data()).get('repeat_session_answered_questions', [])
+            hit, question_data = await question_prefetcher.take(
+                user_id, (category_id, is_repeat_mode),
+                # Сессию повторения могли перезапустить после предзагрузки - уже показанный вопрос не берем
+                lambda prefetched: not prefetched or prefetched['question'][0] not in answered_in_session
+            )
+            if hit:
+                return question_data
+            return await self._pick_by_query(user_id, category_id, is_repeat_mode, answered_in_session)
+        
+        if new_deck:
+            await question_decks.build(state, user_id, category_id, is_repeat_mode)
+        while True:
+            question_id = await question_decks.pop(state, user_id, category_id, is_repeat_mode)
+            if question_id is None:
+                return None
+            hit, question_data = await question_prefetcher.take(
+                user_id, (category_id, is_repeat_mode),
+                lambda prefetched: prefetched is not None and prefetched['question'][0] == question_id
+            )
+            if not hit:
+                question_data = await self._load_from_deck(question_id)
+            # None - вопрос удалили в другом процессе, а версия банка здесь еще из кэша
+            if question_data is not None:
+                return question_data
+
+    async def _load_next_question(self, user_id: int, category_id: int, is_repeat_mode: bool, state: FSMContext):
+        """Загрузчик для предзагрузки: то же, что выберет next_question (колоду не изменяет)"""
+        if question_decks.enabled:
+            question_id = await question_decks.peek(state, category_id, is_repeat_mode)
+            return await self._load_from_deck(question_id) if question_id is not None else None
+        answered_in_session = []
+        if is_repeat_mode:
+            answered_in_session = (await state.get_data()).get('repeat_session_answered_questions', [])
+        return await self._pick_by_query(user_id, category_id, is_repeat_mode, answered_in_session)
+
     async def next_question(self, callback: types.CallbackQuery, state: FSMContext):
-        """Показывает следующий вопрос"""
+        """Показывает следующий вопрос (обычно уже подобранный в фоне после ответа)"""
         data = await state.get_data()
         is_repeat_mode = data.get('is_repeat_mode', False)
         category_id = data.get('current_category_id')
@@ -281,33 +343,24 @@ class LearningHandlers:
             await callback.answer()
             return
         
-        if is_repeat_mode:
-            # В режиме повторения показываем только вопросы, на которые уже отвечали, исключая уже показанные в сессии
-            answered_in_session = data.get('repeat_session_answered_questions', [])
-            question_data = await QuestionManager.get_random_question_by_category_answered_excluding(
-                callback.from_user.id, category_id, answered_in_session
-            )
-            if not question_data:
-                # Все вопросы в сессии закончились - показываем сообщение о завершении
+        question_data = await self._pick_next_question(callback.from_user.id, category_id, is_repeat_mode, state)
+        
+        if not question_data:
+            if is_repeat_mode:
+                # Вопросов с наступившим сроком повторения не осталось - будущие не показываем
                 await callback.message.edit_text(
-                    "🔁 <b>Режим: Повторение</b>\n\n🎉 <b>Молодец! Вы все повторили!</b>\n\nВ этой категории больше нет вопросов для повторения в текущей сессии.",
+                    "🔁 <b>Режим: Повторение</b>\n\n🎉 <b>Молодец! Сейчас повторять нечего.</b>\n\nВ этой категории нет вопросов, срок повторения которых уже наступил. Загляните позже.",
                     reply_markup=get_repeat_session_completed_keyboard(),
                     parse_mode="HTML"
                 )
-                await callback.answer()
-                return
-        else:
-            # Обычный режим - показываем неотвеченные вопросы
-            question_data = await QuestionManager.get_unseen_random_question_by_category(callback.from_user.id, category_id)
-            
-            if not question_data:
+            else:
                 await callback.message.edit_text(
                     "📚 <b>Режим: Обучение</b>\n\n📚 В этой категории больше нет вопросов.",
                     reply_markup=get_learning_keyboard(),
                     parse_mode="HTML"
                 )
-                await callback.answer()
-                return
+            await callback.answer()
+            return
         
         await self.show_question(callback, question_data, category_id, state)
         await callback.answer()
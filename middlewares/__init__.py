@@ -0,0 +1,7 @@
+from .admin import AdminFilterMiddleware
+from .metrics import HandlerMetricsMiddleware
+from .throttling import ThrottlingMiddleware
+from .tracing import TracingMiddleware, BotApiTracingMiddleware
+from .user_queue import UserQueueMiddleware
+
+__all__ = ["AdminFilterMiddleware", "HandlerMetricsMiddleware", "ThrottlingMiddleware", "TracingMiddleware", "BotApiTracingMiddleware", "UserQueueMiddleware"]
\ No newline at end of file
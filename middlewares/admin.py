@@ -0,0 +1,54 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from ..config.settings import settings
+from ..utils.metrics import metrics
+
+metrics.describe("bot_admin_denied_total", "Админские апдейты от пользователей не из ADMIN_IDS")
+
+# Админские команды и callback_data (кроме admin_*), появившиеся до общего префикса
+ADMIN_COMMANDS = frozenset({"admin", "metrics", "dbstats", "traces", "search"})
+ADMIN_CALLBACK_PREFIXES = (
+    "admin_", "difficulty_", "finish_question", "delete_category_", "delete_question_",
+    "edit_question_", "toggle_question_",
+)
+
+
+def is_admin_event(event: TelegramObject, raw_state: Optional[str] = None) -> bool:
+    """Апдейт админ-панели: admin_* и прочие админские кнопки, команды админа, сообщения в AdminStates"""
+    if isinstance(event, CallbackQuery):
+        data = event.data or ""
+        return data == "admin" or data.startswith(ADMIN_CALLBACK_PREFIXES)
+    if isinstance(event, Message):
+        if event.text and event.text.startswith("/"):
+            parts = event.text[1:].split(maxsplit=1)
+            if parts and parts[0].split("@")[0].lower() in ADMIN_COMMANDS:
+                return True
+        return bool(raw_state) and raw_state.startswith("AdminStates:")
+    return False
+
+
+class AdminFilterMiddleware(BaseMiddleware):
+    """Внешний middleware: единая проверка доступа к админ-панели вместо проверок в каждом хендлере.
+
+    Список админов - frozenset settings.ADMIN_IDS, читается при каждом апдейте,
+    поэтому изменения после settings.reload() (SIGHUP) действуют сразу.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not is_admin_event(event, data.get("raw_state")):
+            return await handler(event, data)
+        user = data.get("event_from_user")
+        if user is not None and settings.is_admin(user.id):
+            return await handler(event, data)
+        metrics.inc("bot_admin_denied_total")
+        if isinstance(event, CallbackQuery):
+            await event.answer("Нет доступа", show_alert=True)
+        else:
+            await event.answer("У вас нет доступа к админ-панели.")
+        return None
@@ -0,0 +1,80 @@
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from ..config.settings import settings
+from ..utils.callback_tokens import ANSWER_PREFIX
+from ..utils.logger import logger, log_context
+from ..utils.metrics import metrics
+
+# Хвостовые числовые параметры: answer_15 -> answer_, admin_qcat_3 -> admin_qcat_
+_NUMERIC_TAIL = re.compile(r"^(.*?_)-?\d+(?:_-?\d+)*$")
+
+metrics.describe("bot_handler_requests_total", "Обработанные апдейты по ключу хендлера")
+metrics.describe("bot_handler_errors_total", "Исключения в хендлерах по ключу хендлера")
+metrics.describe("bot_handler_unhandled_total", "Апдейты, для которых не нашлось хендлера")
+metrics.describe("bot_handler_latency_seconds", "Время обработки апдейта, включая фильтры")
+
+
+def handler_key(event: TelegramObject) -> str:
+    """Ключ метрик: префикс callback_data или команда/тип сообщения"""
+    if isinstance(event, CallbackQuery):
+        data = event.data or ""
+        if data.startswith(ANSWER_PREFIX):
+            # Подписанный токен кнопки ответа
+            return ANSWER_PREFIX
+        match = _NUMERIC_TAIL.match(data)
+        return match.group(1) if match else data
+    if isinstance(event, Message):
+        if event.text and event.text.startswith("/"):
+            return event.text.split()[0].split("@")[0]
+        return f"message:{event.content_type}"
+    return type(event).__name__
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware: счетчики, ошибки и гистограмма задержек по хендлерам"""
+
+    # callback_data приходит от клиента, поэтому число разных ключей ограничено
+    MAX_KEYS = 200
+
+    def __init__(self):
+        self.known_keys = set()
+
+    def _key(self, event: TelegramObject) -> str:
+        key = handler_key(event)
+        if key not in self.known_keys:
+            if len(self.known_keys) >= self.MAX_KEYS:
+                return "other"
+            self.known_keys.add(key)
+        return key
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        key = self._key(event)
+        kind = "callback" if isinstance(event, CallbackQuery) else "message"
+        user = getattr(event, "from_user", None)
+        token = log_context.set({'user_id': user.id if user else None, 'handler': key})
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except Exception:
+            metrics.inc("bot_handler_errors_total", handler=key, kind=kind)
+            logger.exception("handler failed", extra={'latency_ms': round((time.perf_counter() - started) * 1000, 1)})
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.observe("bot_handler_latency_seconds", elapsed, handler=key, kind=kind)
+            metrics.inc("bot_handler_requests_total", handler=key, kind=kind)
+            if elapsed * 1000 >= settings.LOG_SLOW_HANDLER_MS:
+                logger.warning("slow handler", extra={'latency_ms': round(elapsed * 1000, 1)})
+            log_context.reset(token)
+        if result is UNHANDLED:
+            metrics.inc("bot_handler_unhandled_total", handler=key, kind=kind)
+        return result
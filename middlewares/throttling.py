@@ -0,0 +1,126 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from ..config.settings import settings
+from ..utils.logger import logger
+from ..utils.metrics import metrics
+from .admin import is_admin_event
+
+metrics.describe("bot_throttle_allowed_total", "Апдейты, прошедшие антифлуд, по бюджету")
+metrics.describe("bot_throttle_rejected_total", "Апдейты, отброшенные антифлудом, по бюджету")
+metrics.describe("bot_throttle_bucket_usage", "Доля израсходованного запаса корзины в момент апдейта (1 - лимит)")
+metrics.describe("bot_throttle_evicted_total", "Корзины, удаленные из памяти (простой или THROTTLE_MAX_USERS)")
+metrics.describe("bot_throttle_buckets", "Корзины антифлуда в памяти")
+
+USAGE_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+KINDS = ("callback", "chat", "admin")
+
+
+def throttle_kind(event: Update, raw_state: Optional[str] = None) -> Optional[str]:
+    """Бюджет апдейта: admin - админ-панель, callback - остальные кнопки, chat - сообщения (AI-чат)"""
+    inner = event.callback_query or event.message
+    if inner is None:
+        return None
+    if is_admin_event(inner, raw_state):
+        return "admin"
+    return "callback" if event.callback_query is not None else "chat"
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Внешний middleware апдейтов: корзина токенов на пользователя и бюджет.
+
+    Корзина вмещает BURST токенов и пополняется со скоростью RATE в секунду;
+    апдейт без токена не доходит ни до очереди пользователя, ни до БД.
+    На кнопку отвечаем answerCallbackQuery (иначе у клиента "часики"),
+    на сообщения - одним предупреждением за серию. Лимиты читаются из settings
+    на каждом апдейте, поэтому меняются перезагрузкой настроек (SIGHUP).
+
+    Корзины лежат в OrderedDict в порядке последнего апдейта: корзина,
+    простоявшая дольше полного пополнения, неотличима от новой и удаляется
+    с начала словаря; сверх THROTTLE_MAX_USERS удаляются самые давние.
+    """
+
+    def __init__(self):
+        # (user_id, бюджет) -> [токены, время пополнения, предупреждение отправлено]
+        self.buckets: "OrderedDict[Tuple[int, str], List]" = OrderedDict()
+        metrics.register_collector(self._collect)
+
+    def _collect(self, registry):
+        registry.set_gauge("bot_throttle_buckets", len(self.buckets))
+
+    @staticmethod
+    def limits(kind: str) -> Tuple[float, int]:
+        name = kind.upper()
+        return getattr(settings, f"THROTTLE_{name}_RATE"), getattr(settings, f"THROTTLE_{name}_BURST")
+
+    def _evict(self, now: float):
+        # Корзина с любым бюджетом полностью пополняется не дольше idle секунд
+        idle = max((burst / rate for rate, burst in map(self.limits, KINDS) if rate > 0), default=0.0)
+        evicted = 0
+        while self.buckets:
+            bucket = next(iter(self.buckets.values()))
+            if now - bucket[1] < idle and len(self.buckets) <= settings.THROTTLE_MAX_USERS:
+                break
+            self.buckets.popitem(last=False)
+            evicted += 1
+        if evicted:
+            metrics.inc("bot_throttle_evicted_total", evicted)
+
+    def take(self, user_id: int, kind: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Списывает токен; (пропустить ли апдейт, через сколько секунд появится токен)"""
+        rate, burst = self.limits(kind)
+        if rate <= 0:
+            return True, 0.0
+        now = time.monotonic() if now is None else now
+        key = (user_id, kind)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [float(burst), now, False]
+        else:
+            bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            self.buckets.move_to_end(key)
+        self._evict(now)
+        metrics.observe("bot_throttle_bucket_usage", 1 - bucket[0] / burst, USAGE_BUCKETS, kind=kind)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            bucket[2] = False
+            return True, 0.0
+        return False, (1 - bucket[0]) / rate
+
+    async def _reject(self, event: Update, data: Dict[str, Any], kind: str, retry_after: float):
+        bucket = self.buckets.get((data["event_from_user"].id, kind))
+        try:
+            if event.callback_query is not None:
+                await data["bot"].answer_callback_query(
+                    event.callback_query.id, "Слишком часто, подождите немного"
+                )
+            elif bucket is not None and not bucket[2]:
+                bucket[2] = True
+                await data["bot"].send_message(
+                    event.message.chat.id,
+                    f"Слишком много сообщений. Подождите {math.ceil(retry_after)} с."
+                )
+        except Exception as e:
+            logger.warning("throttle reply failed: %s", e)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        kind = throttle_kind(event, data.get("raw_state")) if user is not None else None
+        if kind is None:
+            return await handler(event, data)
+        allowed, retry_after = self.take(user.id, kind)
+        if allowed:
+            metrics.inc("bot_throttle_allowed_total", kind=kind)
+            return await handler(event, data)
+        metrics.inc("bot_throttle_rejected_total", kind=kind)
+        await self._reject(event, data, kind, retry_after)
+        return None
@@ -0,0 +1,31 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import TelegramObject
+from .metrics import handler_key
+from ..utils.tracing import tracer
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Внешний middleware: отдельный трейс на каждый входящий апдейт"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not tracer.enabled:
+            return await handler(event, data)
+        user = getattr(event, "from_user", None)
+        with tracer.trace(handler_key(event), user_id=user.id if user else None):
+            return await handler(event, data)
+
+
+class BotApiTracingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии Bot API: спан tg:<Метод> на каждый запрос к Telegram"""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod) -> Response:
+        with tracer.span(f"tg:{type(method).__name__}"):
+            return await make_request(bot, method)
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from ..utils.logger import logger
+from ..utils.metrics import metrics
+
+metrics.describe("bot_user_queue_wait_seconds", "Ожидание апдейта в очереди своего пользователя")
+metrics.describe("bot_callbacks_coalesced_total", "Повторные нажатия кнопки, отброшенные до обработки")
+metrics.describe("bot_user_queues", "Пользователи с апдейтами в обработке или в очереди")
+
+
+class UserQueueMiddleware(BaseMiddleware):
+    """Внешний middleware апдейтов: апдейты одного пользователя выполняются по очереди.
+
+    Разные пользователи обрабатываются параллельно. Повторное нажатие той же кнопки
+    того же сообщения, пока предыдущее еще в очереди или в обработке, не доходит
+    до хендлера: на callback сразу отвечаем, чтобы у клиента пропали "часики".
+
+    FSMContextMiddleware aiogram читает состояние раньше, до очереди, поэтому
+    под замком raw_state перечитывается: фильтры состояний и AdminFilterMiddleware
+    видят состояние, оставленное предыдущим апдейтом пользователя.
+    """
+
+    def __init__(self):
+        # user_id -> [замок, число апдейтов в очереди и в обработке]
+        self.queues: Dict[int, List] = {}
+        self.pending_callbacks: Set[Tuple] = set()
+        metrics.register_collector(self._collect)
+
+    def _collect(self, registry):
+        registry.set_gauge("bot_user_queues", len(self.queues))
+
+    @staticmethod
+    def _callback_key(user_id: int, update: Update) -> Optional[Tuple]:
+        callback = update.callback_query
+        if callback is None:
+            return None
+        if callback.message is not None:
+            target = (callback.message.chat.id, callback.message.message_id)
+        else:
+            target = callback.inline_message_id
+        return user_id, target, callback.data
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        callback_key = self._callback_key(user.id, event)
+        if callback_key is not None:
+            if callback_key in self.pending_callbacks:
+                metrics.inc("bot_callbacks_coalesced_total")
+                try:
+                    await data["bot"].answer_callback_query(event.callback_query.id)
+                except Exception as e:
+                    logger.warning("answerCallbackQuery for coalesced callback failed: %s", e)
+                return None
+            self.pending_callbacks.add(callback_key)
+
+        queue = self.queues.get(user.id)
+        if queue is None:
+            queue = self.queues[user.id] = [asyncio.Lock(), 0]
+        queue[1] += 1
+        queued = time.perf_counter()
+        try:
+            # asyncio.Lock будит ожидающих в порядке очереди - порядок апдейтов сохраняется
+            async with queue[0]:
+                metrics.observe("bot_user_queue_wait_seconds", time.perf_counter() - queued)
+                if data.get("state") is not None:
+                    data["raw_state"] = await data["state"].get_state()
+                return await handler(event, data)
+        finally:
+            if callback_key is not None:
+                self.pending_callbacks.discard(callback_key)
+            queue[1] -= 1
+            if not queue[1]:
+                del self.queues[user.id]
@@ -1,3 +1,11 @@
 from .ai import AI_GPT
+from .archiver import AnswerArchiver
+from .decks import QuestionDecks, question_decks
+from .dedup import QuestionDeduplicator, question_dedup
+from .explanations import ExplanationGenerator
+from .exporter import AnalyticsExporter
+from .leaderboard import Leaderboard, leaderboard
+from .prefetch import QuestionPrefetcher, question_prefetcher
+from .stats_snapshot import StatsAggregator, stats_aggregator
 
-__all__ = ["AI_GPT"]
\ No newline at end of file
+__all__ = ["AI_GPT", "AnswerArchiver", "QuestionDecks", "question_decks", "QuestionDeduplicator", "question_dedup", "ExplanationGenerator", "AnalyticsExporter", "Leaderboard", "leaderboard", "QuestionPrefetcher", "question_prefetcher", "StatsAggregator", "stats_aggregator"]
\ No newline at end of file
@@ -1,59 +1,170 @@
-from openai import AsyncOpenAI
-import os
-import dotenv
-from typing import List, Dict, AsyncGenerator
-import asyncio
+import time
+from typing import List, Dict, AsyncGenerator, Iterator
+from .circuit_breaker import CircuitBreaker
 from ..config.settings import settings
+from ..utils.logger import logger
+from ..utils.tracing import tracer
+
+class AIEndpoint:
+    """Модель на конкретном эндпоинте со своим предохранителем"""
+
+    def __init__(self, name: str, api_key: str, base_url: str, model: str):
+        self.name = name
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+        self.breaker = CircuitBreaker(
+            name,
+            failure_rate_threshold=settings.AI_CB_FAILURE_RATE,
+            slow_call_seconds=settings.AI_CB_SLOW_CALL_SECONDS,
+            slow_call_rate_threshold=settings.AI_CB_SLOW_CALL_RATE,
+            window_size=settings.AI_CB_WINDOW,
+            min_calls=settings.AI_CB_MIN_CALLS,
+            open_timeout=settings.AI_CB_OPEN_SECONDS,
+        )
+        self.breaker.add_listener(self._on_state_change)
+
+    @property
+    def client(self):
+        """Клиент создается при первом запросе: импорт openai заметно замедляет старт"""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # Повторы отключены: при ошибке сразу переходим на резервный эндпоинт
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=settings.AI_TIMEOUT,
+                max_retries=0
+            )
+        return self._client
+
+    @staticmethod
+    def _on_state_change(name: str, old_state: str, new_state: str):
+        logger.warning("AI circuit '%s': %s -> %s", name, old_state, new_state)
 
-dotenv.load_dotenv()
 
 class AI_GPT:
+    # Ответ пользователю, когда ни один эндпоинт недоступен
+    UNAVAILABLE_TEXT = "⚠️ Консультант сейчас недоступен. Попробуйте, пожалуйста, позже."
+
     def __init__(self):
-        self.client = AsyncOpenAI(
-            api_key=settings.DEEP_KEY,
-            base_url='https://bothub.chat/api/v2/openai/v1'
-        )
+        self.endpoints = [
+            AIEndpoint("primary", settings.DEEP_KEY, settings.AI_BASE_URL, settings.AI_MODEL)
+        ]
+        if settings.AI_FALLBACK_MODEL or settings.AI_FALLBACK_BASE_URL:
+            self.endpoints.append(AIEndpoint(
+                "fallback",
+                settings.AI_FALLBACK_KEY or settings.DEEP_KEY,
+                settings.AI_FALLBACK_BASE_URL or settings.AI_BASE_URL,
+                settings.AI_FALLBACK_MODEL or settings.AI_MODEL,
+            ))
         self.system_prompt = (
             "Ты консультант по русскому языку. Не пиши сочинения, только отвечай на вопросы по ЕГЭ и ОГЭ по русскому языку."
         )
 
+    def _allowed_endpoints(self) -> Iterator[AIEndpoint]:
+        """Эндпоинты по приоритету, чей предохранитель пропускает запрос.
+
+        Проверка ленивая: слот пробного запроса резервного эндпоинта занимается,
+        только если до него действительно дошла очередь.
+        """
+        for endpoint in self.endpoints:
+            if endpoint.breaker.allow_request():
+                yield endpoint
+
+    def is_available(self) -> bool:
+        """False, если все предохранители открыты или заняты пробным запросом - запрос можно не начинать"""
+        return any(endpoint.breaker.is_available() for endpoint in self.endpoints)
+
+    def stats(self) -> List[Dict]:
+        """Состояние и счетчики предохранителей по эндпоинтам"""
+        return [endpoint.breaker.stats() for endpoint in self.endpoints]
+
+    @staticmethod
+    def _trace_segment(name: str, start: float, endpoint: AIEndpoint, **attrs) -> float:
+        end = time.perf_counter()
+        tracer.add_span(name, start, end, endpoint=endpoint.name, **attrs)
+        return end
+
     async def ask_gpt_stream(self, messages: List[Dict]) -> AsyncGenerator[str, None]:
         """
-        Потоковый запрос к GPT
+        Потоковый запрос к GPT.
+        Задержка считается до первого фрагмента; до него при ошибке переходим
+        на резервный эндпоинт. Если ответа нет, генератор ничего не отдает.
         """
         full_messages = [{"role": "system", "content": self.system_prompt}] + messages
-        
-        try:
-            stream = await self.client.chat.completions.create(
-                model="gpt-4.1-nano",
-                messages=full_messages,
-                temperature=0.7,
-                stream=True,
-                max_tokens=500
-            )
-            
-            async for chunk in stream:
-                content = chunk.choices[0].delta.content
-                if content:
-                    yield content
-                    
-        except Exception as e:
-            yield f""
+
+        for endpoint in self._allowed_endpoints():
+            started = time.monotonic()
+            # Спаны трассировки - последовательные отрезки request -> first_chunk -> complete
+            # с явными границами: между yield выполняется код хендлера
+            mark = time.perf_counter()
+            recorded = False
+            try:
+                stream = await endpoint.client.chat.completions.create(
+                    model=endpoint.model,
+                    messages=full_messages,
+                    temperature=0.7,
+                    stream=True,
+                    max_tokens=500
+                )
+                mark = self._trace_segment("ai:request", mark, endpoint)
+
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        if not recorded:
+                            endpoint.breaker.record_success(time.monotonic() - started)
+                            mark = self._trace_segment("ai:first_chunk", mark, endpoint)
+                            recorded = True
+                        yield content
+
+                if recorded:
+                    self._trace_segment("ai:complete", mark, endpoint)
+                    return
+                logger.warning("AI endpoint '%s' returned empty stream", endpoint.name)
+
+            except Exception as e:
+                self._trace_segment("ai:complete", mark, endpoint, error=type(e).__name__)
+                if recorded:
+                    # Часть ответа уже отдана пользователю - переключаться поздно
+                    logger.warning("AI stream from '%s' interrupted: %s", endpoint.name, e)
+                    return
+                logger.warning("AI endpoint '%s' failed: %s", endpoint.name, e)
+            finally:
+                if not recorded:
+                    endpoint.breaker.record_failure(time.monotonic() - started)
 
     async def ask_gpt(self, messages: List[Dict]) -> str:
         """
-        Обычный (не потоковый) запрос к GPT
+        Обычный (не потоковый) запрос к GPT.
+        При ошибке пробует резервный эндпоинт, если ответа нет - пустая строка.
         """
         full_messages = [{"role": "system", "content": self.system_prompt}] + messages
-        
-        try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4.1-nano",
-                messages=full_messages,
-                temperature=0.7,
-                stream=False  # Важно: stream=False для обычного ответа
-            )
-            bot_reply = response.choices[0].message.content
-            return bot_reply
-        except Exception as e:
-            return f""
\ No newline at end of file
+
+        for endpoint in self._allowed_endpoints():
+            started = time.monotonic()
+            recorded = False
+            try:
+                with tracer.span("ai:complete", endpoint=endpoint.name):
+                    response = await endpoint.client.chat.completions.create(
+                        model=endpoint.model,
+                        messages=full_messages,
+                        temperature=0.7,
+                        stream=False  # Важно: stream=False для обычного ответа
+                    )
+                bot_reply = response.choices[0].message.content
+                if bot_reply:
+                    endpoint.breaker.record_success(time.monotonic() - started)
+                    recorded = True
+                    return bot_reply
+            except Exception as e:
+                logger.warning("AI endpoint '%s' failed: %s", endpoint.name, e)
+            finally:
+                # И при отмене (CancelledError): иначе пробный слот HALF_OPEN не освободится
+                if not recorded:
+                    endpoint.breaker.record_failure(time.monotonic() - started)
+        return ""
@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import time
+from typing import Dict
+from ..config.settings import settings
+from ..database.models import create_all_tables, ArchiveManager
+from ..utils.logger import logger, setup_logging
+from ..utils.metrics import metrics
+
+metrics.describe("bot_archived_answers_total", "Ответы, перенесенные из user_answers в архив")
+
+
+class AnswerArchiver:
+    """Фоновый перенос ответов старше горизонта из user_answers в архивную БД.
+
+    Каждая порция - отдельная короткая транзакция (копия в archive.user_answers и
+    удаление из горячей таблицы), между порциями делается пауза, чтобы не держать
+    блокировку записи SQLite. Статистика и проверки "отвечал/отвечал верно" читают
+    answer_rollups, поэтому перенос их не меняет.
+    """
+
+    def __init__(self, horizon_days: int, chunk_size: int = 5000, pause: float = 0.05):
+        self.horizon_days = horizon_days
+        self.chunk_size = chunk_size
+        self.pause = pause
+
+    async def run_once(self) -> Dict:
+        report = {'archived': 0, 'chunks': 0}
+        started = time.monotonic()
+        while True:
+            moved = await ArchiveManager.archive_chunk(self.horizon_days, self.chunk_size)
+            if not moved:
+                break
+            report['archived'] += moved
+            report['chunks'] += 1
+            metrics.inc("bot_archived_answers_total", moved)
+            await asyncio.sleep(self.pause)
+        report['elapsed'] = round(time.monotonic() - started, 2)
+        if report['archived']:
+            logger.info("archiver: moved %s answers in %s chunks", report['archived'], report['chunks'])
+        return report
+
+    async def run_forever(self, interval: float):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("archiver pass failed")
+            await asyncio.sleep(interval)
+
+
+def start_background_archiver():
+    """Запускает периодический проход, если задан ARCHIVE_INTERVAL"""
+    if settings.ARCHIVE_INTERVAL <= 0:
+        return None
+    archiver = AnswerArchiver(settings.ARCHIVE_HORIZON_DAYS, settings.ARCHIVE_CHUNK_SIZE)
+    return asyncio.create_task(archiver.run_forever(settings.ARCHIVE_INTERVAL))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Перенос старых ответов из user_answers в архив")
+    parser.add_argument("--horizon-days", type=int, default=settings.ARCHIVE_HORIZON_DAYS)
+    parser.add_argument("--chunk-size", type=int, default=settings.ARCHIVE_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="только показать, сколько строк будет перенесено")
+    args = parser.parse_args()
+    setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+
+    await create_all_tables()
+    stats = await ArchiveManager.get_archive_stats(args.horizon_days)
+    print(
+        f"user_answers: {stats['hot']} (старше {args.horizon_days} дн.: {stats['pending']}), "
+        f"в архиве: {stats['archived']}, итогов answer_rollups: {stats['rollups']}"
+    )
+    if args.dry_run:
+        return
+    report = await AnswerArchiver(args.horizon_days, args.chunk_size).run_once()
+    print(f"Готово за {report['elapsed']} c: перенесено {report['archived']} порциями по {args.chunk_size} ({report['chunks']})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+
+class CircuitBreaker:
+    """Предохранитель для внешнего сервиса.
+
+    CLOSED - запросы идут, результаты копятся в скользящем окне. Если доля ошибок
+    или медленных вызовов превышает порог, переходим в OPEN.
+    OPEN - запросы сразу отклоняются (fast-fail) в течение open_timeout секунд.
+    HALF_OPEN - пропускаем ограниченное число пробных запросов: успех закрывает
+    предохранитель, ошибка снова открывает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 15.0,
+        slow_call_rate_threshold: float = 0.5,
+        window_size: int = 20,
+        min_calls: int = 5,
+        open_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.min_calls = min_calls
+        self.open_timeout = open_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+
+        self._state = self.CLOSED
+        self._window = deque(maxlen=window_size)  # (failed, slow)
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._listeners: List[Callable[[str, str, str], None]] = []
+
+        # Метрики
+        self.transitions: Dict[str, int] = {}
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.open_timeout:
+            self._transition(self.HALF_OPEN)
+        return self._state
+
+    def add_listener(self, listener: Callable[[str, str, str], None]):
+        """listener(name, old_state, new_state) вызывается при смене состояния"""
+        self._listeners.append(listener)
+
+    def is_available(self) -> bool:
+        """Пропустит ли allow_request запрос сейчас (без резервирования слота)"""
+        state = self.state
+        if state == self.HALF_OPEN:
+            return self._half_open_in_flight < self.half_open_max_calls
+        return state == self.CLOSED
+
+    def allow_request(self) -> bool:
+        """Можно ли сейчас выполнить запрос. В HALF_OPEN резервирует пробный слот"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+            self._half_open_in_flight += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self, duration: float):
+        slow = duration >= self.slow_call_seconds
+        self._record(False, slow)
+
+    def record_failure(self, duration: float = 0.0):
+        self._record(True, duration >= self.slow_call_seconds)
+
+    def _record(self, failed: bool, slow: bool):
+        self.calls += 1
+        self.failures += failed
+        self.slow_calls += slow
+
+        if self._state == self.HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+            if failed or slow:
+                self._transition(self.OPEN)
+            else:
+                self._transition(self.CLOSED)
+            return
+
+        self._window.append((failed, slow))
+        if self._state == self.CLOSED and len(self._window) >= self.min_calls:
+            total = len(self._window)
+            failure_rate = sum(f for f, _ in self._window) / total
+            slow_rate = sum(s for _, s in self._window) / total
+            if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                self._transition(self.OPEN)
+
+    def _transition(self, new_state: str):
+        old_state = self._state
+        if old_state == new_state:
+            return
+        self._state = new_state
+        if new_state == self.OPEN:
+            self._opened_at = self.clock()
+        if new_state in (self.OPEN, self.CLOSED):
+            self._half_open_in_flight = 0
+        if new_state == self.CLOSED:
+            self._window.clear()
+        key = f"{old_state}->{new_state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        for listener in self._listeners:
+            listener(self.name, old_state, new_state)
+
+    def stats(self) -> Dict:
+        return {
+            'name': self.name,
+            'state': self.state,
+            'calls': self.calls,
+            'failures': self.failures,
+            'slow_calls': self.slow_calls,
+            'rejected': self.rejected,
+            'transitions': dict(self.transitions),
+        }
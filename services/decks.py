@@ -0,0 +1,98 @@
+import base64
+import random
+import struct
+from typing import Iterable, List, Optional, Tuple
+from aiogram.fsm.context import FSMContext
+from ..config.settings import settings
+from ..database.models import CategoryManager, QuestionManager
+from .review import review_scheduler
+from ..utils.metrics import metrics
+
+metrics.describe("bot_deck_builds_total", "Сборка колоды вопросов сессии по причине: new, version, refill")
+
+_ID = struct.Struct(">I")
+
+
+def pack_ids(question_ids: Iterable[int]) -> str:
+    """ID вопросов -> base64 по 4 байта на вопрос (компактно для FSM-хранилища)"""
+    ids = list(question_ids)
+    return base64.b64encode(struct.pack(f">{len(ids)}I", *ids)).decode("ascii")
+
+
+def unpack_ids(packed: str) -> List[int]:
+    raw = base64.b64decode(packed)
+    return list(struct.unpack(f">{len(raw) // _ID.size}I", raw))
+
+
+class QuestionDecks:
+    """Колода сессии: перемешанные ID подходящих вопросов в данных FSM.
+
+    Колода собирается одним запросом при входе в категорию, дальше следующий
+    вопрос снимается с ее конца без запросов выбора. В данных хранится
+    [категория, режим повторения, версия банка, ID в base64]; если админ
+    изменил вопросы категории, версия не совпадет и колода соберется заново.
+    Опустевшая колода добирается: в обучении - вопросами, на которые еще нет
+    правильного ответа, в повторении - следующей пачкой из расписания SM-2.
+    """
+
+    FIELD = "deck"
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+
+    async def build(self, state: FSMContext, user_id: int, category_id: int, is_repeat_mode: bool,
+                    reason: str = "new") -> Tuple[int, List[int]]:
+        # Версию читаем до вопросов: правка между запросами лишь вызовет еще одну пересборку
+        version = await CategoryManager.get_bank_version(category_id)
+        if is_repeat_mode:
+            # Конец пачки повторения: сначала пересчитываем расписание, потом берем следующие по due_at
+            await review_scheduler.flush(state, user_id)
+            shown = (await state.get_data()).get('repeat_session_answered_questions', [])
+            question_ids = await review_scheduler.queue(user_id, category_id, shown)
+            # Снимаем с конца - первым пойдет самый просроченный
+            question_ids.reverse()
+        else:
+            question_ids = await QuestionManager.get_deck_question_ids(user_id, category_id)
+            random.shuffle(question_ids)
+        await self._save(state, category_id, is_repeat_mode, version, question_ids)
+        metrics.inc("bot_deck_builds_total", reason=reason)
+        return version, question_ids
+
+    async def _save(self, state: FSMContext, category_id: int, is_repeat_mode: bool, version: int,
+                    question_ids: List[int]):
+        await state.update_data(**{self.FIELD: [category_id, int(is_repeat_mode), version, pack_ids(question_ids)]})
+
+    async def _current(self, state: FSMContext, category_id: int, is_repeat_mode: bool) -> Optional[List]:
+        """Колода из FSM, если она для этой категории и режима"""
+        deck = (await state.get_data()).get(self.FIELD)
+        if deck and deck[0] == category_id and bool(deck[1]) == is_repeat_mode:
+            return deck
+        return None
+
+    async def peek(self, state: FSMContext, category_id: int, is_repeat_mode: bool) -> Optional[int]:
+        """Следующий ID без снятия с колоды (для предзагрузки)"""
+        deck = await self._current(state, category_id, is_repeat_mode)
+        if deck is None:
+            return None
+        question_ids = unpack_ids(deck[3])
+        return question_ids[-1] if question_ids else None
+
+    async def pop(self, state: FSMContext, user_id: int, category_id: int, is_repeat_mode: bool) -> Optional[int]:
+        """Снимает следующий ID; None - подходящих вопросов больше нет"""
+        deck = await self._current(state, category_id, is_repeat_mode)
+        if deck is None:
+            version, question_ids = await self.build(state, user_id, category_id, is_repeat_mode)
+        elif deck[2] != await CategoryManager.get_bank_version(category_id):
+            version, question_ids = await self.build(state, user_id, category_id, is_repeat_mode, reason="version")
+        else:
+            version, question_ids = deck[2], unpack_ids(deck[3])
+            if not question_ids:
+                version, question_ids = await self.build(state, user_id, category_id, is_repeat_mode, reason="refill")
+        if not question_ids:
+            return None
+        question_id = question_ids.pop()
+        await self._save(state, category_id, is_repeat_mode, version, question_ids)
+        return question_id
+
+
+question_decks = QuestionDecks(settings.DECK_MODE)
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+from ..config.settings import settings
+from ..database.models import create_all_tables, QuestionManager
+from ..utils import minhash
+from ..utils.logger import logger, setup_logging
+from ..utils.metrics import metrics
+
+metrics.describe("bot_dedup_check_seconds", "Длительность проверки нового вопроса на почти-дубликаты")
+
+
+class QuestionDeduplicator:
+    """Поиск почти-дубликатов вопросов внутри категории по MinHash-сигнатурам.
+
+    Сигнатуры хранятся в question_signatures (их пишет QuestionManager при
+    добавлении и правке вопроса), здесь они лежат в LSH-индексе в памяти:
+    проверка нового текста - одна сигнатура и несколько поисков по словарю.
+    Индекс загружается при первой проверке и перечитывается раз в
+    DEDUP_RELOAD_INTERVAL, чтобы подхватить вопросы из других процессов.
+    """
+
+    def __init__(self, threshold: float = 0.8, reload_interval: float = 300):
+        self.threshold = threshold
+        self.reload_interval = reload_interval
+        self.index = minhash.LSHIndex()
+        self._loaded_at: Optional[float] = None
+        self._load_task: Optional[asyncio.Task] = None
+
+    async def ensure_loaded(self):
+        """Загружает индекс, если его нет или он старше reload_interval (одна загрузка на всех ожидающих)"""
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.reload_interval:
+            return
+        if self._load_task is None or self._load_task.done():
+            self._load_task = asyncio.create_task(self.rebuild())
+        await asyncio.shield(self._load_task)
+
+    async def rebuild(self):
+        started = time.monotonic()
+        index = minhash.LSHIndex()
+        for question_id, category_id, signature in await QuestionManager.get_question_signatures():
+            index.add(question_id, category_id, minhash.decode(signature))
+        self.index = index
+        self._loaded_at = time.monotonic()
+        logger.info("dedup index loaded in %.2f s: %s questions", self._loaded_at - started, len(index))
+
+    async def find_similar(self, category_id: int, text: str,
+                           exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Похожие вопросы категории: [(question_id, сходство)], самые похожие первыми"""
+        await self.ensure_loaded()
+        started = time.perf_counter()
+        found = self.index.query(category_id, minhash.signature(text), self.threshold,
+                                 () if exclude_id is None else (exclude_id,))
+        metrics.observe("bot_dedup_check_seconds", time.perf_counter() - started)
+        return found
+
+    def remember(self, question_id: int, category_id: int, text: str):
+        """Учитывает добавленный или измененный вопрос, не дожидаясь перезагрузки"""
+        self.index.add(question_id, category_id, minhash.signature(text))
+
+    async def report(self, category_id: Optional[int] = None) -> Dict[int, List[List[int]]]:
+        """Группы почти-дубликатов по всему банку: {category_id: [[question_id, ...], ...]}"""
+        await self.rebuild()
+        report = {}
+        for group, keys in self.index.groups().items():
+            if category_id is not None and group != category_id:
+                continue
+            # Объединение пар похожих вопросов в группы (система непересекающихся множеств)
+            parent = {key: key for key in keys}
+
+            def find(key):
+                while parent[key] != key:
+                    parent[key] = parent[parent[key]]
+                    key = parent[key]
+                return key
+
+            for key in keys:
+                for other, _ in self.index.query(group, self.index.signature_of(key), self.threshold, (key,)):
+                    parent[find(other)] = find(key)
+            clusters: Dict[int, List[int]] = {}
+            for key in keys:
+                clusters.setdefault(find(key), []).append(key)
+            duplicates = sorted(sorted(cluster) for cluster in clusters.values() if len(cluster) > 1)
+            if duplicates:
+                report[group] = duplicates
+        return report
+
+
+question_dedup = QuestionDeduplicator(settings.DEDUP_THRESHOLD, settings.DEDUP_RELOAD_INTERVAL)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Отчет о почти-дубликатах вопросов в банке")
+    parser.add_argument("--category", type=int, help="только эта категория")
+    parser.add_argument("--threshold", type=float, default=settings.DEDUP_THRESHOLD,
+                        help="минимальное сходство (оценка Жаккара по 4-граммам символов)")
+    args = parser.parse_args()
+    setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+
+    await create_all_tables()
+    deduplicator = QuestionDeduplicator(args.threshold)
+    started = time.monotonic()
+    report = await deduplicator.report(args.category)
+    texts = await QuestionManager.get_question_texts(
+        [question_id for clusters in report.values() for cluster in clusters for question_id in cluster]
+    )
+    for category_id, clusters in sorted(report.items()):
+        print(f"Категория {category_id}: групп {len(clusters)}")
+        for cluster in clusters:
+            print(f"  {len(cluster)} вопросов:")
+            for question_id in cluster:
+                print(f"    #{question_id}: {texts.get(question_id, '')[:100]}")
+    groups = sum(len(clusters) for clusters in report.values())
+    extra = sum(len(cluster) - 1 for clusters in report.values() for cluster in clusters)
+    print(f"Готово за {time.monotonic() - started:.2f} c: {len(deduplicator.index)} вопросов, "
+          f"групп дубликатов {groups}, лишних вопросов {extra}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,182 @@
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+from .ai import AI_GPT
+from ..config.settings import settings
+from ..database.models import create_all_tables, QuestionManager, JobManager
+from ..utils.logger import logger, setup_logging
+
+
+class ExplanationGenerator:
+    """Фоновая генерация объяснений для вопросов, у которых explanation = NULL.
+
+    Вопросы обходятся по возрастанию id порциями. Каждая порция отправляется в AI
+    с ограниченной параллельностью, результаты записываются одной транзакцией
+    вместе с чекпоинтом, поэтому прерванный запуск продолжается с места остановки.
+    Вопрос, для которого AI не вернул ответ, запрашивается повторно; попытки
+    копятся в job_failures и между запусками, после max_attempts вопрос
+    пропускается (report['failed']), и чекпоинт переходит через него. Запуск
+    останавливается, только если AI недоступен (открыты предохранители):
+    тогда чекпоинт остается перед вопросом без ответа, а попытка не засчитывается.
+    """
+
+    JOB_NAME = "explanations"
+
+    def __init__(self, gpt: Optional[AI_GPT] = None, concurrency: int = 4, batch_size: int = 20,
+                 max_attempts: int = 3):
+        self.gpt = gpt or AI_GPT()
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    @staticmethod
+    def build_prompt(item: Dict) -> List[Dict]:
+        """Сообщения для AI по вопросу и вариантам ответов"""
+        question_id, question_text, difficulty_level = item['question']
+        lines = [f"Вопрос: {question_text}", "Варианты ответов:"]
+        for answer_text, is_correct in item['answers']:
+            mark = " (правильный)" if is_correct else ""
+            lines.append(f"- {answer_text}{mark}")
+        lines.append(
+            "Кратко (2-4 предложения) объясни, почему правильный ответ верный. "
+            "Сошлись на правило русского языка. Не повторяй вопрос."
+        )
+        return [{"role": "user", "content": "\n".join(lines)}]
+
+    async def _explain(self, item: Dict) -> Optional[str]:
+        async with self.semaphore:
+            explanation = await self.gpt.ask_gpt(self.build_prompt(item))
+        explanation = (explanation or "").strip()
+        return explanation or None
+
+    async def dry_run(self, resume: bool = True, limit: Optional[int] = None) -> Dict:
+        """Отчет о том, что будет обработано, без запросов к AI и записи в БД"""
+        after_id = await JobManager.get_checkpoint(self.JOB_NAME) if resume else 0
+        pending = await QuestionManager.count_questions_without_explanation(after_id)
+        without_answers = 0
+        sample = []
+        cursor = after_id
+        scanned = 0
+        while limit is None or scanned < limit:
+            batch = await QuestionManager.get_questions_without_explanation(cursor, self.batch_size)
+            if not batch:
+                break
+            for item in batch:
+                if not item['answers']:
+                    without_answers += 1
+                if len(sample) < 10:
+                    sample.append((item['question'][0], item['question'][1][:60]))
+            scanned += len(batch)
+            cursor = batch[-1]['question'][0]
+        return {
+            'checkpoint': after_id,
+            'pending': pending if limit is None else min(pending, limit),
+            'without_answers': without_answers,
+            'sample': sample,
+        }
+
+    async def run(self, resume: bool = True, limit: Optional[int] = None) -> Dict:
+        """Сгенерировать и записать объяснения. Возвращает отчет о запуске"""
+        if not resume:
+            await JobManager.reset_checkpoint(self.JOB_NAME)
+        after_id = await JobManager.get_checkpoint(self.JOB_NAME)
+        report = {'checkpoint': after_id, 'processed': 0, 'generated': 0, 'failed': 0, 'skipped': 0, 'aborted': None}
+        started = time.monotonic()
+
+        while limit is None or report['processed'] < limit:
+            # Открытый предохранитель отклоняет запросы сразу - вся порция ушла бы в ошибки
+            if not self.gpt.is_available():
+                report['aborted'] = "AI недоступен"
+                break
+            size = self.batch_size if limit is None else min(self.batch_size, limit - report['processed'])
+            batch = await QuestionManager.get_questions_without_explanation(after_id, size)
+            if not batch:
+                break
+
+            # Вопросы без вариантов ответа объяснять не по чему
+            to_explain = [item for item in batch if item['answers']]
+            report['skipped'] += len(batch) - len(to_explain)
+
+            explanations = []
+            pending = to_explain
+            while pending:
+                results = await asyncio.gather(*(self._explain(item) for item in pending))
+                failed = []
+                for item, explanation in zip(pending, results):
+                    if explanation:
+                        explanations.append((item['question'][0], explanation))
+                    else:
+                        failed.append(item)
+                # Предохранитель открылся - ответа нет не из-за вопроса, попытку не засчитываем
+                if failed and not self.gpt.is_available():
+                    pending = failed
+                    break
+                failed_ids = [item['question'][0] for item in failed]
+                attempts = await JobManager.record_failures(self.JOB_NAME, failed_ids)
+                given_up = [question_id for question_id in failed_ids if attempts[question_id] >= self.max_attempts]
+                if given_up:
+                    report['failed'] += len(given_up)
+                    logger.warning("explanations: giving up after %s attempts: ids %s", self.max_attempts, given_up)
+                pending = [item for item in failed if attempts[item['question'][0]] < self.max_attempts]
+            retry_ids = {item['question'][0] for item in pending}
+
+            # Чекпоинт - до первого вопроса, который еще будет запрошен; объяснения
+            # после него сохраняются, и повторный запуск их не выберет (explanation уже не NULL)
+            for item in batch:
+                if item['question'][0] in retry_ids:
+                    break
+                after_id = item['question'][0]
+            await QuestionManager.save_explanations(explanations, job=self.JOB_NAME, last_id=after_id)
+            report['processed'] += len(batch) - len(retry_ids)
+            report['generated'] += len(explanations)
+            logger.info(
+                "explanations: checkpoint id=%s, generated %s/%s",
+                after_id, len(explanations), len(batch)
+            )
+            if retry_ids:
+                report['aborted'] = "AI недоступен"
+                break
+
+        report['checkpoint'] = after_id
+        if report['aborted']:
+            logger.warning("explanations: stopped at id=%s: %s", after_id, report['aborted'])
+        report['elapsed'] = round(time.monotonic() - started, 2)
+        return report
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Генерация объяснений для вопросов без explanation")
+    parser.add_argument("--dry-run", action="store_true", help="только отчет, без запросов к AI")
+    parser.add_argument("--restart", action="store_true", help="игнорировать чекпоинт и начать сначала")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=None, help="максимум вопросов за запуск")
+    parser.add_argument("--max-attempts", type=int, default=3, help="попыток на вопрос, после - пропуск")
+    args = parser.parse_args()
+    setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+
+    await create_all_tables()
+    generator = ExplanationGenerator(
+        concurrency=args.concurrency, batch_size=args.batch_size, max_attempts=args.max_attempts
+    )
+    if args.dry_run:
+        report = await generator.dry_run(resume=not args.restart, limit=args.limit)
+        print(f"Чекпоинт: id > {report['checkpoint']}")
+        print(f"Будет обработано вопросов: {report['pending']}")
+        print(f"Без вариантов ответа (будут пропущены): {report['without_answers']}")
+        for question_id, text in report['sample']:
+            print(f"  #{question_id}: {text}")
+    else:
+        report = await generator.run(resume=not args.restart, limit=args.limit)
+        print(
+            f"Готово за {report['elapsed']} c: обработано {report['processed']}, "
+            f"сгенерировано {report['generated']}, без ответа AI {report['failed']}, "
+            f"пропущено {report['skipped']}, чекпоинт id={report['checkpoint']}"
+        )
+        if report['aborted']:
+            print(f"Остановлено: {report['aborted']}. Повторите запуск позже - он продолжит с чекпоинта")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from ..config.settings import settings
+from ..database.models import LeaderboardManager
+from ..utils.logger import logger
+from ..utils.metrics import metrics
+from ..utils.rank_index import RankIndex
+
+metrics.describe("bot_leaderboard_rebuild_seconds", "Длительность загрузки рейтинга из БД")
+
+
+def current_week(now: Optional[float] = None) -> int:
+    """Неделя ISO (UTC) как год * 100 + номер недели"""
+    year, week, _ = datetime.fromtimestamp(time.time() if now is None else now, timezone.utc).isocalendar()
+    return year * 100 + week
+
+
+class Leaderboard:
+    """Рейтинги по правильным ответам за все время и за текущую неделю.
+
+    Оба рейтинга живут в памяти (RankIndex): место пользователя и топ считаются
+    за O(log n) без запросов к БД. Рейтинг за все время строится из users и
+    обновляется абсолютным счетом, который возвращает record_answer. Недельные
+    очки копятся в памяти и раз в LEADERBOARD_FLUSH_INTERVAL сохраняются в
+    leaderboard_weeks; при сбое теряется не больше одного интервала.
+
+    В cluster.py у каждого воркера свой экземпляр и живые обновления только
+    его пользователей, остальные подтягиваются перезагрузкой раз в
+    LEADERBOARD_REBUILD_INTERVAL.
+    """
+
+    def __init__(self, top_size: int = 10):
+        self.top_size = top_size
+        self.week = current_week()
+        self.all_time = RankIndex()
+        self.weekly = RankIndex()
+        # Недельные счета, еще не сохраненные в БД: (week, user_id) -> счет
+        self._dirty: Dict[Tuple[int, int], int] = {}
+        # Обновления до первой загрузки и во время перезагрузки (применяются поверх данных БД)
+        self._replay: Optional[List[Tuple[int, int]]] = []
+        self._loaded = False
+        self._load_task: Optional[asyncio.Task] = None
+
+    def record_correct(self, user_id: int, correct_answers: int):
+        """Правильный ответ засчитан; correct_answers - новый счет пользователя за все время"""
+        if self._replay is not None:
+            self._replay.append((user_id, correct_answers))
+        if self._loaded:
+            self._apply(user_id, correct_answers)
+
+    def _apply(self, user_id: int, correct_answers: int):
+        self._roll_week()
+        self.all_time.set(user_id, correct_answers)
+        self._dirty[(self.week, user_id)] = self.weekly.add(user_id)
+
+    def _roll_week(self):
+        week = current_week()
+        if week != self.week:
+            # Несохраненные очки прошлой недели остаются в _dirty со своим номером недели
+            self.week = week
+            self.weekly = RankIndex()
+
+    async def ensure_loaded(self):
+        """Загружает рейтинги при первом обращении (одна загрузка на все ожидающие хендлеры)"""
+        if self._loaded:
+            return
+        if self._load_task is None or self._load_task.done():
+            self._load_task = asyncio.create_task(self.rebuild())
+        await asyncio.shield(self._load_task)
+
+    async def rebuild(self):
+        """Перечитывает рейтинги из БД; обновления во время чтения не теряются"""
+        started = time.monotonic()
+        # Сохраненные недельные счета - на момент flush, все обновления с его начала повторяем
+        replay = self._replay = self._replay if self._replay is not None else []
+        try:
+            await self.flush()
+            week = current_week()
+            all_time = RankIndex.build(await LeaderboardManager.get_all_time_scores())
+            weekly = RankIndex.build(await LeaderboardManager.get_weekly_scores(week))
+        except Exception:
+            if self._loaded:
+                self._replay = None
+            raise
+        self._replay = None
+        self.week, self.all_time, self.weekly = week, all_time, weekly
+        for user_id, correct_answers in replay:
+            self._apply(user_id, correct_answers)
+        self._loaded = True
+        elapsed = time.monotonic() - started
+        metrics.observe("bot_leaderboard_rebuild_seconds", elapsed)
+        logger.info("leaderboard loaded in %.2f s: %s users all-time, %s this week",
+                    elapsed, len(all_time), len(weekly))
+
+    async def flush(self):
+        """Сохраняет изменившиеся недельные счета"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            await LeaderboardManager.save_weekly_scores([(week, user_id, score) for (week, user_id), score in dirty.items()])
+        except Exception:
+            # Вернем в очередь, не затирая более свежие значения
+            for key, score in dirty.items():
+                self._dirty.setdefault(key, score)
+            raise
+
+    def _index(self, weekly: bool) -> RankIndex:
+        if weekly:
+            self._roll_week()
+            return self.weekly
+        return self.all_time
+
+    async def get_top(self, weekly: bool = False) -> List[Tuple[int, str, int]]:
+        """Топ рейтинга: (место, имя, счет)"""
+        await self.ensure_loaded()
+        top = self._index(weekly).top(self.top_size)
+        names = await LeaderboardManager.get_user_names([user_id for _, user_id, _ in top])
+        return [(rank, names.get(user_id, str(user_id)), score) for rank, user_id, score in top]
+
+    async def get_rank(self, user_id: int, weekly: bool = False) -> Tuple[Optional[int], int, int]:
+        """(место или None, счет, участников рейтинга)"""
+        await self.ensure_loaded()
+        index = self._index(weekly)
+        return index.rank(user_id), index.score(user_id), len(index)
+
+    async def run_forever(self, flush_interval: float, rebuild_interval: float):
+        last_rebuild = time.monotonic()
+        while True:
+            try:
+                if not self._loaded:
+                    await self.ensure_loaded()
+                    last_rebuild = time.monotonic()
+                elif rebuild_interval > 0 and time.monotonic() - last_rebuild >= rebuild_interval:
+                    await self.rebuild()
+                    last_rebuild = time.monotonic()
+                else:
+                    await self.flush()
+            except Exception:
+                logger.exception("leaderboard update failed")
+            await asyncio.sleep(flush_interval)
+
+
+leaderboard = Leaderboard(settings.LEADERBOARD_TOP)
+
+
+def start_background_leaderboard() -> asyncio.Task:
+    """Загружает рейтинг при старте и периодически сохраняет недельные очки"""
+    return asyncio.create_task(
+        leaderboard.run_forever(settings.LEADERBOARD_FLUSH_INTERVAL, settings.LEADERBOARD_REBUILD_INTERVAL)
+    )
@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+from ..config.settings import settings
+from ..database.cache import TTLCache
+from ..utils.logger import logger
+from ..utils.metrics import metrics
+
+metrics.describe("bot_prefetch_total", "Использование предзагруженного вопроса: hit, pending, stale, miss")
+
+_FAILED = object()
+
+
+class QuestionPrefetcher:
+    """Подбирает следующий вопрос в фоне, пока пользователь читает результат ответа.
+
+    На пользователя хранится одна задача с ключом (категория, режим). Если к нажатию
+    "Следующий вопрос" задача еще не завершилась, ее результат дожидаются - запрос
+    уже выполняется, начинать его заново дольше.
+    """
+
+    def __init__(self, enabled: bool, ttl: float, max_users: int):
+        self.enabled = enabled
+        self.entries = TTLCache("prefetch", max_users, ttl)
+
+    def schedule(self, user_id: int, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        if not self.enabled:
+            return
+        self.entries.put(user_id, (key, asyncio.create_task(self._run(user_id, loader))))
+
+    @staticmethod
+    async def _run(user_id: int, loader: Callable[[], Awaitable[Any]]):
+        try:
+            return await loader()
+        except Exception:
+            logger.exception("prefetch for user %s failed", user_id)
+            return _FAILED
+
+    async def take(self, user_id: int, key: Hashable,
+                   is_valid: Optional[Callable[[Any], bool]] = None) -> Tuple[bool, Any]:
+        """(True, результат) при попадании, иначе (False, None). Запись используется один раз"""
+        if not self.enabled:
+            return False, None
+        entry = self.entries.get(user_id)
+        if entry is None:
+            metrics.inc("bot_prefetch_total", result="miss")
+            return False, None
+        self.entries.invalidate(user_id)
+        entry_key, task = entry
+        if entry_key != key:
+            task.cancel()
+            metrics.inc("bot_prefetch_total", result="stale")
+            return False, None
+        pending = not task.done()
+        result = await task
+        if result is _FAILED or (is_valid is not None and not is_valid(result)):
+            metrics.inc("bot_prefetch_total", result="stale")
+            return False, None
+        metrics.inc("bot_prefetch_total", result="pending" if pending else "hit")
+        return True, result
+
+
+question_prefetcher = QuestionPrefetcher(settings.PREFETCH_ENABLED, settings.PREFETCH_TTL, settings.PREFETCH_MAX_USERS)
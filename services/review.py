@@ -0,0 +1,53 @@
+from typing import Iterable, List, Optional
+from aiogram.fsm.context import FSMContext
+from ..config.settings import settings
+from ..database.models import ReviewManager
+from ..utils.metrics import metrics
+
+metrics.describe("bot_review_rescheduled_total", "Ответы режима повторения, пересчитанные по SM-2")
+
+
+class ReviewScheduler:
+    """Режим повторения по расписанию SM-2.
+
+    Очередь категории берется из review_schedule по индексу (user_id, category_id,
+    due_at): только вопросы с наступившим сроком, сначала просроченные и проваленные.
+    Ответы копятся в данных FSM (ID со знаком: минус - ошибка) и пересчитываются
+    пачкой - когда пачка вопросов пройдена, набралось batch_size ответов или
+    пользователь вышел из режима.
+    """
+
+    FIELD = "review_grades"
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+
+    async def queue(self, user_id: int, category_id: int, exclude: Iterable[int] = (),
+                    limit: Optional[int] = None) -> List[int]:
+        """Следующие вопросы к повторению, кроме уже показанных в сессии"""
+        exclude = set(exclude)
+        limit = limit or self.batch_size
+        question_ids = await ReviewManager.get_review_queue(user_id, category_id, limit + len(exclude))
+        return [question_id for question_id in question_ids if question_id not in exclude][:limit]
+
+    async def grade(self, state: FSMContext, user_id: int, question_id: int, is_correct: bool):
+        grades = (await state.get_data()).get(self.FIELD, [])
+        if question_id in grades or -question_id in grades:
+            # Повторное нажатие старой кнопки того же вопроса
+            return
+        grades = grades + [question_id if is_correct else -question_id]
+        await state.update_data(**{self.FIELD: grades})
+        if len(grades) >= self.batch_size:
+            await self.flush(state, user_id)
+
+    async def flush(self, state: FSMContext, user_id: int):
+        """Пересчитывает накопленные ответы одной транзакцией"""
+        grades = (await state.get_data()).get(self.FIELD)
+        if not grades:
+            return
+        await ReviewManager.reschedule(user_id, [(abs(grade), grade > 0) for grade in grades])
+        await state.update_data(**{self.FIELD: []})
+        metrics.inc("bot_review_rescheduled_total", len(grades))
+
+
+review_scheduler = ReviewScheduler(settings.REVIEW_BATCH_SIZE)
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import time
+from typing import Optional, Tuple
+from ..config.settings import settings
+from ..database.models import create_all_tables, StatsManager
+from ..utils.logger import logger, setup_logging
+from ..utils.metrics import metrics
+
+metrics.describe("bot_stats_snapshot_seconds", "Длительность расчета снимка статистики для админ-панели")
+
+
+class StatsAggregator:
+    """Периодический расчет статистики системы в таблицу stats_snapshots.
+
+    Админ-панель читает готовый снимок одним запросом по ключу, поэтому тяжелые
+    агрегаты (DAU/WAU, ответы по часам, точность по категориям) не выполняются
+    в хендлере. Снимок общий для всех процессов, в cluster.py его считает воркер 0.
+    """
+
+    NAME = "system"
+
+    async def refresh(self) -> Tuple[dict, int]:
+        """Пересчитывает и сохраняет снимок"""
+        started = time.monotonic()
+        payload = await StatsManager.compute_system_stats()
+        computed_at = await StatsManager.save_snapshot(self.NAME, payload)
+        elapsed = time.monotonic() - started
+        metrics.observe("bot_stats_snapshot_seconds", elapsed)
+        logger.info("stats snapshot computed in %.2f s", elapsed)
+        return payload, computed_at
+
+    async def get(self) -> Tuple[dict, int]:
+        """Последний снимок; если его еще нет (первый запуск), считает сразу"""
+        snapshot = await StatsManager.get_snapshot(self.NAME)
+        if snapshot is None:
+            return await self.refresh()
+        return snapshot
+
+    async def run_forever(self, interval: float):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("stats snapshot failed")
+            await asyncio.sleep(interval)
+
+
+stats_aggregator = StatsAggregator()
+
+
+def start_background_stats() -> Optional[asyncio.Task]:
+    """Запускает периодический пересчет, если задан STATS_SNAPSHOT_INTERVAL"""
+    if settings.STATS_SNAPSHOT_INTERVAL <= 0:
+        return None
+    return asyncio.create_task(stats_aggregator.run_forever(settings.STATS_SNAPSHOT_INTERVAL))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Пересчет снимка статистики для админ-панели")
+    parser.parse_args()
+    setup_logging(settings.LOG_LEVEL, settings.LOG_FORMAT)
+
+    await create_all_tables()
+    started = time.monotonic()
+    payload, _ = await stats_aggregator.refresh()
+    print(
+        f"Готово за {time.monotonic() - started:.2f} c: пользователей {payload['users']}, "
+        f"DAU {payload['dau']}, WAU {payload['wau']}, ответов за сутки {payload['answers_24h']}, "
+        f"категорий {len(payload['categories'])}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import struct
+from typing import NamedTuple, Optional
+from ..config.settings import settings
+from .logger import logger
+
+ANSWER_PREFIX = "answer_"
+
+# question_id, answer_id, category_id, флаги; user_id входит только в подпись
+_PAYLOAD = struct.Struct(">IIIB")
+_USER = struct.Struct(">q")
+_MAC_SIZE = 8
+_FLAG_CORRECT = 1
+_FLAG_REPEAT = 2
+
+
+class AnswerToken(NamedTuple):
+    question_id: int
+    answer_id: int
+    category_id: Optional[int]
+    is_correct: bool
+    is_repeat_mode: bool
+
+
+class AnswerTokenSigner:
+    """Подписанный callback_data кнопки ответа: answer_ + base64url(данные + HMAC-SHA256[:8]).
+
+    Вся информация для экрана ответа едет в самой кнопке (35 байт при лимите
+    Telegram в 64), поэтому не нужны ни FSM, ни запрос правильного ответа,
+    а кнопки переживают перезапуск. Подпись привязана к пользователю, так что
+    подделать "правильный" ответ или нажать чужую кнопку нельзя.
+    """
+
+    def __init__(self, secret: bytes):
+        self.secret = secret
+
+    def _mac(self, user_id: int, payload: bytes) -> bytes:
+        return hmac.new(self.secret, _USER.pack(user_id) + payload, hashlib.sha256).digest()[:_MAC_SIZE]
+
+    def sign(self, user_id: int, question_id: int, answer_id: int, category_id: Optional[int],
+             is_correct: bool, is_repeat_mode: bool = False) -> str:
+        flags = (_FLAG_CORRECT if is_correct else 0) | (_FLAG_REPEAT if is_repeat_mode else 0)
+        payload = _PAYLOAD.pack(question_id, answer_id, category_id or 0, flags)
+        token = base64.urlsafe_b64encode(payload + self._mac(user_id, payload)).rstrip(b"=")
+        return ANSWER_PREFIX + token.decode("ascii")
+
+    def verify(self, user_id: int, data: Optional[str]) -> Optional[AnswerToken]:
+        """Данные кнопки или None, если callback_data не наша или подпись не сходится"""
+        if not data or not data.startswith(ANSWER_PREFIX):
+            return None
+        token = data[len(ANSWER_PREFIX):]
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (binascii.Error, ValueError):
+            return None
+        if len(raw) != _PAYLOAD.size + _MAC_SIZE:
+            return None
+        payload, mac = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+        if not hmac.compare_digest(mac, self._mac(user_id, payload)):
+            return None
+        question_id, answer_id, category_id, flags = _PAYLOAD.unpack(payload)
+        return AnswerToken(question_id, answer_id, category_id or None,
+                           bool(flags & _FLAG_CORRECT), bool(flags & _FLAG_REPEAT))
+
+
+def _load_secret() -> bytes:
+    if settings.CALLBACK_SECRET:
+        return settings.CALLBACK_SECRET.encode()
+    if settings.BOT_TOKEN:
+        # Ключ стабилен между перезапусками и одинаков у всех воркеров cluster.py
+        return hashlib.sha256(b"callback-tokens:" + settings.BOT_TOKEN.encode()).digest()
+    logger.warning("CALLBACK_SECRET and BOT_TOKEN are not set, answer buttons are signed with a random key")
+    return os.urandom(32)
+
+
+answer_tokens = AnswerTokenSigner(_load_secret())
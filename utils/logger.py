@@ -1,8 +1,163 @@
+import atexit
+import contextvars
+import json
 import logging
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-)
+import logging.handlers
+import queue
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
 
 logger = logging.getLogger("flowerbot")
+
+# Контекст текущего апдейта (user_id, handler), заполняется middleware
+log_context: contextvars.ContextVar = contextvars.ContextVar("log_context", default=None)
+
+# Поля, которые переносятся из extra/контекста в структурированную запись
+CONTEXT_FIELDS = ("user_id", "handler", "latency_ms", "suppressed")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет в запись user_id/handler из контекста апдейта (если их нет в extra)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = log_context.get()
+        if context:
+            for key, value in context.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Ограничивает одинаковые ошибки: первые burst за окно проходят, дальше каждая sample_every-я.
+
+    Одинаковыми считаются записи с тем же логгером, уровнем, шаблоном сообщения
+    и типом исключения. Число отброшенных записей попадает в поле suppressed
+    следующей пропущенной записи с тем же ключом.
+    """
+
+    MAX_KEYS = 1000
+
+    def __init__(self, window: float = 60.0, burst: int = 5, sample_every: int = 100, min_level: int = logging.WARNING):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.sample_every = sample_every
+        self.min_level = min_level
+        # ключ -> [начало окна, записей в окне, отброшено]
+        self._state: Dict[Tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.min_level:
+            return True
+        exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.name, record.levelno, str(record.msg), exc_type)
+        now = time.monotonic()
+        state = self._state.get(key)
+        if state is None or now - state[0] >= self.window:
+            if state is None and len(self._state) >= self.MAX_KEYS:
+                self._state.clear()
+            suppressed = state[2] if state else 0
+            self._state[key] = [now, 1, 0]
+            if suppressed:
+                record.suppressed = suppressed
+            return True
+        state[1] += 1
+        if state[1] <= self.burst or state[1] % self.sample_every == 0:
+            if state[2]:
+                record.suppressed = state[2]
+                state[2] = 0
+            return True
+        state[2] += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Прежний текстовый формат + поля контекста в конце строки"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = " ".join(
+            f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS if getattr(record, field, None) is not None
+        )
+        return f"{line} | {extras}" if extras else line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Стандартный prepare склеивает сообщение с трейсбеком и теряет exc_info;
+        # форматирование целиком делает слушатель в своем потоке
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", rate_window: float = 60.0, rate_burst: int = 5, rate_sample: int = 100):
+    """Переводит корневой логгер на очередь: в потоке цикла событий запись только кладется
+    в очередь, форматирование и вывод выполняет фоновый QueueListener.
+
+    Повторный вызов перенастраивает конвейер.
+    """
+    global _listener
+    stop_logging()
+
+    stream = logging.StreamHandler()
+    stream.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    front = _QueueHandler(log_queue)
+    # Фильтры выполняются до постановки в очередь - там, где доступен контекст апдейта
+    front.addFilter(ContextFilter())
+    front.addFilter(RateLimitFilter(window=rate_window, burst=rate_burst, sample_every=rate_sample))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(front)
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает фоновый поток"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
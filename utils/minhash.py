@@ -0,0 +1,116 @@
+import random
+import re
+import zlib
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+# Параметры сигнатуры зашиты в код: сигнатуры хранятся в БД и сравниваются между процессами
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 4
+
+_MERSENNE = (1 << 61) - 1
+_MASK = 0xFFFFFFFF
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(NUM_PERM)]
+_NON_WORD = re.compile(r"[\W_]+")
+
+Signature = Tuple[int, ...]
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё -> е, знаки препинания и лишние пробелы убраны"""
+    return _NON_WORD.sub(" ", text.lower().replace("ё", "е")).strip()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Символьные k-граммы нормализованного текста (короткий текст - одна k-грамма)"""
+    text = normalize(text)
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def signature(text: str) -> Signature:
+    """MinHash-сигнатура из NUM_PERM значений: доля совпавших позиций оценивает сходство Жаккара k-грамм.
+
+    Хеш k-граммы - crc32 (стабилен между процессами, в отличие от hash()),
+    перестановки - (a * h + b) mod (2^61 - 1) с фиксированными a, b.
+    """
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingles(text)]
+    return tuple(min([(a * h + b) % _MERSENNE for h in hashes]) & _MASK for a, b in _PERMUTATIONS)
+
+
+def similarity(left: Signature, right: Signature) -> float:
+    """Оценка сходства Жаккара по двум сигнатурам"""
+    return sum(1 for x, y in zip(left, right) if x == y) / NUM_PERM
+
+
+def encode(sig: Signature) -> str:
+    return "".join(f"{value:08x}" for value in sig)
+
+
+def decode(data: str) -> Signature:
+    return tuple(int(data[i:i + 8], 16) for i in range(0, len(data), 8))
+
+
+def bands(sig: Signature) -> List[Tuple[int, ...]]:
+    """Полосы LSH: вопросы с хотя бы одной одинаковой полосой - кандидаты в дубликаты.
+
+    При BANDS=8 по ROWS=4 пара со сходством 0.8 становится кандидатом с
+    вероятностью ~98%, со сходством 0.5 - ~40% (кандидаты затем проверяются).
+    """
+    return [sig[i * ROWS:(i + 1) * ROWS] for i in range(BANDS)]
+
+
+class LSHIndex:
+    """Индекс сигнатур в памяти с поиском похожих внутри группы (категории)"""
+
+    def __init__(self):
+        self._signatures: Dict[Hashable, Tuple[Hashable, Signature]] = {}
+        self._buckets: Dict[Tuple[Hashable, int, Tuple[int, ...]], Set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def add(self, key: Hashable, group: Hashable, sig: Signature):
+        self.remove(key)
+        self._signatures[key] = (group, sig)
+        for band, values in enumerate(bands(sig)):
+            self._buckets.setdefault((group, band, values), set()).add(key)
+
+    def remove(self, key: Hashable):
+        item = self._signatures.pop(key, None)
+        if item is None:
+            return
+        group, sig = item
+        for band, values in enumerate(bands(sig)):
+            bucket = self._buckets.get((group, band, values))
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[(group, band, values)]
+
+    def query(self, group: Hashable, sig: Signature, threshold: float,
+              exclude: Iterable[Hashable] = ()) -> List[Tuple[Hashable, float]]:
+        """Ключи группы со сходством не ниже threshold: [(ключ, сходство)], самые похожие первыми"""
+        candidates = set()
+        for band, values in enumerate(bands(sig)):
+            candidates.update(self._buckets.get((group, band, values), ()))
+        candidates.difference_update(exclude)
+        found = []
+        for key in candidates:
+            score = similarity(sig, self._signatures[key][1])
+            if score >= threshold:
+                found.append((key, score))
+        found.sort(key=lambda item: (-item[1], str(item[0])))
+        return found
+
+    def groups(self) -> Dict[Hashable, List[Hashable]]:
+        groups: Dict[Hashable, List[Hashable]] = {}
+        for key, (group, _) in self._signatures.items():
+            groups.setdefault(group, []).append(key)
+        return groups
+
+    def signature_of(self, key: Hashable) -> Signature:
+        return self._signatures[key][1]
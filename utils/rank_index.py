@@ -0,0 +1,123 @@
+import heapq
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class RankIndex:
+    """Рейтинг пользователей по очкам: дерево Фенвика над значениями очков.
+
+    Дерево хранит, сколько пользователей набрали каждое значение, поэтому место
+    пользователя (1 + число пользователей с большим счетом) и счет k-го сверху
+    находятся за O(log S), где S - максимальный счет. Пользователи с нулевым
+    счетом в рейтинг не входят. Одинаковый счет - одинаковое место, внутри
+    топа такие пользователи идут по user_id.
+    """
+
+    def __init__(self, size: int = 1024):
+        self._size = 1
+        while self._size < size:
+            self._size *= 2
+        self._tree = [0] * (self._size + 1)
+        self._scores: Dict[int, int] = {}
+        self._buckets: Dict[int, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[int, int]]) -> "RankIndex":
+        """Строит индекс из пар (user_id, счет) за O(n + S)"""
+        index = cls()
+        for user_id, score in items:
+            if score > 0:
+                index._scores[user_id] = score
+                index._buckets.setdefault(score, set()).add(user_id)
+        index._rebuild_tree(max(index._buckets, default=0))
+        return index
+
+    def _rebuild_tree(self, max_score: int):
+        while self._size < max_score:
+            self._size *= 2
+        tree = [0] * (self._size + 1)
+        for score, users in self._buckets.items():
+            tree[score] = len(users)
+        for i in range(1, self._size + 1):
+            parent = i + (i & -i)
+            if parent <= self._size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update(self, score: int, delta: int):
+        while score <= self._size:
+            self._tree[score] += delta
+            score += score & -score
+
+    def _prefix(self, score: int) -> int:
+        """Число пользователей со счетом от 1 до score"""
+        total = 0
+        while score > 0:
+            total += self._tree[score]
+            score -= score & -score
+        return total
+
+    def _score_at(self, position: int) -> int:
+        """Счет position-го пользователя снизу (наименьший s с _prefix(s) >= position)"""
+        score = 0
+        step = self._size
+        while step:
+            if score + step <= self._size and self._tree[score + step] < position:
+                score += step
+                position -= self._tree[score]
+            step //= 2
+        return score + 1
+
+    def score(self, user_id: int) -> int:
+        return self._scores.get(user_id, 0)
+
+    def set(self, user_id: int, score: int):
+        """Устанавливает счет пользователя"""
+        old = self._scores.get(user_id, 0)
+        if score == old:
+            return
+        if old > 0:
+            bucket = self._buckets[old]
+            bucket.discard(user_id)
+            if not bucket:
+                del self._buckets[old]
+            self._update(old, -1)
+        if score > 0:
+            self._scores[user_id] = score
+            self._buckets.setdefault(score, set()).add(user_id)
+            if score > self._size:
+                self._rebuild_tree(score)
+            else:
+                self._update(score, 1)
+        else:
+            self._scores.pop(user_id, None)
+
+    def add(self, user_id: int, delta: int = 1) -> int:
+        """Прибавляет delta к счету пользователя; возвращает новый счет"""
+        score = self._scores.get(user_id, 0) + delta
+        self.set(user_id, score)
+        return score
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """Место пользователя (1 - лучший) или None, если его нет в рейтинге"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return len(self._scores) - self._prefix(score) + 1
+
+    def top(self, k: int) -> List[Tuple[int, int, int]]:
+        """Первые k пользователей: (место, user_id, счет)"""
+        result = []
+        total = len(self._scores)
+        while len(result) < k and len(result) < total:
+            # Следующий по порядку сверху - это (total - taken)-й снизу
+            score = self._score_at(total - len(result))
+            rank = total - self._prefix(score) + 1
+            for user_id in heapq.nsmallest(k - len(result), self._buckets[score]):
+                result.append((rank, user_id, score))
+        return result
+
+    def items(self) -> Iterable[Tuple[int, int]]:
+        return self._scores.items()
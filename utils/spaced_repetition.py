@@ -0,0 +1,33 @@
+from typing import NamedTuple
+
+DAY = 86400
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+
+
+class ReviewState(NamedTuple):
+    ease: float
+    interval: int  # секунды
+    repetitions: int
+    due_at: int  # unix-время
+
+
+def sm2_step(ease: float, interval: int, repetitions: int, is_correct: bool, now: int,
+             relearn_seconds: int) -> ReviewState:
+    """Один шаг SM-2: правильный ответ - оценка 4, неправильный - 1.
+
+    После ошибки вопрос возвращается через relearn_seconds (вместо суток в
+    классическом SM-2 - повторение идет внутри сессий бота), серия обнуляется.
+    """
+    quality = 4 if is_correct else 1
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if not is_correct:
+        return ReviewState(ease, relearn_seconds, 0, now + relearn_seconds)
+    repetitions += 1
+    if repetitions == 1:
+        interval = DAY
+    elif repetitions == 2:
+        interval = 6 * DAY
+    else:
+        interval = round(max(interval, DAY) * ease)
+    return ReviewState(ease, interval, repetitions, now + interval)
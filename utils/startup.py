@@ -0,0 +1,102 @@
+import builtins
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from .logger import logger
+
+
+class StartupProfiler:
+    """Профиль холодного старта: время импорта каждого модуля и этапов инициализации.
+
+    Включается переменной окружения STARTUP_PROFILE=1 (читается до загрузки .env).
+    Импорты перехватываются через builtins.__import__, поэтому install() нужно
+    вызвать до импорта тяжелых модулей.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.perf_counter()
+        # модуль -> [время вместе с вложенными импортами, собственное время]
+        self.imports: Dict[str, List[float]] = {}
+        self.phases: List[Tuple[str, float]] = []
+        self._stack: List[List] = []
+        self._original_import = None
+
+    def install_if_enabled(self):
+        if os.getenv("STARTUP_PROFILE", "0") == "1":
+            self.install()
+
+    def install(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started = time.perf_counter()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @staticmethod
+    def _resolve(name: str, globals: Optional[dict], level: int) -> str:
+        if level == 0 or not globals:
+            return name
+        package = globals.get("__package__") or ""
+        base = package.rsplit(".", level - 1)[0] if level > 1 else package
+        return f"{base}.{name}" if name else base
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module_name = self._resolve(name, globals, level)
+        if module_name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        # [модуль, начало, время дочерних импортов]
+        frame = [module_name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+            entry = self.imports.setdefault(module_name, [0.0, 0.0])
+            entry[0] += elapsed
+            entry[1] += elapsed - frame[2]
+
+    @contextmanager
+    def phase(self, name: str):
+        """Замер этапа инициализации (создание таблиц, сборка диспетчера и т.п.)"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def report(self, top: int = 20) -> str:
+        lines = [f"startup: {(time.perf_counter() - self.started) * 1000:.1f} ms total"]
+        lines.append("imports (cumulative / self, ms):")
+        ordered = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)
+        for module_name, (cumulative, own) in ordered[:top]:
+            lines.append(f"  {cumulative * 1000:8.1f} {own * 1000:8.1f}  {module_name}")
+        lines.append("phases (ms):")
+        for name, duration in self.phases:
+            lines.append(f"  {duration * 1000:8.1f}  {name}")
+        return "\n".join(lines)
+
+    def finish(self):
+        """Снимает перехват импортов и пишет отчет в лог"""
+        if not self.enabled:
+            return
+        self.uninstall()
+        logger.info("%s", self.report())
+        self.enabled = False
+
+
+startup_profiler = StartupProfiler()
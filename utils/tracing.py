@@ -0,0 +1,261 @@
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+_trace_ids = itertools.count(1)
+
+
+class Span:
+    __slots__ = ("id", "name", "parent", "start", "duration", "attrs")
+
+    def __init__(self, span_id: int, name: str, parent: Optional[int], start: float, attrs: Dict):
+        self.id = span_id
+        self.name = name
+        self.parent = parent
+        self.start = start
+        self.duration = 0.0
+        self.attrs = attrs
+
+    def to_dict(self, origin: float) -> Dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'parent': self.parent,
+            'offset_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(self.duration * 1000, 3),
+            **({'attrs': self.attrs} if self.attrs else {}),
+        }
+
+
+class Trace:
+    """Трейс одного апдейта: корневой интервал и дочерние спаны"""
+
+    # Защита от неограниченного роста трейса (например, длинный поток AI)
+    MAX_SPANS = 500
+
+    def __init__(self, name: str, attrs: Dict):
+        self.id = next(_trace_ids)
+        self.name = name
+        self.attrs = attrs
+        self.wall_time = time.time()
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.error: Optional[str] = None
+
+    def new_span(self, name: str, parent: Optional[int], start: float, attrs: Dict) -> Optional[Span]:
+        if len(self.spans) >= self.MAX_SPANS:
+            self.dropped += 1
+            return None
+        span = Span(len(self.spans) + 1, name, parent, start, attrs)
+        self.spans.append(span)
+        return span
+
+    def breakdown(self) -> List[Dict]:
+        """Время по именам спанов верхнего уровня + время вне спанов (self)"""
+        totals: Dict[str, List] = defaultdict(lambda: [0, 0.0])
+        intervals = []
+        for span in self.spans:
+            if span.parent is None:
+                totals[span.name][0] += 1
+                totals[span.name][1] += span.duration
+                intervals.append((span.start, span.start + span.duration))
+        # Спаны верхнего уровня могут перекрываться (сообщения Bot API во время потока AI),
+        # поэтому покрытое время считается по объединению интервалов
+        covered = 0.0
+        current_start = current_end = None
+        for start, end in sorted(intervals):
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    covered += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            covered += current_end - current_start
+        rows = [{'name': name, 'count': count, 'total_ms': round(total * 1000, 3)} for name, (count, total) in totals.items()]
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        rows.append({'name': "self", 'count': 1, 'total_ms': round(max(self.duration - covered, 0.0) * 1000, 3)})
+        return rows
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.id,
+            'name': self.name,
+            'time': self.wall_time,
+            'duration_ms': round(self.duration * 1000, 3),
+            'attrs': self.attrs,
+            'error': self.error,
+            'dropped_spans': self.dropped,
+            'spans': [span.to_dict(self.start) for span in self.spans],
+        }
+
+
+class Tracer:
+    """Легковесная трассировка: трейс на апдейт, спаны через contextvars.
+
+    Законченные трейсы хранятся в кольцевом буфере и, если задан файл,
+    пишутся в него JSON-строками из фонового потока.
+    """
+
+    def __init__(self, buffer_size: int = 200):
+        self.enabled = True
+        self.traces: deque = deque(maxlen=buffer_size)
+        self._file_logger: Optional[logging.Logger] = None
+        self._listener: Optional[logging.handlers.QueueListener] = None
+
+    def configure(self, enabled: bool = True, buffer_size: int = 200, path: str = ""):
+        self.enabled = enabled
+        self.traces = deque(self.traces, maxlen=buffer_size)
+        self.close()
+        if path:
+            log_queue = queue.SimpleQueue()
+            file_handler = logging.FileHandler(path, encoding="utf-8")
+            file_handler.setFormatter(logging.Formatter("%(message)s"))
+            self._listener = logging.handlers.QueueListener(log_queue, file_handler)
+            self._listener.start()
+            self._file_logger = logging.getLogger("flowerbot.traces")
+            self._file_logger.propagate = False
+            self._file_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+            self._file_logger.setLevel(logging.INFO)
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+            self._file_logger = None
+
+    # --- трейсы ---
+
+    def start_trace(self, name: str, **attrs) -> Optional[Trace]:
+        if not self.enabled:
+            return None
+        trace = Trace(name, attrs)
+        _current_trace.set(trace)
+        _current_span.set(None)
+        return trace
+
+    def finish_trace(self, trace: Optional[Trace], error: Optional[BaseException] = None):
+        if trace is None:
+            return
+        trace.duration = time.perf_counter() - trace.start
+        if error is not None:
+            trace.error = repr(error)
+        self.traces.append(trace)
+        if self._file_logger is not None:
+            self._file_logger.info(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
+
+    @contextmanager
+    def trace(self, name: str, **attrs):
+        """Трейс вокруг блока; текущий трейс восстанавливается на выходе"""
+        trace_token = _current_trace.set(None)
+        span_token = _current_span.set(None)
+        trace = self.start_trace(name, **attrs)
+        try:
+            yield trace
+        except BaseException as e:
+            self.finish_trace(trace, e)
+            raise
+        else:
+            self.finish_trace(trace)
+        finally:
+            _current_trace.reset(trace_token)
+            _current_span.reset(span_token)
+
+    # --- спаны ---
+
+    @staticmethod
+    def current_trace() -> Optional[Trace]:
+        return _current_trace.get()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """Дочерний спан текущего трейса; без трейса ничего не делает"""
+        trace = _current_trace.get()
+        if trace is None:
+            yield None
+            return
+        span = trace.new_span(name, _current_span.get(), time.perf_counter(), attrs)
+        if span is None:
+            yield None
+            return
+        token = _current_span.set(span.id)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs['error'] = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            _current_span.reset(token)
+
+    def add_span(self, name: str, start: float, end: float, **attrs):
+        """Спан с явными границами - для участков, которые нельзя обернуть блоком
+        (например, между yield в асинхронном генераторе). Текущий спан не меняется.
+        """
+        trace = _current_trace.get()
+        if trace is None:
+            return
+        span = trace.new_span(name, _current_span.get(), start, attrs)
+        if span is not None:
+            span.duration = end - start
+
+    def on_statement(self, sql: str, duration: float, rows: int):
+        """Слушатель профилировщика SQL: число запросов в текущем спане"""
+        trace = _current_trace.get()
+        span_id = _current_span.get()
+        if trace is None or span_id is None:
+            return
+        attrs = trace.spans[span_id - 1].attrs
+        attrs['sql'] = attrs.get('sql', 0) + 1
+
+    # --- отчеты ---
+
+    def slowest(self, n: int = 5) -> List[Trace]:
+        return sorted(self.traces, key=lambda trace: trace.duration, reverse=True)[:n]
+
+    def report(self, n: int = 5) -> str:
+        """Самые медленные недавние трейсы с разбивкой по спанам"""
+        lines = [f"traces in buffer: {len(self.traces)}"]
+        for trace in self.slowest(n):
+            user = trace.attrs.get('user_id')
+            lines.append(f"\n{trace.duration * 1000:.1f} ms  {trace.name}  user={user}" + (f"  error={trace.error}" if trace.error else ""))
+            for row in trace.breakdown():
+                lines.append(f"  {row['total_ms']:9.1f} ms  x{row['count']:<3} {row['name']}")
+        return "\n".join(lines)
+
+
+def traced_class(prefix: str):
+    """Декоратор класса: каждый async @staticmethod выполняется в спане prefix:Class.method"""
+    def decorate(cls):
+        for name, value in list(vars(cls).items()):
+            if isinstance(value, staticmethod) and inspect.iscoroutinefunction(value.__func__):
+                setattr(cls, name, staticmethod(_traced(f"{prefix}:{cls.__name__}.{name}", value.__func__)))
+        return cls
+    return decorate
+
+
+def _traced(span_name: str, func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _current_trace.get() is None:
+            return await func(*args, **kwargs)
+        with tracer.span(span_name):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+tracer = Tracer()